@@ -0,0 +1,234 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.synthetic import generate
+
+# Directory the results of each run and the baseline are stored in
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+BASELINE_FILE = os.path.join(RESULTS_DIR, "baseline.json")
+
+# Stages of a stepwise run, in the order main.py runs them
+STEPWISE_STAGES = [
+    ("comma_delimiter", lambda p, data_dir, db_path: p.comma_delimiter(data_dir)),
+    ("drop_rows", lambda p, data_dir, db_path: p.drop_rows(data_dir)),
+    ("transpose", lambda p, data_dir, db_path: p.transpose(os.path.join(data_dir, "Locations.csv"))),
+    ("format_date", lambda p, data_dir, db_path: p.format_date(data_dir)),
+    ("int_conversion", lambda p, data_dir, db_path: p.int_conversion(data_dir)),
+    ("standardize_units", lambda p, data_dir, db_path: p.standardize_units(data_dir)),
+    ("drop_column", lambda p, data_dir, db_path: p.drop_column(os.path.join(data_dir, "Channel_Volume.csv"), "Category")),
+    ("rename_column", lambda p, data_dir, db_path: (
+        p.rename_column(os.path.join(data_dir, "Channel_Volume.csv"), "Subcategory", "Category"),
+        p.rename_column(data_dir, "Year_date", "Date"))),
+    ("merge_dim_tables", lambda p, data_dir, db_path: p.merge_dim_tables(data_dir)),
+    ("create_date_table", lambda p, data_dir, db_path: p.create_date_table(data_dir)),
+    ("process_locations", lambda p, data_dir, db_path: p.process_locations(data_dir)),
+    ("create_database", lambda p, data_dir, db_path: p.create_database(data_dir, db_path)),
+    ("create_rollups", lambda p, data_dir, db_path: p.create_rollups(db_path)),
+    ("export_csv", lambda p, data_dir, db_path: p.export_csv(data_dir)),
+]
+
+# End-to-end runs of each mode of main.py
+END_TO_END = {
+    "pipeline": lambda p, data_dir, db_path: p.run_pipeline(data_dir, db_path),
+    "streaming": lambda p, data_dir, db_path: p.run_streaming(data_dir, db_path, memory_budget_mb=256),
+    "stepwise": lambda p, data_dir, db_path: [stage(p, data_dir, db_path) for _, stage in STEPWISE_STAGES],
+    "elt": lambda p, data_dir, db_path: p.run_elt(data_dir, db_path),
+}
+
+
+def _peak_rss_mb(who):
+    """
+    Returns the peak resident memory of this process or of its finished children, in megabytes.
+    """
+    peak = resource.getrusage(who).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10
+
+
+def _run_child(scenario, stage, data_dir, db_path, workers):
+    """
+    Runs one stage, or one end-to-end run, in this process and prints its measurements as JSON.
+    Called in a fresh interpreter so the peak memory only covers that stage.
+    """
+    import warnings
+    from source.preprocessing import DataProcessor
+
+    warnings.simplefilter("ignore")
+    processor = DataProcessor(workers=workers)
+    func = END_TO_END[stage] if scenario == "end_to_end" else dict(STEPWISE_STAGES)[stage]
+    rss_before = _peak_rss_mb(resource.RUSAGE_SELF)
+    start = time.perf_counter()
+    func(processor, data_dir, db_path)
+    seconds = time.perf_counter() - start
+    print(json.dumps({"seconds": seconds, "peak_rss_mb": max(_peak_rss_mb(resource.RUSAGE_SELF),
+                                                              _peak_rss_mb(resource.RUSAGE_CHILDREN)),
+                      "startup_rss_mb": rss_before}))
+
+
+def _measure(scenario, stage, data_dir, db_path, workers):
+    """
+    Runs one stage or end-to-end run in a child process and returns its measurements.
+    """
+    command = [sys.executable, "-m", "benchmarks.run_benchmarks", "--child", scenario, stage, data_dir, db_path,
+               "--workers", str(workers)]
+    output = subprocess.run(command, check=True, capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def _directory_bytes(path):
+    """
+    Returns the total size of the files of a directory.
+    """
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path)
+               if os.path.isfile(os.path.join(path, name)))
+
+
+def run_size(rows, work_dir, workers=1, scenarios=("stages", "end_to_end"), seed=0):
+    """
+    Benchmarks every stepwise stage and every end-to-end mode on a synthetic extract set.
+
+    Args:
+        rows (int): Total number of fact table rows to generate.
+        work_dir (str): Scratch directory.
+        workers (int, optional): Number of worker processes of the per-file stages.
+        scenarios (iterable, optional): 'stages' for the stepwise stages, 'end_to_end' for whole runs.
+        seed (int, optional): Seed of the generator.
+
+    Returns:
+        list: One result record per stage or run.
+    """
+    source_dir = os.path.join(work_dir, f"raw_{rows}")
+    counts = generate(source_dir, rows, seed=seed)
+    input_rows = sum(counts.values())
+    input_bytes = _directory_bytes(source_dir)
+
+    runs = []
+    if "stages" in scenarios:
+        runs.append(("stages", [name for name, _ in STEPWISE_STAGES]))
+    if "end_to_end" in scenarios:
+        runs.extend(("end_to_end", [mode]) for mode in END_TO_END)
+
+    records = []
+    for scenario, stages in runs:
+        # Every scenario starts from a fresh copy of the raw extracts
+        data_dir = os.path.join(work_dir, "data")
+        shutil.rmtree(data_dir, ignore_errors=True)
+        shutil.copytree(source_dir, data_dir)
+        db_path = os.path.join(work_dir, "bench.db")
+        if os.path.exists(db_path):
+            os.remove(db_path)
+        for stage in stages:
+            result = _measure(scenario, stage, data_dir, db_path, workers)
+            records.append({"rows": rows, "scenario": scenario, "stage": stage, "workers": workers,
+                            "seconds": round(result["seconds"], 4),
+                            "rows_per_second": round(input_rows / result["seconds"]) if result["seconds"] else None,
+                            "mb_per_second": round(input_bytes / 2 ** 20 / result["seconds"], 2) if result["seconds"] else None,
+                            "peak_rss_mb": round(result["peak_rss_mb"], 1),
+                            "startup_rss_mb": round(result["startup_rss_mb"], 1)})
+            print(f"{rows:>10} {scenario:<10} {stage:<18} {result['seconds']:>9.3f}s "
+                  f"{records[-1]['rows_per_second'] or 0:>12} rows/s {result['peak_rss_mb']:>8.1f} MB", flush=True)
+    return records
+
+
+def compare(records, baseline, tolerance=0.2):
+    """
+    Compares results with a baseline and lists the stages that got slower or use more memory than allowed.
+
+    Args:
+        records (list): Result records of the current run.
+        baseline (list): Result records of the baseline run.
+        tolerance (float, optional): Allowed relative increase of time and peak memory.
+
+    Returns:
+        list: Descriptions of the regressions.
+    """
+    reference = {(r["rows"], r["scenario"], r["stage"], r.get("workers", 1)): r for r in baseline}
+    regressions = []
+    for record in records:
+        base = reference.get((record["rows"], record["scenario"], record["stage"], record.get("workers", 1)))
+        if base is None:
+            continue
+        for metric in ("seconds", "peak_rss_mb"):
+            if base[metric] and record[metric] > base[metric] * (1 + tolerance):
+                regressions.append(f"{record['scenario']}/{record['stage']} at {record['rows']} rows: {metric} "
+                                   f"{record[metric]} vs baseline {base[metric]} (+{record[metric] / base[metric] - 1:.0%})")
+    return regressions
+
+
+def _environment():
+    """
+    Describes the machine and library versions the benchmarks ran on.
+    """
+    import numpy
+    import pandas
+    return {"python": platform.python_version(), "pandas": pandas.__version__, "numpy": numpy.__version__,
+            "platform": platform.platform(), "processor": platform.processor(), "cpu_count": os.cpu_count()}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the preprocessing stages on synthetic extracts.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000],
+                        help="total fact table rows of each benchmarked size, from 10k up to 50M")
+    parser.add_argument("--scenarios", nargs="+", choices=["stages", "end_to_end"], default=["stages", "end_to_end"],
+                        help="benchmark each stepwise stage, whole runs of each mode, or both")
+    parser.add_argument("--workers", type=int, default=1, help="number of worker processes of the per-file stages")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the synthetic data generator")
+    parser.add_argument("--work-dir", default=None, help="scratch directory (default: a temporary directory)")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed relative increase of time and memory over the baseline")
+    parser.add_argument("--save-baseline", action="store_true", help="store the results as the new baseline")
+    parser.add_argument("--child", nargs=4, metavar=("SCENARIO", "STAGE", "DATA_DIR", "DB_PATH"), help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.child:
+        _run_child(*args.child, workers=args.workers)
+        return
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="sell_more_beer_bench_")
+    try:
+        records = []
+        for rows in args.rows:
+            records.extend(run_size(rows, work_dir, workers=args.workers, scenarios=args.scenarios, seed=args.seed))
+    finally:
+        if args.work_dir is None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    # Store the results of the run
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    results = {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "environment": _environment(), "results": records}
+    results_file = os.path.join(RESULTS_DIR, time.strftime("%Y%m%d-%H%M%S") + ".json")
+    with open(results_file, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {results_file}")
+
+    if args.save_baseline:
+        shutil.copyfile(results_file, BASELINE_FILE)
+        print(f"Baseline updated: {BASELINE_FILE}")
+        return
+
+    # Check for regressions against the baseline
+    if os.path.exists(BASELINE_FILE):
+        with open(BASELINE_FILE, 'r') as f:
+            baseline = json.load(f)
+        regressions = compare(records, baseline["results"], args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print("No regressions against the baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+# Share of the requested rows generated for each fact table, close to the ratio of the sample extracts
+FACT_SHARES = {"Company_Share_GBO_unit": 0.6, "Channel_Volume": 0.3, "Market_Sizes": 0.1}
+
+# Rows generated and written at a time, so files of tens of millions of rows fit in memory
+BLOCK_ROWS = 1_000_000
+
+REGIONS = ['Asia Pacific', 'Australasia', 'Eastern Europe', 'Latin America', 'Middle East and Africa',
+           'North America', 'Western Europe', 'World']
+CATEGORIES = ['Beer', 'Wine', 'Spirits', 'RTDs/High-Strength Premixes', 'Cider/Perry']
+# (name, category id, hierarchy level) of each subcategory, ids are the position in the list plus one
+SUBCATEGORIES = [('Ale', 1, 3), ('Weissbier/Weizen/Wheat Beer', 1, 3), ('Flavoured/Mixed Lager', 1, 3),
+                 ('Standard Lager', 1, 3), ('Sorghum', 1, 3), ('Stout', 1, 2), ('Non Alcoholic Beer', 1, 2),
+                 ('Lager', 1, 2), ('Dark Beer', 1, 2), ('Premium Lager', 1, 4), ('Mid-Priced Lager', 1, 4),
+                 ('Economy Lager', 1, 4), ('Beer', 1, 1), ('Wine', 2, 1), ('Spirits', 3, 1),
+                 ('RTDs/High-Strength Premixes', 4, 1), ('Cider/Perry', 5, 1)]
+# (outlet, outlet hierarchy level)
+OUTLETS = [('Store-Based Retailing', 1), ('Non-Store Retailing', 1), ('Grocery Retailers', 2),
+           ('Mixed Retailers', 2), ('Internet Retailing', 2), ('Vending', 2), ('Supermarkets', 3),
+           ('Hypermarkets', 3), ('Discounters', 3), ('Food/drink/tobacco specialists', 3),
+           ('Convenience Stores', 4), ('Forecourt Retailers', 4), ('Independent Small Grocers', 4)]
+# Volume units of the extracts, with the registry unknown 'gallons' mixed in at a low rate
+VOLUME_UNITS = ['million litres', '000 litres', 'litres', 'hectolitres', 'gallons']
+VOLUME_UNIT_WEIGHTS = [0.55, 0.35, 0.05, 0.0499, 0.0001]
+CURRENT_CONSTANT = 'Historic Constant 2021 Prices, Forecast Constant 2021 Prices'
+CURRENCY_CONVERSION = 'Historic Fixed 2021 Exchange Rates, Forecast Fixed 2021 Exchange Rates'
+BRAND_OWNERS = (['Anheuser-Busch InBev NV', 'Heineken NV', 'Carlsberg A/S', 'Asahi Group Holdings Ltd',
+                 'Molson Coors Beverage Co', 'Others', 'Private Label'] +
+                [f'Brand Owner {i:04d}' for i in range(1, 1994)])
+
+# Rate of the extract quirks: blank rows, 'Year_date' in another year than 'Year', and 29 February dates
+BLANK_ROW_RATE = 0.001
+YEAR_MISMATCH_RATE = 0.15
+LEAP_DAY_RATE = 0.001
+
+
+def _year_dates(rng, years):
+    """
+    Generates the 'Year_date' text of each row: 31 December of its year, with some dates in another year and
+    some 29 February dates of the previous leap year, as in the extracts.
+    """
+    date_years = years.copy()
+    mismatch = rng.random(len(years)) < YEAR_MISMATCH_RATE
+    date_years[mismatch] = rng.choice([1999, 2030], size=mismatch.sum())
+    dates = np.char.add(date_years.astype(str), '-12-31').astype(object)
+    leap_day = rng.random(len(years)) < LEAP_DAY_RATE
+    dates[leap_day] = np.char.add((years[leap_day] - 1 - (years[leap_day] - 1) % 4).astype(str), '-02-29')
+    return dates
+
+
+def _blank(rng, df):
+    """
+    Blanks a few rows of a block, the extracts have fully empty lines between the data rows.
+    """
+    blank = rng.random(len(df)) < BLANK_ROW_RATE
+    if blank.any():
+        for col in df.columns:
+            if pd.api.types.is_integer_dtype(df[col].dtype):
+                df[col] = df[col].astype('Int64')
+        df.loc[blank, :] = None
+    return df
+
+
+def _channel_volume_block(rng, rows):
+    outlets = rng.integers(0, len(OUTLETS), rows)
+    years = rng.integers(2007, 2022, rows)
+    return pd.DataFrame({
+        'Location': rng.integers(1, 8, rows),
+        'Industry': 'Alcoholic Drinks',
+        'Edition': 2022,
+        'Category': 'Alcoholic Drinks',
+        'Subcategory': np.array(CATEGORIES, dtype=object)[rng.integers(0, len(CATEGORIES), rows)],
+        'Hierarchy_Level': 1,
+        'Data_Type': 'Off-trade Volume',
+        'Outlet': np.array([name for name, _ in OUTLETS], dtype=object)[outlets],
+        'Outlet_Hierarchy': np.array([level for _, level in OUTLETS])[outlets],
+        'Unit': rng.choice(VOLUME_UNITS, size=rows, p=VOLUME_UNIT_WEIGHTS),
+        'Year': years,
+        'Year_date': _year_dates(rng, years),
+        'Volume': np.round(rng.lognormal(5, 2, rows), 6),
+    })
+
+
+def _company_share_block(rng, rows):
+    subcategories = rng.integers(0, len(SUBCATEGORIES), rows)
+    years = rng.integers(2016, 2022, rows)
+    return pd.DataFrame({
+        'Location': rng.integers(1, 9, rows),
+        'Industry': 'Alcoholic Drinks',
+        'Subcategory_ID': subcategories + 1,
+        'Hierarchy_Level': np.array([level for _, _, level in SUBCATEGORIES])[subcategories],
+        'Data_Type': 'Total Volume',
+        'Global_Brand_Owner': np.array(BRAND_OWNERS, dtype=object)[rng.zipf(1.5, rows) % len(BRAND_OWNERS)],
+        'Unit': rng.choice(VOLUME_UNITS, size=rows, p=VOLUME_UNIT_WEIGHTS),
+        'Year_text': years,
+        'Year_date': _year_dates(rng, years),
+        'Year_minus_2016': years - 2016 + 4,
+        'Volume': np.round(rng.lognormal(3, 2.5, rows), 5),
+    })
+
+
+def _market_sizes_block(rng, rows):
+    subcategories = rng.integers(0, len(SUBCATEGORIES), rows)
+    years = rng.integers(2016, 2027, rows)
+    rsp = rng.integers(1, 100000, rows)
+    return pd.DataFrame({
+        'Location': rng.integers(1, 8, rows),
+        'Industry': 'Alcoholic Drinks',
+        'Subcategory': subcategories + 1,
+        'Hierarchy_Level': np.array([level for _, _, level in SUBCATEGORIES])[subcategories],
+        'Data_Type': 'Total Value RSP',
+        'Unit': 'USD million',
+        'Current_Constant': CURRENT_CONSTANT,
+        'Currency_Conversion': CURRENCY_CONVERSION,
+        'Year': years,
+        'Year_date': _year_dates(rng, years),
+        'RSP': rsp,
+        'Volume': np.round(rsp / 11, 1),
+        'Year_minus_2016': years - 2016 + 4,
+        'Year_minus_2022': years - 2022 - 2,
+        'Edition': 2022,
+    })
+
+
+FACT_GENERATORS = {
+    "Channel_Volume": _channel_volume_block,
+    "Company_Share_GBO_unit": _company_share_block,
+    "Market_Sizes": _market_sizes_block,
+}
+
+
+def write_dimensions(out_dir):
+    """
+    Writes the Categories, Subcategories and raw, transposed Locations extracts.
+
+    Args:
+        out_dir (str): Directory to write the files to.
+    """
+    pd.DataFrame({'id': range(1, len(CATEGORIES) + 1), 'Name': CATEGORIES}).to_csv(
+        os.path.join(out_dir, "Categories.csv"), index=False)
+    pd.DataFrame({'id': range(1, len(SUBCATEGORIES) + 1),
+                  'Category': [category for _, category, _ in SUBCATEGORIES],
+                  'Name': [name for name, _, _ in SUBCATEGORIES]}).to_csv(
+        os.path.join(out_dir, "Subcategories.csv"), index=False)
+    lines = ['id;' + ';'.join(str(i) for i in range(1, len(REGIONS) + 1)),
+             'Region;' + ';'.join(REGIONS),
+             'Country' + ';' * len(REGIONS)]
+    with open(os.path.join(out_dir, "Locations.csv"), 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+
+
+def write_fact_table(table_name, file_path, rows, seed=0):
+    """
+    Writes a raw fact table extract: semicolon separated, comma decimals, mixed units and the date quirks.
+
+    Args:
+        table_name (str): Name of the fact table, a key of FACT_GENERATORS.
+        file_path (str): Path to the CSV file to write.
+        rows (int): Number of rows, blank rows included.
+        seed (int, optional): Seed of the random generator.
+    """
+    generate = FACT_GENERATORS[table_name]
+    for block, start in enumerate(range(0, max(rows, 1), BLOCK_ROWS)):
+        rng = np.random.default_rng([seed, block])
+        df = _blank(rng, generate(rng, min(BLOCK_ROWS, rows - start)))
+        df.to_csv(file_path, sep=';', decimal=',', index=False, mode='w' if block == 0 else 'a', header=block == 0)
+
+
+def generate(out_dir, rows, seed=0):
+    """
+    Generates a synthetic set of extracts with the schemas of the Euromonitor files.
+
+    Args:
+        out_dir (str): Directory to write the files to, created if needed.
+        rows (int): Total number of fact table rows, split between the fact tables by FACT_SHARES.
+        seed (int, optional): Seed of the random generator, the same seed gives the same files.
+
+    Returns:
+        dict: Number of rows written per fact table.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    write_dimensions(out_dir)
+    counts = {}
+    for i, (name, share) in enumerate(FACT_SHARES.items()):
+        counts[name] = max(1, int(rows * share))
+        write_fact_table(name, os.path.join(out_dir, name + ".csv"), counts[name], seed=seed * 10 + i)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic Euromonitor extracts for benchmarking.")
+    parser.add_argument("out_dir", help="directory to write the extracts to")
+    parser.add_argument("--rows", type=int, default=100_000, help="total number of fact table rows")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the random generator")
+    args = parser.parse_args()
+    for name, count in generate(args.out_dir, args.rows, args.seed).items():
+        print(f"{name}: {count} rows")
+
+
+if __name__ == "__main__":
+    main()
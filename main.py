@@ -1,7 +1,46 @@
+from source.instrumentation import StageRecorder
 from source.preprocessing import DataProcessor
+import argparse
 import os
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Preprocess the Euromonitor extracts and build the beer database.")
+    parser.add_argument("--mode", choices=["pipeline", "stepwise", "elt"], default="pipeline",
+                        help="'pipeline' reads each file once and runs every stage in memory, "
+                             "'stepwise' runs each stage as a separate pass over the CSV files, "
+                             "'elt' stages the files into SQLite and runs the stages as SQL")
+    parser.add_argument("--incremental", action="store_true",
+                        help="in pipeline mode, skip files and stages whose inputs are unchanged since the last run")
+    parser.add_argument("--upsert", action="store_true",
+                        help="treat the extracts as a delta, e.g. a new edition, and upsert them into the existing "
+                             "database on their natural keys instead of recreating its tables (not with --memory-budget)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of processes the per-file stages fan out to")
+    parser.add_argument("--memory-budget", type=int, default=None, metavar="MB",
+                        help="in pipeline mode, stream the fact tables in chunks that fit this memory budget")
+    parser.add_argument("--storage", choices=["feather", "csv"], default=None,
+                        help="in stepwise mode, the format the stages pass tables between each other in "
+                             "(default: feather when pyarrow is installed)")
+    parser.add_argument("--memory-report", action="store_true",
+                        help="in pipeline mode, print the memory held by each table before and after the dtype compaction")
+    parser.add_argument("--quarantine", default=None, metavar="PATH",
+                        help="in pipeline mode, move the rows failing validation to this CSV file instead of "
+                             "stopping the run on rows a stage can't process")
+    parser.add_argument("--validation-report", action="store_true",
+                        help="in pipeline mode, print the rows breaking each validation rule per table")
+    parser.add_argument("--star", action="store_true",
+                        help="also export a star schema: integer keyed dimension and narrow fact CSV files in data/star "
+                             "and data/sell_more_beer_star.db, where the denormalized tables are views")
+    parser.add_argument("--report", default=None, metavar="PATH",
+                        help="write a JSON report of the time, rows, bytes and peak memory of each stage and file")
+    parser.add_argument("--profile-stage", default=None, metavar="STAGE",
+                        help="run one stage, e.g. 'merge_dim_tables' or 'prepare', under cProfile and dump "
+                             "its statistics to <STAGE>.prof")
+    return parser.parse_args()
+
 def main():
+    args = parse_args()
+
     # Get the current directory
     current_dir = os.path.dirname(os.path.abspath(__file__))
 
@@ -10,9 +49,38 @@ def main():
     location_file = os.path.join(current_dir, "data/Locations.csv")
     channel_file = os.path.join(current_dir, "data/Channel_Volume.csv")
     database_path = os.path.join(current_dir, "data/sell_more_beer.db")
+    star_database_path = os.path.join(current_dir, "data/sell_more_beer_star.db")
 
     # Assign the DataProcessor class
-    processor = DataProcessor()
+    recorder = StageRecorder(enabled=args.report is not None, profile_stage=args.profile_stage)
+    processor = DataProcessor(workers=args.workers, storage=args.storage, recorder=recorder,
+                              quarantine_file=args.quarantine)
+
+    if args.mode == "elt":
+        # Stage the extracts into the database and transform them there
+        processor.run_elt(data_dir, database_path)
+        if args.star:
+            processor.export_star(data_dir, star_database_path)
+        if args.report:
+            recorder.write_report(args.report)
+        return
+
+    if args.mode == "pipeline":
+        if args.memory_budget:
+            # Stream the fact tables in bounded-size chunks
+            processor.run_streaming(data_dir, database_path, memory_budget_mb=args.memory_budget)
+        else:
+            # Run every stage in memory and write each output once
+            processor.run_pipeline(data_dir, database_path, incremental=args.incremental, upsert=args.upsert)
+        if args.memory_report:
+            print(processor.memory_report().to_string(index=False))
+        if args.validation_report:
+            print(processor.validation_report().to_string(index=False))
+        if args.star:
+            processor.export_star(data_dir, star_database_path)
+        if args.report:
+            recorder.write_report(args.report)
+        return
 
     # Change delimiter to comma
     processor.comma_delimiter(data_dir)
@@ -48,8 +116,21 @@ def main():
     # Add countries to regions for mapping
     processor.process_locations(data_dir)
 
-    # Create SQLite database and import data from CSV files
-    processor.create_database(data_dir, database_path)
+    # Create SQLite database and import data from the tables
+    processor.create_database(data_dir, database_path, upsert=args.upsert)
+
+    # Materialize the aggregate tables read by the dashboards
+    processor.create_rollups(database_path)
+
+    # Export the tables to CSV files for use in Tableau
+    processor.export_csv(data_dir)
+
+    # Export the star schema for compact Tableau extracts
+    if args.star:
+        processor.export_star(data_dir, star_database_path)
+
+    if args.report:
+        recorder.write_report(args.report)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,307 @@
+import csv
+import os
+import re
+import shutil
+from collections import namedtuple
+
+import pandas as pd
+
+from source.schema import csv_dtypes
+
+# Separators recognised in a header line, the most frequent one is the file's separator
+SEPARATORS = [';', ',', '\t', '|']
+
+# Number of data rows sampled to infer the decimal convention and the dtypes of a file. The dtypes are checked
+# again against every row parsed, and widened when a later row doesn't fit them
+SAMPLE_ROWS = 1000
+
+# Sniffed dtypes from the narrowest to the widest
+DTYPE_ORDER = ['int64', 'float64', 'object']
+
+# Numbers written with a comma as the decimal separator, as in the semicolon separated extracts
+_COMMA_NUMBER = re.compile(r'^-?\d+(,\d+)?$')
+_DOT_NUMBER = re.compile(r'^-?\d+(\.\d+)?([eE][-+]?\d+)?$')
+_INTEGER = re.compile(r'^-?\d+$')
+
+# Structure of a CSV file: separator, decimal separator, header, the columns holding comma decimal numbers
+# and the dtype inferred for each column
+FileSchema = namedtuple('FileSchema', ['path', 'signature', 'sep', 'decimal', 'header', 'columns',
+                                       'decimal_columns', 'dtypes'])
+
+
+def _signature(file_path):
+    """
+    Returns the (size, mtime) signature of a file, which changes whenever the file is rewritten.
+    """
+    stat = os.stat(file_path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def _infer_dtype(values):
+    """
+    Infers the dtype of a sampled text column.
+
+    Args:
+        values (pd.Series): Sampled values read as text, missing values dropped.
+
+    Returns:
+        str: 'int64', 'float64' or 'object'.
+    """
+    if len(values) == 0:
+        return 'object'
+    if values.str.match(_INTEGER).all():
+        return 'int64'
+    if values.str.match(_DOT_NUMBER).all() or values.str.match(_COMMA_NUMBER).all():
+        return 'float64'
+    return 'object'
+
+
+def sniff_file(file_path, sample_rows=SAMPLE_ROWS):
+    """
+    Sniffs the structure of a CSV file from its header line and a sample of its rows.
+
+    Args:
+        file_path (str): Path to the CSV file.
+        sample_rows (int, optional): Number of data rows sampled.
+
+    Returns:
+        FileSchema: Structure of the file.
+    """
+    signature = _signature(file_path)
+    with open(file_path, 'r', newline='', encoding='utf-8') as f:
+        first_line = f.readline()
+    sep = max(SEPARATORS, key=first_line.count) if any(s in first_line for s in SEPARATORS) else ','
+    columns = next(csv.reader([first_line], delimiter=sep), [])
+
+    # A header of numbers only is a data row, as in the raw transposed Locations extract it isn't
+    header = not all(_DOT_NUMBER.match(col) for col in columns if col)
+
+    sample = pd.read_csv(file_path, sep=sep, nrows=sample_rows, dtype=str, keep_default_na=False, na_values=[''],
+                         header=0 if header else None)
+    dtypes = {}
+    decimal_columns = []
+    for col in sample.columns:
+        values = sample[col].dropna()
+        dtypes[str(col)] = _infer_dtype(values)
+        if dtypes[str(col)] == 'float64' and values.str.contains(',', regex=False).any():
+            decimal_columns.append(str(col))
+    return FileSchema(file_path, signature, sep, ',' if decimal_columns else '.', header, columns,
+                      decimal_columns, dtypes)
+
+
+class SchemaCatalog:
+    """
+    Catalog of the structure of the CSV files, sniffed once per file and sniffed again only when the file
+    is rewritten, so the stages can pass the separator, columns and dtypes to the parser up front.
+    """
+
+    def __init__(self):
+        self.schemas = {}
+
+    def schema(self, file_path):
+        """
+        Returns the structure of a CSV file, sniffing it if it isn't in the catalog or changed since.
+
+        Args:
+            file_path (str): Path to the CSV file.
+
+        Returns:
+            FileSchema: Structure of the file.
+        """
+        schema = self.schemas.get(file_path)
+        if schema is None or schema.signature != _signature(file_path):
+            schema = self.schemas[file_path] = sniff_file(file_path)
+        return schema
+
+    def build(self, file_paths):
+        """
+        Sniffs the CSV files that aren't in the catalog yet.
+
+        Args:
+            file_paths (iterable): Paths to the CSV files.
+
+        Returns:
+            dict: Structure of each file by path.
+        """
+        return {file_path: self.schema(file_path) for file_path in file_paths}
+
+    def forget(self, file_path):
+        """
+        Drops a file from the catalog, e.g. after it was rewritten.
+        """
+        self.schemas.pop(file_path, None)
+
+    def read_options(self, file_path, columns=None):
+        """
+        Returns the pd.read_csv arguments of a CSV file: its separator, decimal separator, the columns to read
+        and the dtypes of the categorical columns.
+
+        Number columns are left to the parser, since a blank row turns integers into floats and a row the
+        sample didn't show may not be a number at all. read_csv checks them against the catalog afterwards.
+
+        Args:
+            file_path (str): Path to the CSV file.
+            columns (list, optional): Only read these columns, the ones the file doesn't have are skipped.
+
+        Returns:
+            dict: Keyword arguments for pd.read_csv.
+        """
+        schema = self.schema(file_path)
+        options = {'sep': schema.sep}
+        if schema.header:
+            dtypes = {col: dtype for col, dtype in csv_dtypes().items() if col in schema.dtypes}
+            # Comma decimals are only parsed as numbers when the comma isn't also the separator
+            if schema.decimal != schema.sep:
+                options['decimal'] = schema.decimal
+            if columns is not None:
+                dtypes = {col: dtype for col, dtype in dtypes.items() if col in columns}
+                options['usecols'] = [col for col in schema.columns if col in columns]
+            options['dtype'] = dtypes
+        # Only empty fields are missing values, 'NA' is a country code
+        options['keep_default_na'] = False
+        options['na_values'] = ['']
+        return options
+
+    def read_csv(self, file_path, columns=None, **csv_kwargs):
+        """
+        Reads a CSV file with the options of its catalog entry.
+
+        The number columns parsed are checked against the sniffed dtypes: comma decimal columns are floats
+        even when the rows read only hold whole numbers, and a column whose rows contradict the sample is
+        widened, to floats when its values are numbers with either decimal separator and to text otherwise.
+
+        Args:
+            file_path (str): Path to the CSV file.
+            columns (list, optional): Only read these columns, the ones the file doesn't have are skipped.
+            **csv_kwargs: Extra arguments for pd.read_csv, they take precedence over the catalog.
+
+        Returns:
+            pd.DataFrame: Parsed file contents, or a chunk iterator when 'chunksize' is given.
+        """
+        options = self.read_options(file_path, columns)
+        options.update(csv_kwargs)
+        if options.get('chunksize') is not None:
+            return self._read_chunks(file_path, options)
+        return self.check_dtypes(file_path, pd.read_csv(file_path, **options))
+
+    def _read_chunks(self, file_path, options):
+        """
+        Reads a CSV file chunk by chunk, checking each chunk against the catalog entry as read_csv does.
+        """
+        with pd.read_csv(file_path, **options) as reader:
+            for chunk in reader:
+                yield self.check_dtypes(file_path, chunk)
+
+    def check_dtypes(self, file_path, df):
+        """
+        Checks the number columns of a table parsed from a CSV file against the dtypes sniffed from its sample,
+        converting comma decimal columns of whole numbers to floats and widening the columns the sample
+        mis-typed. The catalog entry is updated with the widened dtypes, so later reads and the ELT plan use them.
+
+        Args:
+            file_path (str): Path to the CSV file.
+            df (pd.DataFrame): Rows parsed with read_options, updated in place.
+
+        Returns:
+            pd.DataFrame: The table.
+        """
+        schema = self.schemas.get(file_path)
+        if schema is None or not schema.header:
+            return df
+        widened = {}
+        for col in df.columns:
+            sniffed = schema.dtypes.get(str(col))
+            values = df[col]
+            if sniffed == 'object' or sniffed is None:
+                continue
+            # Comma decimals in a comma separated file are kept as text, see read_options
+            if schema.decimal == schema.sep and col in schema.decimal_columns:
+                continue
+            if values.dtype == 'object':
+                # Comma decimals are only numbers when the comma isn't the separator
+                numbers = values
+                if schema.sep != ',':
+                    numbers = values.str.replace(',', '.', regex=False)
+                numbers = pd.to_numeric(numbers, errors='coerce')
+                if numbers.notna().sum() == values.notna().sum():
+                    df[col] = numbers.astype('float64')
+                    widened[col] = 'float64'
+                else:
+                    widened[col] = 'object'
+            elif pd.api.types.is_float_dtype(values.dtype):
+                if sniffed == 'int64' and (values.dropna() % 1 != 0).any():
+                    widened[col] = 'float64'
+            elif sniffed == 'float64' and pd.api.types.is_integer_dtype(values.dtype):
+                df[col] = values.astype('float64')
+        if widened:
+            self.widen(file_path, widened)
+        return df
+
+    def widen(self, file_path, dtypes):
+        """
+        Widens the sniffed dtypes of columns of a CSV file, never narrowing them.
+
+        Args:
+            file_path (str): Path to the CSV file.
+            dtypes (dict): New dtype of each column, 'float64' or 'object'.
+        """
+        schema = self.schemas.get(file_path)
+        if schema is None:
+            return
+        merged = dict(schema.dtypes)
+        for col, dtype in dtypes.items():
+            if DTYPE_ORDER.index(dtype) > DTYPE_ORDER.index(merged.get(col, 'int64')):
+                merged[col] = dtype
+        decimal_columns = [col for col in schema.decimal_columns if merged[col] == 'float64']
+        self.schemas[file_path] = schema._replace(dtypes=merged, decimal_columns=decimal_columns)
+
+    def rewrite_rows(self, file_path, sep=None, columns=None):
+        """
+        Rewrites a CSV file row by row with another separator or a subset of its columns, without parsing
+        the values. Blank lines are dropped, as pd.read_csv skips them.
+
+        Args:
+            file_path (str): Path to the CSV file.
+            sep (str, optional): Separator of the rewritten file. Defaults to the file's separator.
+            columns (list, optional): Columns to keep, in file order. Defaults to every column.
+
+        Returns:
+            int: Number of data rows written.
+        """
+        schema = self.schema(file_path)
+        keep = range(len(schema.columns)) if columns is None else \
+            [i for i, col in enumerate(schema.columns) if col in columns]
+        temp_path = file_path + ".part"
+        rows = -1
+        with open(file_path, 'r', newline='', encoding='utf-8') as source, \
+                open(temp_path, 'w', newline='', encoding='utf-8') as target:
+            writer = csv.writer(target, delimiter=sep or schema.sep, lineterminator='\n')
+            for row in csv.reader(source, delimiter=schema.sep):
+                if row:
+                    writer.writerow([row[i] if i < len(row) else '' for i in keep])
+                    rows += 1
+        os.replace(temp_path, file_path)
+        self.forget(file_path)
+        return max(rows, 0)
+
+    def rewrite_header(self, file_path, columns):
+        """
+        Replaces the header line of a CSV file and copies the data rows as they are.
+
+        Args:
+            file_path (str): Path to the CSV file.
+            columns (list): New column names, one per column.
+        """
+        schema = self.schema(file_path)
+        temp_path = file_path + ".part"
+        with open(file_path, 'r', newline='', encoding='utf-8') as source, \
+                open(temp_path, 'w', newline='', encoding='utf-8') as target:
+            source.readline()
+            csv.writer(target, delimiter=schema.sep, lineterminator='\n').writerow(columns)
+            shutil.copyfileobj(source, target)
+        os.replace(temp_path, file_path)
+        self.forget(file_path)
+
+
+# Catalog shared by the stages of a process, worker processes build their own
+CATALOG = SchemaCatalog()
@@ -0,0 +1,503 @@
+import sqlite3
+import warnings
+
+import pandas as pd
+
+from source.instrumentation import record_io
+
+# Declared schema of the beer database: column types, primary key, foreign keys and, for the fact tables,
+# the natural key a row is identified by when a delta is upserted. Columns a table has beyond its declared
+# ones are added with a type inferred from their dtype. Fact table 'Location' values are region ids, so they
+# reference the Regions table.
+SCHEMA = {
+    "Categories": {
+        "columns": {"id": "INTEGER", "Name": "TEXT"},
+        "primary_key": ["id"],
+    },
+    "Subcategories": {
+        "columns": {"id": "INTEGER", "Category": "INTEGER", "Name": "TEXT"},
+        "primary_key": ["id"],
+        "foreign_keys": {"Category": ("Categories", "id")},
+    },
+    "Regions": {
+        "columns": {"id": "INTEGER", "Region": "TEXT"},
+        "primary_key": ["id"],
+    },
+    "Locations": {
+        "columns": {"Country_ID": "INTEGER", "Country_Code": "TEXT", "Country_Name": "TEXT", "Region_Name": "TEXT",
+                    "Region_ID": "INTEGER"},
+        "primary_key": ["Country_ID"],
+        "foreign_keys": {"Region_ID": ("Regions", "id")},
+    },
+    "Date_Table": {
+        "columns": {"Date": "TEXT", "Year": "INTEGER", "Quarter_Num": "INTEGER", "Quarter_Name": "TEXT",
+                    "Month_Num": "INTEGER", "Month_Name": "TEXT", "Month_MMM": "TEXT", "WeekOfYear_Num": "INTEGER",
+                    "DayOfMonth_Num": "INTEGER", "DayOfWeek_Num": "INTEGER", "DayOfWeek_Name": "TEXT",
+                    "DayOfWeek_MMM": "TEXT", "DayOfYear_Num": "INTEGER"},
+        "primary_key": ["Date"],
+    },
+    "Channel_Volume": {
+        "columns": {"Location": "INTEGER", "Industry": "TEXT", "Edition": "INTEGER", "Category_Name": "TEXT",
+                    "Hierarchy_Level": "INTEGER", "Data_Type": "TEXT", "Outlet": "TEXT", "Outlet_Hierarchy": "INTEGER",
+                    "Unit": "TEXT", "Year": "INTEGER", "Date": "TEXT", "Volume": "REAL", "Volume_Litres": "INTEGER",
+                    "Subcategory_Name": "TEXT"},
+        "foreign_keys": {"Location": ("Regions", "id"), "Date": ("Date_Table", "Date")},
+        "natural_key": ["Location", "Subcategory_Name", "Data_Type", "Outlet", "Date", "Edition"],
+    },
+    "Company_Share_GBO_unit": {
+        "columns": {"Location": "INTEGER", "Industry": "TEXT", "Subcategory_ID": "INTEGER", "Hierarchy_Level": "INTEGER",
+                    "Data_Type": "TEXT", "Global_Brand_Owner": "TEXT", "Unit": "TEXT", "Year": "INTEGER", "Date": "TEXT",
+                    "Year_minus_2016": "INTEGER", "Volume": "REAL", "Volume_Litres": "INTEGER", "Category_ID": "INTEGER",
+                    "Subcategory_Name": "TEXT", "Category_Name": "TEXT"},
+        "foreign_keys": {"Location": ("Regions", "id"), "Date": ("Date_Table", "Date"),
+                         "Subcategory_ID": ("Subcategories", "id"), "Category_ID": ("Categories", "id")},
+        "natural_key": ["Location", "Subcategory_ID", "Global_Brand_Owner", "Data_Type", "Date"],
+    },
+    "Market_Sizes": {
+        "columns": {"Location": "INTEGER", "Industry": "TEXT", "Subcategory_ID": "INTEGER", "Hierarchy_Level": "INTEGER",
+                    "Data_Type": "TEXT", "Unit": "TEXT", "Current_Constant": "TEXT", "Currency_Conversion": "TEXT",
+                    "Year": "INTEGER", "Date": "TEXT", "RSP": "REAL", "Volume": "REAL", "Year_minus_2016": "INTEGER",
+                    "Year_minus_2022": "INTEGER", "Edition": "INTEGER", "Category_ID": "INTEGER",
+                    "Subcategory_Name": "TEXT", "Category_Name": "TEXT"},
+        "foreign_keys": {"Location": ("Regions", "id"), "Date": ("Date_Table", "Date"),
+                         "Subcategory_ID": ("Subcategories", "id"), "Category_ID": ("Categories", "id")},
+        "natural_key": ["Location", "Subcategory_ID", "Data_Type", "Current_Constant", "Currency_Conversion",
+                        "Date", "Edition"],
+    },
+}
+
+# Surrogate keys of the star schema written by the star export, with the dimension table each key identifies.
+# The dimension tables have their key as primary key, and the fact tables keep the declared types of the measures
+# of their denormalized table and reference every key they have
+STAR_KEYS = {"Location_Key": "Dim_Location", "Subcategory_Key": "Dim_Subcategory", "Date_Key": "Dim_Date",
+             "Brand_Owner_Key": "Dim_Brand_Owner", "Outlet_Key": "Dim_Outlet", "Data_Type_Key": "Dim_Data_Type",
+             "Unit_Key": "Dim_Unit", "Industry_Key": "Dim_Industry", "Price_Basis_Key": "Dim_Price_Basis"}
+SCHEMA.update({dimension: {"primary_key": [key]} for key, dimension in STAR_KEYS.items()})
+SCHEMA.update({f"Fact_{name}": {"columns": SCHEMA[name]["columns"],
+                                 "foreign_keys": {key: (dimension, key) for key, dimension in STAR_KEYS.items()}}
+               for name in ["Channel_Volume", "Company_Share_GBO_unit", "Market_Sizes"]})
+
+# Columns indexed after the load, for the joins and filters of the dashboards and ad-hoc queries
+INDEXED_COLUMNS = ["Location", "Subcategory_ID", "Date", "Global_Brand_Owner",
+                   "Location_Key", "Subcategory_Key", "Date_Key", "Brand_Owner_Key"]
+
+# Number of rows sent to SQLite per executemany call
+BATCH_ROWS = 50000
+
+# Connection settings for the bulk load: no rollback journal on disk, no fsync, a large page cache,
+# and foreign keys checked once after the load rather than per row
+LOAD_PRAGMAS = ["PRAGMA journal_mode = MEMORY", "PRAGMA synchronous = OFF", "PRAGMA temp_store = MEMORY",
+                "PRAGMA cache_size = -262144", "PRAGMA foreign_keys = OFF"]
+
+
+def _sql_type(dtype):
+    """
+    Infers the SQLite column type of a pandas dtype.
+
+    Args:
+        dtype: pandas or NumPy dtype.
+
+    Returns:
+        str: 'INTEGER', 'REAL' or 'TEXT'.
+    """
+    if pd.api.types.is_bool_dtype(dtype) or pd.api.types.is_integer_dtype(dtype):
+        return "INTEGER"
+    if pd.api.types.is_float_dtype(dtype):
+        return "REAL"
+    return "TEXT"
+
+
+def _quote(name):
+    """
+    Quotes an SQL identifier.
+    """
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def table_columns(table_name, df):
+    """
+    Resolves the columns of a table from the declared schema and the columns of its DataFrame.
+
+    Args:
+        table_name (str): Name of the table.
+        df (pd.DataFrame): Table to load.
+
+    Returns:
+        dict: SQLite type of each column, in DataFrame column order.
+    """
+    declared = SCHEMA.get(table_name, {}).get("columns", {})
+    return {col: declared.get(col, _sql_type(df[col].dtype)) for col in df.columns}
+
+
+def create_table_sql(table_name, columns):
+    """
+    Builds the CREATE TABLE statement of a table, with the declared primary key and foreign keys
+    for the columns the table actually has.
+
+    Args:
+        table_name (str): Name of the table.
+        columns (dict): SQLite type of each column.
+
+    Returns:
+        str: CREATE TABLE statement.
+    """
+    schema = SCHEMA.get(table_name, {})
+    definitions = [f"{_quote(col)} {sql_type}" for col, sql_type in columns.items()]
+    primary_key = schema.get("primary_key", [])
+    if primary_key and all(col in columns for col in primary_key):
+        definitions.append(f"PRIMARY KEY ({', '.join(_quote(col) for col in primary_key)})")
+    for col, (ref_table, ref_col) in schema.get("foreign_keys", {}).items():
+        if col in columns:
+            definitions.append(f"FOREIGN KEY ({_quote(col)}) REFERENCES {_quote(ref_table)}({_quote(ref_col)})")
+    return f"CREATE TABLE {_quote(table_name)} (\n    " + ",\n    ".join(definitions) + "\n)"
+
+
+def _coerce_numeric(df, columns):
+    """
+    Converts text columns declared as numbers, e.g. comma decimal volumes read back from a CSV file,
+    when every value converts.
+
+    Args:
+        df (pd.DataFrame): Table to load.
+        columns (dict): SQLite type of each column.
+
+    Returns:
+        pd.DataFrame: The table, copied if any column was converted.
+    """
+    copied = False
+    for col, sql_type in columns.items():
+        if sql_type in ("INTEGER", "REAL") and df[col].dtype == 'object':
+            converted = pd.to_numeric(df[col].astype(str).str.replace(',', '.'), errors='coerce')
+            if converted.notna().sum() == df[col].notna().sum():
+                if not copied:
+                    df, copied = df.copy(), True
+                df[col] = converted
+    return df
+
+
+def _sql_values(df):
+    """
+    Prepares a table's values for the sqlite3 driver: dates as ISO text, Python scalars and None for missing values.
+
+    Args:
+        df (pd.DataFrame): Batch of rows.
+
+    Returns:
+        list: Row tuples.
+    """
+    columns = []
+    for col in df.columns:
+        values = df[col]
+        if pd.api.types.is_datetime64_any_dtype(values):
+            values = values.dt.strftime('%Y-%m-%d')
+        if isinstance(values.dtype, pd.api.extensions.ExtensionDtype) or values.dtype == 'object':
+            # Nullable and object columns can hold pd.NA, which the driver can't bind
+            values = values.astype(object).where(values.notna(), None)
+        # NumPy columns convert to Python scalars in one call, NaN is stored as NULL by SQLite
+        columns.append(values.tolist())
+    return list(zip(*columns))
+
+
+def tune_connection(conn):
+    """
+    Applies the bulk load PRAGMAs to a connection.
+
+    Args:
+        conn (sqlite3.Connection): Open connection to the database.
+    """
+    for pragma in LOAD_PRAGMAS:
+        conn.execute(pragma)
+
+
+def create_table(conn, table_name, df):
+    """
+    Drops a table and recreates it with its declared schema.
+
+    Args:
+        conn (sqlite3.Connection): Open connection to the database.
+        table_name (str): Name of the table.
+        df (pd.DataFrame): Table, or first chunk of the table, to be loaded.
+
+    Returns:
+        dict: SQLite type of each column.
+    """
+    columns = table_columns(table_name, df)
+    conn.execute(f"DROP TABLE IF EXISTS {_quote(table_name)}")
+    conn.execute(create_table_sql(table_name, columns))
+    return columns
+
+
+def insert_rows(conn, table_name, df, columns):
+    """
+    Inserts the rows of a DataFrame into a table with batched executemany calls.
+
+    Args:
+        conn (sqlite3.Connection): Open connection to the database.
+        table_name (str): Name of the table.
+        df (pd.DataFrame): Rows to insert.
+        columns (dict): SQLite type of each column.
+    """
+    names = list(columns)
+    df = _coerce_numeric(df[names], columns)
+    sql = (f"INSERT INTO {_quote(table_name)} ({', '.join(_quote(col) for col in names)}) "
+           f"VALUES ({', '.join('?' for _ in names)})")
+    for start in range(0, len(df), BATCH_ROWS):
+        conn.executemany(sql, _sql_values(df.iloc[start:start + BATCH_ROWS]))
+
+
+def upsert_key(table_name, columns):
+    """
+    Resolves the key rows of a table are matched on when a delta is upserted: its natural key,
+    or its primary key for the dimension tables.
+
+    Args:
+        table_name (str): Name of the table.
+        columns (iterable): Columns of the delta.
+
+    Returns:
+        list: Key columns, or None if the table has no key the delta has every column of.
+    """
+    schema = SCHEMA.get(table_name, {})
+    for key in (schema.get("natural_key"), schema.get("primary_key")):
+        if key and all(col in columns for col in key):
+            return key
+    return None
+
+
+def _existing_columns(conn, table_name):
+    """
+    Returns the columns of a table in the database, empty if the table doesn't exist.
+    """
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({_quote(table_name)})")]
+
+
+def upsert_rows(conn, table_name, df, key):
+    """
+    Upserts the rows of a delta into an existing table on its key: new keys are inserted, rows whose values
+    changed are updated in place, and unchanged and untouched rows and the indexes are left as they are.
+
+    The key is backed by a unique index, built the first time a table is upserted.
+
+    Args:
+        conn (sqlite3.Connection): Open connection to the database, in a transaction.
+        table_name (str): Name of the table.
+        df (pd.DataFrame): Delta rows.
+        key (list): Key columns, see upsert_key.
+
+    Returns:
+        tuple: Number of rows inserted and updated.
+
+    Raises:
+        ValueError: If the rows already in the table aren't unique on the key.
+    """
+    # Columns new in the delta are added to the table
+    existing = _existing_columns(conn, table_name)
+    columns = table_columns(table_name, df)
+    for col, sql_type in columns.items():
+        if col not in existing:
+            conn.execute(f"ALTER TABLE {_quote(table_name)} ADD COLUMN {_quote(col)} {sql_type}")
+
+    if key != SCHEMA.get(table_name, {}).get("primary_key"):
+        try:
+            conn.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {_quote(f'idx_{table_name}_key')} "
+                         f"ON {_quote(table_name)}({', '.join(_quote(col) for col in key)})")
+        except sqlite3.IntegrityError:
+            raise ValueError(f"Rows of {table_name} aren't unique on {', '.join(key)}, reload the table instead of upserting")
+
+    # Only rows with a changed value are updated
+    names = list(columns)
+    values = [col for col in names if col not in key]
+    sql = (f"INSERT INTO {_quote(table_name)} ({', '.join(_quote(col) for col in names)}) "
+           f"VALUES ({', '.join('?' for _ in names)}) ON CONFLICT ({', '.join(_quote(col) for col in key)}) ")
+    if values:
+        sql += (f"DO UPDATE SET {', '.join(f'{_quote(col)} = excluded.{_quote(col)}' for col in values)} "
+                f"WHERE {' OR '.join(f'{_quote(col)} IS NOT excluded.{_quote(col)}' for col in values)}")
+    else:
+        sql += "DO NOTHING"
+
+    rows_before = conn.execute(f"SELECT COUNT(*) FROM {_quote(table_name)}").fetchone()[0]
+    changes_before = conn.total_changes
+    df = _coerce_numeric(df[names], columns)
+    for start in range(0, len(df), BATCH_ROWS):
+        conn.executemany(sql, _sql_values(df.iloc[start:start + BATCH_ROWS]))
+    inserted = conn.execute(f"SELECT COUNT(*) FROM {_quote(table_name)}").fetchone()[0] - rows_before
+    return inserted, conn.total_changes - changes_before - inserted
+
+
+def create_indexes(conn, table_name, columns):
+    """
+    Builds the indexes of a table once its rows are loaded.
+
+    Args:
+        conn (sqlite3.Connection): Open connection to the database.
+        table_name (str): Name of the table.
+        columns (iterable): Columns of the table.
+    """
+    primary_key = SCHEMA.get(table_name, {}).get("primary_key", [])
+    for col in INDEXED_COLUMNS:
+        if col in columns and [col] != primary_key:
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {_quote(f'idx_{table_name}_{col}')} "
+                         f"ON {_quote(table_name)}({_quote(col)})")
+
+
+def check_foreign_keys(conn):
+    """
+    Counts the rows that break a declared foreign key, per table and column, and warns about them.
+
+    Each key is checked with one query against the primary key of the referenced table.
+
+    Args:
+        conn (sqlite3.Connection): Open connection to the database.
+
+    Returns:
+        dict: Number of violating rows per (table, column), for the keys with violations.
+    """
+    existing = {name: {row[1] for row in conn.execute(f"PRAGMA table_info({_quote(name)})")}
+                for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    violations = {}
+    for table_name, schema in SCHEMA.items():
+        for col, (ref_table, ref_col) in schema.get("foreign_keys", {}).items():
+            if col not in existing.get(table_name, ()) or ref_col not in existing.get(ref_table, ()):
+                continue
+            count = conn.execute(
+                f"SELECT COUNT(*) FROM {_quote(table_name)} AS t WHERE t.{_quote(col)} IS NOT NULL AND NOT EXISTS "
+                f"(SELECT 1 FROM {_quote(ref_table)} AS r WHERE r.{_quote(ref_col)} = t.{_quote(col)})").fetchone()[0]
+            if count:
+                violations[(table_name, col)] = count
+    _warn_violations(violations, "the database")
+    return violations
+
+
+def check_delta_foreign_keys(conn, tables):
+    """
+    Counts the rows of upserted deltas that break a declared foreign key, and warns about them.
+
+    Only the delta rows are checked, against the keys of the referenced tables, so the check doesn't scan
+    the history already in the database.
+
+    Args:
+        conn (sqlite3.Connection): Open connection to the database.
+        tables (dict): Delta of each table.
+
+    Returns:
+        dict: Number of violating rows per (table, column), for the keys with violations.
+    """
+    references = {}
+    violations = {}
+    for table_name, df in tables.items():
+        for col, (ref_table, ref_col) in SCHEMA.get(table_name, {}).get("foreign_keys", {}).items():
+            if col not in df.columns or ref_col not in _existing_columns(conn, ref_table):
+                continue
+            if (ref_table, ref_col) not in references:
+                references[(ref_table, ref_col)] = pd.Series(
+                    [row[0] for row in conn.execute(f"SELECT DISTINCT {_quote(ref_col)} FROM {_quote(ref_table)}")])
+            values = df[col]
+            if pd.api.types.is_datetime64_any_dtype(values):
+                values = values.dt.strftime('%Y-%m-%d')
+            count = int((values.notna() & ~values.isin(references[(ref_table, ref_col)])).sum())
+            if count:
+                violations[(table_name, col)] = count
+    _warn_violations(violations, "the upserted rows")
+    return violations
+
+
+def _warn_violations(violations, where):
+    """
+    Warns about foreign key violations, one entry per (table, column).
+    """
+    if violations:
+        listing = ", ".join(f"{table}.{col} -> {SCHEMA[table]['foreign_keys'][col][0]}: {count} rows"
+                            for (table, col), count in sorted(violations.items()))
+        warnings.warn(f"Foreign key violations in {where}: {listing}")
+
+
+def regions_table(locations_df):
+    """
+    Derives the region dimension (one row per region id) from the country level Locations table.
+
+    Args:
+        locations_df (pd.DataFrame): Locations table with 'Region_ID' and 'Region_Name' columns.
+
+    Returns:
+        pd.DataFrame: Region table with 'id' and 'Region' columns.
+    """
+    regions = locations_df[['Region_ID', 'Region_Name']].drop_duplicates(subset=['Region_ID'])
+    return regions.rename(columns={'Region_ID': 'id', 'Region_Name': 'Region'}).sort_values('id').reset_index(drop=True)
+
+
+def load_database(tables, db_path, upsert=False):
+    """
+    Loads tables into the SQLite database: each table is recreated with its declared schema and filled
+    in one transaction with batched inserts, then indexed, and the foreign keys are checked at the end.
+
+    In upsert mode the tables are deltas: their rows are upserted on the natural or primary key of tables
+    that already exist, all in a single transaction, so the cost follows the size of the delta rather than
+    the history in the database. Tables that don't exist yet or have no key are loaded as usual.
+
+    Args:
+        tables (dict): Table registry mapping table names to DataFrames.
+        db_path (str): Path to the SQLite database file.
+        upsert (bool, optional): Upsert the tables into the existing ones instead of recreating them.
+
+    Returns:
+        dict: Number of foreign key violations per (table, column).
+    """
+    # Data directories processed before the Regions table was written only have the country level Locations
+    tables = dict(tables)
+    if "Locations" in tables and "Regions" not in tables and 'Region_ID' in tables["Locations"].columns:
+        tables["Regions"] = regions_table(tables["Locations"])
+
+    # Autocommit mode, the transactions are managed explicitly
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        tune_connection(conn)
+        if upsert:
+            violations = _upsert_tables(conn, tables)
+            record_io("write", db_path, sum(len(df) for df in tables.values()))
+            return violations
+        for table_name, df in tables.items():
+            conn.execute("BEGIN")
+            columns = create_table(conn, table_name, df)
+            insert_rows(conn, table_name, df, columns)
+            create_indexes(conn, table_name, columns)
+            conn.execute("COMMIT")
+        conn.execute("ANALYZE")
+        violations = check_foreign_keys(conn)
+    finally:
+        conn.close()
+    record_io("write", db_path, sum(len(df) for df in tables.values()))
+    return violations
+
+
+def _upsert_tables(conn, tables):
+    """
+    Upserts deltas into their tables in one transaction, rolled back entirely if any table fails.
+
+    Args:
+        conn (sqlite3.Connection): Open connection to the database, in autocommit mode.
+        tables (dict): Delta of each table.
+
+    Returns:
+        dict: Number of foreign key violations of the delta rows per (table, column).
+    """
+    created = []
+    conn.execute("BEGIN")
+    try:
+        for table_name, df in tables.items():
+            key = upsert_key(table_name, df.columns)
+            if key is not None and _existing_columns(conn, table_name):
+                upsert_rows(conn, table_name, df, key)
+                create_indexes(conn, table_name, df.columns)
+            else:
+                columns = create_table(conn, table_name, df)
+                insert_rows(conn, table_name, df, columns)
+                create_indexes(conn, table_name, columns)
+                created.append(table_name)
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    # Only the new tables are analyzed, the statistics of the others still hold for a delta
+    for table_name in created:
+        conn.execute(f"ANALYZE {_quote(table_name)}")
+    return check_delta_foreign_keys(conn, tables)
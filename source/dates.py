@@ -0,0 +1,164 @@
+import numpy as np
+import pandas as pd
+
+# Range of years that fits in a datetime64[ns] column
+MIN_YEAR = pd.Timestamp.min.year + 1
+MAX_YEAR = pd.Timestamp.max.year - 1
+
+
+def to_year(values):
+    """
+    Converts year values to a nullable whole number column, coercing invalid or fractional years to NA.
+
+    Args:
+        values (pd.Series): Year values as numbers or text.
+
+    Returns:
+        pd.Series: Years with the Int64 dtype.
+    """
+    years = pd.to_numeric(values, errors='coerce')
+    # Fractional years can't be cast safely, treat them as invalid
+    if years.dtype.kind == 'f':
+        years = years.where(years == np.floor(years))
+    return years.astype(pd.Int64Dtype())
+
+
+def reconcile_year_dates(dates, years):
+    """
+    Moves dates to the year given in a year column where the two don't match, keeping month, day and time.
+
+    The work is done on int64/datetime64 arrays instead of Python Timestamps. A 29 February moved to a
+    non-leap year becomes 28 February, and target years outside the datetime64[ns] range give NaT.
+
+    Args:
+        dates (pd.Series): Dates with a datetime64 dtype.
+        years (pd.Series): Target years with the Int64 dtype.
+
+    Returns:
+        pd.Series: Reconciled dates, aligned with the input index.
+    """
+    tz = getattr(dates.dtype, 'tz', None)
+    if tz is not None:
+        dates = dates.dt.tz_localize(None)
+
+    values = dates.to_numpy(dtype='datetime64[ns]')
+    target = years.to_numpy(dtype='float64', na_value=np.nan)
+
+    # Split the dates into calendar parts
+    valid = ~np.isnat(values)
+    day_start = values.astype('datetime64[D]')
+    month_start = values.astype('datetime64[M]')
+    year = values.astype('datetime64[Y]').astype('int64') + 1970
+    month = month_start.astype('int64') % 12
+    day = (day_start - month_start.astype('datetime64[D]')).astype('int64')
+    time_of_day = values - day_start.astype('datetime64[ns]')
+
+    # Only rows with a date and a different, known year need adjusting
+    with np.errstate(invalid='ignore'):
+        change = valid & ~np.isnan(target) & (target != year)
+    if not change.any():
+        result = dates.copy()
+    else:
+        in_range = (target >= MIN_YEAR) & (target <= MAX_YEAR)
+        new_year = np.where(change & in_range, target, 1970).astype('int64')
+
+        # Rebuild the date in the target year, clamping the day to the length of the month
+        new_month_start = ((new_year - 1970) * 12 + month).astype('datetime64[M]')
+        month_length = ((new_month_start + 1).astype('datetime64[D]') - new_month_start.astype('datetime64[D]')).astype('int64')
+        new_day = new_month_start.astype('datetime64[D]') + np.minimum(day, month_length - 1)
+        moved = new_day.astype('datetime64[ns]') + time_of_day
+
+        result_values = np.where(change, moved, values)
+        result_values[change & ~in_range] = np.datetime64('NaT')
+        result = pd.Series(result_values, index=dates.index, name=dates.name)
+
+    if tz is not None:
+        result = result.dt.tz_localize(tz)
+    return result
+
+
+# English month and weekday names of the date dimension, looked up by number instead of formatted per row
+MONTH_NAMES = np.array(['January', 'February', 'March', 'April', 'May', 'June', 'July', 'August', 'September',
+                        'October', 'November', 'December'], dtype=object)
+DAY_NAMES = np.array(['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'], dtype=object)
+
+
+def date_dimension(start, end):
+    """
+    Builds the date dimension table with one row per day from start to end.
+
+    Every attribute is derived in one pass from the int64 day numbers of the range: calendar parts,
+    ISO week and the English names, which are looked up from the month and weekday numbers.
+
+    Args:
+        start: First date, as an ISO string or anything pd.Timestamp accepts.
+        end: Last date.
+
+    Returns:
+        pd.DataFrame: Date dimension table, empty if end is before start.
+    """
+    days = np.arange(np.datetime64(pd.Timestamp(start).date(), 'D'), np.datetime64(pd.Timestamp(end).date(), 'D') + 1)
+    day_number = days.astype('int64')
+
+    # Calendar parts
+    year_start = days.astype('datetime64[Y]')
+    month_start = days.astype('datetime64[M]')
+    year = year_start.astype('int64') + 1970
+    month = month_start.astype('int64') % 12 + 1
+    day_of_month = (days - month_start.astype('datetime64[D]')).astype('int64') + 1
+    day_of_year = (days - year_start.astype('datetime64[D]')).astype('int64') + 1
+    # 1 January 1970 was a Thursday, Monday is 0
+    day_of_week = (day_number + 3) % 7
+
+    # The ISO week belongs to the year of its Thursday and counts weeks from that year's first Thursday
+    thursday = days + (3 - day_of_week)
+    iso_week = (thursday - thursday.astype('datetime64[Y]').astype('datetime64[D]')).astype('int64') // 7 + 1
+
+    quarter = (month - 1) // 3 + 1
+    month_name = MONTH_NAMES[month - 1]
+    day_name = DAY_NAMES[day_of_week]
+    return pd.DataFrame({
+        'Date': days.astype('datetime64[ns]'),
+        'Year': year,
+        'Quarter_Num': quarter,
+        'Quarter_Name': np.array(['Q1', 'Q2', 'Q3', 'Q4'], dtype=object)[quarter - 1],
+        'Month_Num': month,
+        'Month_Name': month_name,
+        'Month_MMM': np.array([name[:3].upper() for name in MONTH_NAMES], dtype=object)[month - 1],
+        'WeekOfYear_Num': iso_week,
+        'DayOfMonth_Num': day_of_month,
+        'DayOfWeek_Num': day_of_week,
+        'DayOfWeek_Name': day_name,
+        'DayOfWeek_MMM': np.array([name[:3].upper() for name in DAY_NAMES], dtype=object)[day_of_week],
+        'DayOfYear_Num': day_of_year,
+    })
+
+
+def extend_date_dimension(date_table, start, end):
+    """
+    Extends a date dimension table to cover start to end, generating only the days before or after its current range.
+
+    Args:
+        date_table (pd.DataFrame): Existing date dimension table, sorted by 'Date'.
+        start: First date to cover.
+        end: Last date to cover.
+
+    Returns:
+        pd.DataFrame: The extended table, the existing table if it already covers the range.
+    """
+    if len(date_table) == 0:
+        return date_dimension(start, end)
+    # Dates read back from a CSV file are text
+    date_table = date_table.assign(Date=pd.to_datetime(date_table['Date']))
+    first, last = date_table['Date'].iloc[0], date_table['Date'].iloc[-1]
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+
+    parts = []
+    if start < first:
+        parts.append(date_dimension(start, first - pd.Timedelta(days=1)))
+    parts.append(date_table)
+    if end > last:
+        parts.append(date_dimension(last + pd.Timedelta(days=1), end))
+    if len(parts) == 1:
+        return date_table
+    return pd.concat(parts, ignore_index=True)
@@ -0,0 +1,183 @@
+import numpy as np
+import pandas as pd
+
+# Columns renamed in each fact table before its dimension columns are attached
+KEY_RENAMES = {
+    "Company_Share_GBO_unit": {'Subcategory': 'Subcategory_ID'},
+    "Market_Sizes": {'Subcategory': 'Subcategory_ID'},
+    "Channel_Volume": {'Category': 'Category_Name'},
+}
+
+# Dimension columns attached to each fact table, in order: (fact table key column, dimension table, dimension key
+# column, [(dimension column, attached column)]). A later attachment can key on a column attached by an earlier one.
+# Channel_Volume only has the names of its subcategories, so it is matched on the name
+ATTACHMENTS = {
+    "Company_Share_GBO_unit": [
+        ('Subcategory_ID', "Subcategories", 'id', [('Category', 'Category_ID'), ('Name', 'Subcategory_Name')]),
+        ('Category_ID', "Categories", 'id', [('Name', 'Category_Name')]),
+    ],
+    "Market_Sizes": [
+        ('Subcategory_ID', "Subcategories", 'id', [('Category', 'Category_ID'), ('Name', 'Subcategory_Name')]),
+        ('Category_ID', "Categories", 'id', [('Name', 'Category_Name')]),
+    ],
+    "Channel_Volume": [
+        ('Category_Name', "Subcategories", 'Name', [('Name', 'Subcategory_Name')]),
+    ],
+}
+
+# Integer keys are looked up in a dense array indexed by the key, as long as the array is at most this many times
+# larger than the dimension table, sparser keys are looked up in a hash index
+DENSE_FACTOR = 16
+
+
+def dimension_columns(table_name):
+    """
+    Returns the columns attached to a fact table by attach_dimensions, in order.
+
+    Args:
+        table_name (str): Name of the fact table.
+
+    Returns:
+        list: Attached column names, empty for tables without dimensions.
+    """
+    return [attached for _, _, _, columns in ATTACHMENTS.get(table_name, []) for _, attached in columns]
+
+
+def dimension_tables(table_name=None):
+    """
+    Returns the dimension tables attached to a fact table, or to any fact table.
+
+    Args:
+        table_name (str, optional): Name of the fact table. Defaults to every fact table.
+
+    Returns:
+        list: Dimension table names, in order of first use.
+    """
+    names = [table_name] if table_name is not None else list(ATTACHMENTS)
+    return list(dict.fromkeys(dimension for name in names for _, dimension, _, _ in ATTACHMENTS.get(name, [])))
+
+
+class DimensionLookup:
+    """
+    Finds the rows of a dimension table matching the keys of a fact table.
+
+    Integer ids are looked up in a dense array holding the row position of each id, so a lookup is a single
+    indexing operation over the fact column. Other keys go through a hash index, and categorical fact columns
+    are only looked up once per category and mapped back through their codes.
+    """
+
+    def __init__(self, table, key):
+        """
+        Args:
+            table (pd.DataFrame): Dimension table.
+            key (str): Column of the dimension table holding its unique key.
+
+        Raises:
+            ValueError: If the key column has duplicate values.
+        """
+        keys = table[key]
+        if keys.duplicated().any():
+            raise ValueError(f"Dimension key '{key}' has duplicate values: {keys[keys.duplicated()].unique().tolist()}")
+        self.table = table
+        self.key = key
+        self._dense = None
+        self._index = None
+        values = keys.to_numpy()
+        if (pd.api.types.is_integer_dtype(keys.dtype) and len(values) > 0 and values.min() >= 0
+                and values.max() < DENSE_FACTOR * len(values) + 1024):
+            self._dense = np.full(int(values.max()) + 1, -1, dtype=np.intp)
+            self._dense[values] = np.arange(len(values))
+        else:
+            self._index = pd.Index(keys)
+
+    def positions(self, values):
+        """
+        Finds the row of the dimension table matching each value.
+
+        Args:
+            values (pd.Series): Key column of the fact table.
+
+        Returns:
+            np.ndarray: Row position in the dimension table of each value, -1 where no row matches.
+        """
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            codes = values.cat.codes.to_numpy()
+            category_positions = self.positions(pd.Series(values.cat.categories))
+            if len(category_positions) == 0:
+                return np.full(len(codes), -1, dtype=np.intp)
+            return np.where(codes >= 0, category_positions[codes], -1)
+        if self._dense is None:
+            return self._index.get_indexer(values)
+        if not pd.api.types.is_numeric_dtype(values.dtype):
+            # Text keys never match integer ids
+            return np.full(len(values), -1, dtype=np.intp)
+        numbers = values.to_numpy(dtype=np.float64, na_value=np.nan) if values.hasnans else values.to_numpy()
+        valid = (numbers >= 0) & (numbers < len(self._dense))
+        if numbers.dtype.kind == 'f':
+            valid &= numbers == np.floor(numbers)
+        positions = np.full(len(numbers), -1, dtype=np.intp)
+        positions[valid] = self._dense[numbers[valid].astype(np.intp)]
+        return positions
+
+    def take(self, column, positions):
+        """
+        Returns a column of the dimension table at the given rows, as a left join would.
+
+        Text columns are returned as categoricals built from the codes of the dimension column, so their strings
+        aren't copied per row. Number columns with unmatched rows become floats with missing values.
+
+        Args:
+            column (str): Column of the dimension table.
+            positions (np.ndarray): Row positions from positions(), -1 for a missing value.
+
+        Returns:
+            np.ndarray or pd.Categorical: Values of the column for each position.
+        """
+        values = self.table[column]
+        missing = positions < 0
+        if values.dtype == 'object' or isinstance(values.dtype, pd.CategoricalDtype):
+            categorical = pd.Categorical(values)
+            codes = categorical.codes[positions]
+            codes[missing] = -1
+            return pd.Categorical.from_codes(codes, dtype=categorical.dtype)
+        result = values.to_numpy()[positions]
+        if missing.any():
+            result = result.astype(np.float64)
+            result[missing] = np.nan
+        return result
+
+
+def attach_dimensions(table_name, df, tables, force=False):
+    """
+    Attaches the dimension columns of a fact table in place, with the renames of KEY_RENAMES. Each attachment
+    adds columns to the fact table without copying it, unmatched keys give missing values as in a left join.
+
+    Args:
+        table_name (str): Name of the fact table.
+        df (pd.DataFrame): Fact table, updated in place.
+        tables (dict): Table registry holding the dimension tables.
+        force (bool, optional): Attach the columns again if the table already has them,
+            e.g. after the dimension tables changed.
+
+    Returns:
+        bool: Whether the table was updated.
+    """
+    attachments = ATTACHMENTS.get(table_name)
+    if not attachments:
+        return False
+    attached = dimension_columns(table_name)
+    if all(col in df.columns for col in attached):
+        if not force:
+            return False
+        df.drop(columns=attached, inplace=True)
+    df.rename(columns=KEY_RENAMES.get(table_name, {}), inplace=True)
+
+    lookups = {}
+    for fact_key, dimension, dimension_key, columns in attachments:
+        if (dimension, dimension_key) not in lookups:
+            lookups[dimension, dimension_key] = DimensionLookup(tables[dimension], dimension_key)
+        lookup = lookups[dimension, dimension_key]
+        positions = lookup.positions(df[fact_key])
+        for column, name in columns:
+            df[name] = lookup.take(column, positions)
+    return True
@@ -0,0 +1,473 @@
+import csv
+import os
+import sqlite3
+import warnings
+
+import pandas as pd
+
+from source.catalog import CATALOG, DTYPE_ORDER
+from source.database import (BATCH_ROWS, SCHEMA, _quote, check_foreign_keys, create_indexes, create_table_sql,
+                             tune_connection)
+from source.dates import MAX_YEAR, MIN_YEAR, date_dimension
+from source.instrumentation import record_io
+from source.locations import COUNTRIES_FILE
+
+# Fact tables merged with the Subcategories and Categories tables, as in the pandas path
+SUBCATEGORY_FACT_TABLES = ["Company_Share_GBO_unit", "Market_Sizes"]
+
+# Dimension tables built before the fact tables, which are merged with them
+DIMENSION_TABLES = ["Categories", "Subcategories", "Locations"]
+
+# Rows read from the database at a time when the tables are exported to CSV files
+EXPORT_ROWS = 100000
+
+# Range of dates that fits in a datetime64[ns] column, other dates are missing values in the pandas path
+MIN_DATE = pd.Timestamp.min.ceil('D').strftime('%Y-%m-%d')
+MAX_DATE = pd.Timestamp.max.floor('D').strftime('%Y-%m-%d')
+
+
+def stage_csv(conn, stage_name, file_path):
+    """
+    Copies a CSV file as text into a staging table, streaming its rows without parsing the values.
+    Fully blank rows are skipped, as the pandas path drops them.
+
+    Args:
+        conn (sqlite3.Connection): Open connection with the staging database attached as 'staging'.
+        stage_name (str): Name of the staging table.
+        file_path (str): Path to the CSV file.
+
+    Returns:
+        FileSchema: Catalog entry of the file, its header gives the columns of the staging table.
+    """
+    schema = CATALOG.schema(file_path)
+    table = f"staging.{_quote(stage_name)}"
+    conn.execute(f"DROP TABLE IF EXISTS {table}")
+    conn.execute(f"CREATE TABLE {table} ({', '.join(_quote(col) + ' TEXT' for col in schema.columns)})")
+    sql = f"INSERT INTO {table} VALUES ({', '.join('?' for _ in schema.columns)})"
+    width = len(schema.columns)
+    rows = 0
+    with open(file_path, 'r', newline='', encoding='utf-8') as f:
+        reader = csv.reader(f, delimiter=schema.sep)
+        next(reader, None)
+        batch = []
+        for row in reader:
+            if not any(row):
+                continue
+            batch.append((row + [''] * width)[:width])
+            if len(batch) == BATCH_ROWS:
+                conn.executemany(sql, batch)
+                rows += len(batch)
+                batch = []
+        conn.executemany(sql, batch)
+        rows += len(batch)
+    record_io("read", file_path, rows)
+    return check_staged_dtypes(conn, stage_name, file_path, schema)
+
+
+def _kind_sql(col):
+    """
+    Builds the expression classifying a staged value: 0 for missing values and integers, 1 for other numbers
+    with a comma or a dot as the decimal separator, 2 for text.
+    """
+    value = f"s.{_quote(col)}"
+    integer = f"({value} GLOB '[0-9]*' OR {value} GLOB '-[0-9]*') AND NOT substr({value}, 2) GLOB '*[^0-9]*'"
+    number = f"{value} GLOB '*[0-9]*' AND NOT {value} GLOB '*[^0-9,.eE+-]*'"
+    return f"MAX(CASE WHEN {value} = '' OR ({integer}) THEN 0 WHEN {number} THEN 1 ELSE 2 END)"
+
+
+def check_staged_dtypes(conn, stage_name, file_path, schema):
+    """
+    Checks the dtypes sniffed from a sample of a file against every staged row, in one pass over the staging
+    table, and widens the columns whose later rows don't fit, as the pandas path does when it parses them.
+
+    Args:
+        conn (sqlite3.Connection): Open connection with the staging database attached as 'staging'.
+        stage_name (str): Name of the staging table.
+        file_path (str): Path to the staged CSV file.
+        schema (FileSchema): Catalog entry of the file.
+
+    Returns:
+        FileSchema: Catalog entry of the file with the widened dtypes.
+    """
+    numeric = [col for col in schema.columns if schema.dtypes.get(col) in ('int64', 'float64')]
+    if not numeric:
+        return schema
+    kinds = conn.execute(f"SELECT {', '.join(_kind_sql(col) for col in numeric)} "
+                         f"FROM staging.{_quote(stage_name)} AS s").fetchone()
+    widened = {col: DTYPE_ORDER[kind] for col, kind in zip(numeric, kinds) if kind}
+    if not widened:
+        return schema
+    CATALOG.widen(file_path, widened)
+    return CATALOG.schema(file_path)
+
+
+def _literal(text):
+    """
+    Quotes an SQL string literal.
+    """
+    return "'" + str(text).replace("'", "''") + "'"
+
+
+def _typed_sql(col, dtype):
+    """
+    Builds the expression converting a staged text column to the type the pandas path reads it as.
+    Empty fields are missing values, comma decimals are numbers, and float columns other than 'Volume'
+    are truncated to integers as int_conversion does.
+
+    Returns:
+        tuple: SQL expression over the staged row 's' and the SQLite type of its values.
+    """
+    value = f"NULLIF(s.{_quote(col)}, '')"
+    if dtype == 'int64':
+        return f"CAST({value} AS INTEGER)", "INTEGER"
+    if dtype == 'float64':
+        number = f"to_real({value})"
+        return (number, "REAL") if col == 'Volume' else (f"CAST({number} AS INTEGER)", "INTEGER")
+    return value, "TEXT"
+
+
+def to_real(text):
+    """
+    Parses a number written with a comma or a dot as the decimal separator, as the pandas path reads it.
+    Registered as an SQL function, since SQLite's own text to REAL conversion doesn't always round to the
+    nearest double.
+
+    Args:
+        text (str): Number as text, or None.
+
+    Returns:
+        float: Parsed number, None for missing or invalid numbers.
+    """
+    if text is None:
+        return None
+    try:
+        return float(text.replace(',', '.'))
+    except (AttributeError, ValueError):
+        return None
+
+
+def _year_sql(col):
+    """
+    Builds the expression converting a staged year to a whole number, missing for invalid or fractional years.
+    """
+    value = f"TRIM(s.{_quote(col)})"
+    return (f"CASE WHEN {value} GLOB '*[0-9]*' AND NOT {value} GLOB '*[^0-9.+-]*' "
+            f"AND CAST({value} AS REAL) = CAST({value} AS INTEGER) THEN CAST({value} AS INTEGER) END")
+
+
+def _date_sql(col):
+    """
+    Builds the expression parsing a staged ISO date, missing for invalid dates and dates out of datetime64 range.
+    """
+    value = f"NULLIF(s.{_quote(col)}, '')"
+    return (f"CASE WHEN date({value}) = SUBSTR({value}, 1, 10) AND date({value}) BETWEEN '{MIN_DATE}' AND '{MAX_DATE}' "
+            f"THEN date({value}) END")
+
+
+def _reconcile_sql(date, year):
+    """
+    Builds the expression moving a date to the year of the row where the two don't match, as
+    reconcile_year_dates does: 29 February becomes 28 February in a non-leap year, and years out of
+    datetime64 range give a missing date.
+    """
+    leap = f"({year} % 4 = 0 AND ({year} % 100 <> 0 OR {year} % 400 = 0))"
+    return (f"CASE WHEN {date} IS NULL OR {year} IS NULL OR {year} = CAST(SUBSTR({date}, 1, 4) AS INTEGER) THEN {date} "
+            f"WHEN {year} < {MIN_YEAR} OR {year} > {MAX_YEAR} THEN NULL "
+            f"WHEN SUBSTR({date}, 6, 5) = '02-29' AND NOT {leap} THEN printf('%04d-02-28', {year}) "
+            f"ELSE printf('%04d', {year}) || SUBSTR({date}, 5) END")
+
+
+def _round_half_even_sql(value):
+    """
+    Builds the expression rounding to a whole number with ties to even, as NumPy does, where SQLite's
+    ROUND rounds ties away from zero.
+    """
+    return (f"CASE WHEN ABS({value} - CAST({value} AS INTEGER)) = 0.5 THEN 2 * ROUND({value} / 2) "
+            f"ELSE ROUND({value}) END")
+
+
+def _column_plan(table_name, columns, dtypes):
+    """
+    Plans the typed columns of a staged table, with the date fix and the column renames of the pandas path.
+
+    Returns:
+        list: (output column, SQL expression over the staged row 's', SQLite type) in output column order.
+    """
+    plan = []
+    for col in columns:
+        name = col
+        if col in ('Year', 'Year_text'):
+            plan.append(('Year', _year_sql(col), "INTEGER"))
+            continue
+        if col == 'Year_date':
+            plan.append(('Date', _date_sql(col), "TEXT"))
+            continue
+        if table_name == "Channel_Volume" and 'Subcategory' in columns:
+            # Channel_Volume keeps its Subcategory names as its Category column
+            if col == 'Category':
+                continue
+            if col == 'Subcategory':
+                name = 'Category'
+        plan.append((name, *_typed_sql(col, dtypes.get(col, 'object'))))
+    return plan
+
+
+def _create_table(conn, table_name, types):
+    """
+    Recreates a table with its declared schema, the declared types taking precedence over the planned ones.
+    """
+    declared = SCHEMA.get(table_name, {}).get("columns", {})
+    columns = {col: declared.get(col, sql_type) for col, sql_type in types.items()}
+    # The staging tables have the same names, so the table is qualified
+    conn.execute(f"DROP TABLE IF EXISTS main.{_quote(table_name)}")
+    conn.execute(create_table_sql(table_name, columns))
+    return columns
+
+
+def unknown_unit_counts(conn, stage_name, table_name=None):
+    """
+    Counts the staged rows of each unit missing from the unit registry and warns about them, as to_litres does.
+
+    Returns:
+        pd.Series: Number of rows per unknown unit.
+    """
+    rows = conn.execute(f"SELECT s.Unit, COUNT(*) FROM staging.{_quote(stage_name)} AS s "
+                        f"LEFT JOIN staging.units AS u ON u.Unit = s.Unit "
+                        f"WHERE u.Unit IS NULL AND NULLIF(s.Unit, '') IS NOT NULL GROUP BY s.Unit "
+                        f"ORDER BY COUNT(*) DESC").fetchall()
+    unknown = pd.Series({unit: count for unit, count in rows}, dtype='int64')
+    if len(unknown) > 0:
+        listing = ", ".join(f"'{unit}' ({count} rows)" for unit, count in unknown.items())
+        warnings.warn(f"Unknown units in {table_name or 'table'}: {listing}")
+    return unknown
+
+
+def transform_table(conn, table_name, schema):
+    """
+    Builds a table from its staging table with set-based SQL: type conversion, date reconciliation,
+    the litre conversion of the volumes, the column renames and the merge with the dimension tables.
+
+    Args:
+        conn (sqlite3.Connection): Open connection with the staging database attached as 'staging'.
+        table_name (str): Name of the table, its staging table has the same name.
+        schema (FileSchema): Catalog entry of the staged file.
+
+    Returns:
+        tuple: SQLite type of each column of the built table and the number of rows per unknown unit.
+    """
+    columns = schema.columns
+    plan = _column_plan(table_name, columns, schema.dtypes)
+    names = [name for name, _, _ in plan]
+
+    # Typed staged rows, in file order
+    inner = (f"SELECT {', '.join(f'{expr} AS {_quote(name)}' for name, expr, _ in plan)}, s.rowid AS _row "
+             f"FROM staging.{_quote(table_name)} AS s")
+    select = {name: f"t.{_quote(name)}" for name in names}
+    types = {name: sql_type for name, _, sql_type in plan}
+    joins = []
+    unknown = pd.Series(dtype='int64')
+
+    # Move the dates to the year of their row
+    if 'Date' in names and 'Year' in names and 'Year_date' in columns:
+        select['Date'] = _reconcile_sql("t.Date", "t.Year")
+
+    # Volumes in litres, only for tables with litre based units. Volumes already in litres are kept as they
+    # are, rows in other units have none
+    litres = None
+    if 'Unit' in names and 'Volume' in names:
+        unknown = unknown_unit_counts(conn, table_name, table_name)
+        litre_rows = conn.execute(
+            f"SELECT COUNT(u.Unit) FROM staging.{_quote(table_name)} AS s "
+            f"JOIN staging.units AS u ON u.Unit = s.Unit AND u.Base_Unit = 'litres'").fetchone()[0]
+        if litre_rows:
+            joins.append("LEFT JOIN staging.units AS u ON u.Unit = t.Unit AND u.Base_Unit = 'litres'")
+            litres = (f"CASE WHEN u.Multiplier = 1 THEN t.Volume WHEN u.Multiplier IS NOT NULL THEN "
+                      f"{_round_half_even_sql('t.Volume * u.Multiplier')} END")
+            select['Volume_Litres'] = litres
+            types['Volume_Litres'] = "INTEGER"
+
+    # Merge the dimension tables
+    if table_name in SUBCATEGORY_FACT_TABLES and 'Subcategory_Name' not in names:
+        if 'Subcategory' in names:
+            # Renamed in place, the column keeps its position
+            select = {('Subcategory_ID' if name == 'Subcategory' else name): expr for name, expr in select.items()}
+            types = {('Subcategory_ID' if name == 'Subcategory' else name): sql_type for name, sql_type in types.items()}
+        joins.append(f"LEFT JOIN main.Subcategories AS sc ON sc.id = {select['Subcategory_ID']}")
+        joins.append("LEFT JOIN main.Categories AS c ON c.id = sc.Category")
+        select.update({'Category_ID': "sc.Category", 'Subcategory_Name': "sc.Name", 'Category_Name': "c.Name"})
+        types.update({'Category_ID': "INTEGER", 'Subcategory_Name': "TEXT", 'Category_Name': "TEXT"})
+    elif table_name == "Channel_Volume" and 'Category' in names and 'Subcategory_Name' not in names:
+        select = {('Category_Name' if name == 'Category' else name): expr for name, expr in select.items()}
+        types = {('Category_Name' if name == 'Category' else name): sql_type for name, sql_type in types.items()}
+        # Matched on the name, as attach_dimensions does
+        joins.append("LEFT JOIN main.Subcategories AS sc ON sc.Name = t.Category")
+        select['Subcategory_Name'] = "sc.Name"
+        types['Subcategory_Name'] = "TEXT"
+
+    _create_table(conn, table_name, types)
+    conn.execute(f"INSERT INTO {_quote(table_name)} ({', '.join(_quote(col) for col in select)}) "
+                 f"SELECT {', '.join(select.values())} FROM ({inner}) AS t {' '.join(joins)} ORDER BY t._row")
+
+    # Volumes in litres are integers unless one has decimals, as litre_values decides over the whole table
+    if litres is not None:
+        fractional = conn.execute(f"SELECT EXISTS (SELECT 1 FROM {_quote(table_name)} "
+                                  f"WHERE typeof(Volume_Litres) = 'real')").fetchone()[0]
+        types['Volume_Litres'] = "REAL" if fractional else "INTEGER"
+    return types, unknown
+
+
+def expand_locations_sql(conn, columns):
+    """
+    Builds the Regions table and the country level Locations table from the staged, transposed Locations
+    extract: the region columns are unpivoted with one UNION ALL branch per region and joined with the
+    staged country registry on the region name.
+
+    Args:
+        conn (sqlite3.Connection): Open connection with the staging database attached as 'staging'.
+        columns (list): Columns of the staged extract, 'id' and one per region id.
+
+    Returns:
+        dict: SQLite type of each column of the Regions and of the Locations table.
+    """
+    first = columns[0]
+    unpivot = " UNION ALL ".join(
+        f"SELECT {position} AS position, CAST({_literal(col)} AS INTEGER) AS id, "
+        f"NULLIF({_quote(col)}, '') AS Region FROM staging.Locations WHERE {_quote(first)} = 'Region'"
+        for position, col in enumerate(columns[1:]))
+    regions = f"SELECT * FROM ({unpivot}) WHERE Region IS NOT NULL"
+
+    types = {"Regions": _create_table(conn, "Regions", {"id": "INTEGER", "Region": "TEXT"})}
+    # The first region of each id is kept, as regions_dimension does
+    conn.execute(f"INSERT INTO Regions (id, Region) SELECT id, Region FROM "
+                 f"(SELECT id, Region, MIN(position) FROM ({regions}) GROUP BY id) ORDER BY id")
+
+    types["Locations"] = _create_table(conn, "Locations", {"Country_ID": "INTEGER", "Country_Code": "TEXT",
+                                                           "Country_Name": "TEXT", "Region_Name": "TEXT",
+                                                           "Region_ID": "INTEGER"})
+    conn.execute(f"INSERT INTO Locations (Country_ID, Country_Code, Country_Name, Region_Name, Region_ID) "
+                 f"SELECT CAST(c.Country_ID AS INTEGER), c.Country_Code, c.Country_Name, c.Region_Name, r.id "
+                 f"FROM ({regions}) AS r JOIN staging.countries AS c ON c.Region_Name = r.Region "
+                 f"ORDER BY r.position, c.rowid")
+    return types
+
+
+def _stage_units(conn, registry):
+    """
+    Copies the unit registry into the staging database.
+    """
+    conn.execute("DROP TABLE IF EXISTS staging.units")
+    conn.execute("CREATE TABLE staging.units (Unit TEXT PRIMARY KEY, Base_Unit TEXT, Multiplier REAL)")
+    conn.executemany("INSERT INTO staging.units VALUES (?, ?, ?)",
+                     [(unit, row['Base_Unit'], float(row['Multiplier'])) for unit, row in registry.iterrows()])
+
+
+def _build_date_table(conn, tables):
+    """
+    Builds the date dimension over the range of the 'Date' columns of the built tables, found with one
+    MIN/MAX query per table. The dimension itself is small and built with date_dimension.
+
+    Returns:
+        pd.DataFrame: Date dimension table.
+    """
+    ranges = [conn.execute(f"SELECT MIN(Date), MAX(Date) FROM {_quote(name)}").fetchone()
+              for name, types in tables.items() if 'Date' in types]
+    ranges = [(start, end) for start, end in ranges if start is not None]
+    if not ranges:
+        return date_dimension('1970-01-01', '1969-12-31')
+    return date_dimension(min(start for start, _ in ranges), max(end for _, end in ranges))
+
+
+def export_table(conn, table_name, types, csv_path):
+    """
+    Exports a table to a CSV file for Tableau in chunks, with comma as the decimal separator and the integer
+    columns written as integers, as the pandas path writes them.
+
+    Args:
+        conn (sqlite3.Connection): Open connection to the database.
+        table_name (str): Name of the table.
+        types (dict): Planned SQLite type of each column.
+        csv_path (str): Path to the CSV file to write.
+    """
+    dtypes = {col: 'Int64' for col, sql_type in types.items() if sql_type == "INTEGER"}
+    rows = 0
+    chunks = pd.read_sql(f"SELECT * FROM {_quote(table_name)}", conn, chunksize=EXPORT_ROWS, dtype=dtypes)
+    for i, chunk in enumerate(chunks):
+        chunk.to_csv(csv_path, index=False, decimal=',', mode='w' if i == 0 else 'a', header=i == 0)
+        rows += len(chunk)
+    record_io("write", csv_path, rows)
+
+
+def run_elt(data_dir, db_path, registry, countries_file=None):
+    """
+    Runs the pipeline inside SQLite: the CSV files are staged as text into a staging database once, and the
+    tables are built from them with set-based SQL, so the fact tables never go through pandas. The results
+    are the tables of the pandas path, which are then indexed, checked and exported to the CSV files.
+
+    Args:
+        data_dir (str): Path to the directory containing CSV files.
+        db_path (str): Path to the SQLite database file to be created.
+        registry (pd.DataFrame): Unit registry indexed by unit name.
+        countries_file (str, optional): Path to the country registry. Defaults to the registry shipped with the package.
+
+    Returns:
+        dict: Number of rows per unknown unit, per table.
+    """
+    paths = {os.path.splitext(file)[0]: os.path.join(data_dir, file)
+             for file in sorted(os.listdir(data_dir)) if file.endswith(".csv")}
+    # The date dimension is rebuilt from the fact tables
+    paths.pop("Date_Table", None)
+    staging_path = db_path + ".staging"
+    if os.path.exists(staging_path):
+        os.remove(staging_path)
+
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        tune_connection(conn)
+        conn.create_function("to_real", 1, to_real, deterministic=True)
+        conn.execute("ATTACH DATABASE ? AS staging", (staging_path,))
+        conn.execute("PRAGMA staging.journal_mode = OFF")
+        conn.execute("PRAGMA staging.synchronous = OFF")
+
+        # Stage the extracts, the country registry and the unit registry
+        conn.execute("BEGIN")
+        schemas = {name: stage_csv(conn, name, path) for name, path in paths.items()}
+        stage_csv(conn, "countries", countries_file or COUNTRIES_FILE)
+        _stage_units(conn, registry)
+        conn.execute("COMMIT")
+
+        # Build the dimension tables first, the fact tables are merged with them
+        conn.execute("BEGIN")
+        tables = {}
+        unknown_units = {}
+        order = [name for name in DIMENSION_TABLES if name in paths] + \
+                [name for name in paths if name not in DIMENSION_TABLES]
+        for name in order:
+            if name == "Locations" and 'Country_Code' not in schemas[name].columns:
+                tables.update(expand_locations_sql(conn, schemas[name].columns))
+            else:
+                tables[name], unknown = transform_table(conn, name, schemas[name])
+                if 'Unit' in tables[name]:
+                    unknown_units[name] = unknown
+
+        # Create the date dimension from the range of the built tables
+        date_table = _build_date_table(conn, tables)
+        columns = _create_table(conn, "Date_Table", {col: "TEXT" for col in date_table.columns})
+        conn.executemany(f"INSERT INTO Date_Table VALUES ({', '.join('?' for _ in columns)})",
+                         list(zip(date_table['Date'].dt.strftime('%Y-%m-%d'),
+                                  *(date_table[col].tolist() for col in date_table.columns[1:]))))
+        for name, types in tables.items():
+            create_indexes(conn, name, types)
+        conn.execute("COMMIT")
+        conn.execute("DETACH DATABASE staging")
+        conn.execute("ANALYZE")
+        check_foreign_keys(conn)
+
+        # Export the tables for Tableau
+        for name, types in tables.items():
+            export_table(conn, name, types, os.path.join(data_dir, name + ".csv"))
+        date_table.to_csv(os.path.join(data_dir, "Date_Table.csv"), index=False, decimal=',')
+    finally:
+        conn.close()
+        if os.path.exists(staging_path):
+            os.remove(staging_path)
+    return unknown_units
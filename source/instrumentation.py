@@ -0,0 +1,318 @@
+import cProfile
+import functools
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager, nullcontext
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Reads and writes of the file or stage being measured in this process, None when nothing is measured
+_io_log = None
+
+
+# Peak resident memory in MB reached so far in each block measured by track_peak_rss in this process,
+# innermost last, and the highest peak of the process seen before a block reset its high-water mark
+_peak_scopes = []
+_process_peak = 0.0
+
+
+def peak_rss_mb():
+    """
+    Returns the peak resident memory of this process and its finished child processes since they started,
+    in megabytes. This is the high-water mark of the whole process, not of the stage running.
+
+    Returns:
+        float: Peak RSS, None where the resource module isn't available.
+    """
+    if resource is None:
+        return None
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # Linux reports kilobytes, macOS bytes
+    peak = round(peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10, 1)
+    # Resetting the high-water mark for a stage also resets ru_maxrss
+    return max(peak, _process_peak)
+
+
+def _high_water_mb():
+    """
+    Returns the resident memory high-water mark of this process (VmHWM), in megabytes, None without /proc.
+    """
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 2 ** 10, 1)
+    except OSError:
+        pass
+    return None
+
+
+def _reset_high_water():
+    """
+    Resets the resident memory high-water mark of this process to its current RSS, where Linux allows it.
+
+    Returns:
+        bool: Whether the high-water mark was reset.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+    except OSError:
+        return False
+    return True
+
+
+@contextmanager
+def track_peak_rss():
+    """
+    Measures the peak resident memory of this process within the block.
+
+    The high-water mark is reset when the block starts, and the peak reached before is kept for the
+    enclosing blocks, so nested blocks each get their own peak. Where the high-water mark can't be reset,
+    the peak of the whole process since it started is reported instead.
+
+    Yields:
+        dict: Filled when the block ends with 'peak_rss_mb' and 'peak_rss_scope', 'stage' for the peak of the
+        block itself and 'process' for the process high-water mark.
+    """
+    global _process_peak
+    peak = {}
+    before = _high_water_mb()
+    reset = before is not None and _reset_high_water()
+    if reset:
+        _process_peak = max(_process_peak, before)
+        if _peak_scopes:
+            _peak_scopes[-1] = max(_peak_scopes[-1], before)
+    _peak_scopes.append(0.0)
+    try:
+        yield peak
+    finally:
+        nested = _peak_scopes.pop()
+        after = _high_water_mb() if reset else None
+        if after is not None:
+            value = max(after, nested)
+            _process_peak = max(_process_peak, value)
+            if _peak_scopes:
+                _peak_scopes[-1] = max(_peak_scopes[-1], value)
+            peak.update(peak_rss_mb=value, peak_rss_scope="stage")
+        else:
+            peak.update(peak_rss_mb=peak_rss_mb(), peak_rss_scope="process")
+
+
+def record_io(kind, path, rows):
+    """
+    Records a table read or write while a stage or file is being measured. Does nothing otherwise.
+
+    Args:
+        kind (str): 'read' or 'write'.
+        path (str): Path of the file read or written.
+        rows (int): Number of rows read or written.
+    """
+    if _io_log is None:
+        return
+    _io_log.append((kind, path, rows, os.path.getsize(path) if os.path.exists(path) else 0))
+
+
+@contextmanager
+def track_io():
+    """
+    Collects the reads and writes recorded with record_io within the block.
+
+    Yields:
+        list: (kind, path, rows, bytes) of each read and write, filled as the block runs.
+    """
+    global _io_log
+    previous, _io_log = _io_log, []
+    log = _io_log
+    try:
+        yield log
+    finally:
+        _io_log = previous
+        # Nested measurements also count towards the enclosing one
+        if previous is not None:
+            previous.extend(log)
+
+
+def _io_totals(log):
+    """
+    Sums the rows and bytes read and written of an I/O log.
+    """
+    totals = {"rows_in": 0, "rows_out": 0, "bytes_read": 0, "bytes_written": 0}
+    for kind, _, rows, size in log:
+        if kind == "read":
+            totals["rows_in"] += rows
+            totals["bytes_read"] += size
+        else:
+            totals["rows_out"] += rows
+            totals["bytes_written"] += size
+    return totals
+
+
+def measure_call(label, func, args):
+    """
+    Runs a per-file function and measures it, in whichever process runs it.
+
+    Args:
+        label (str): File the call works on, used by the runner to report failures.
+        func (callable): Module level per-file function.
+        args (tuple): Its arguments.
+
+    Returns:
+        tuple: The function's result and the measurements of the call.
+    """
+    with track_io() as log, track_peak_rss() as peak:
+        start = time.perf_counter()
+        result = func(*args)
+        seconds = time.perf_counter() - start
+    metrics = {"seconds": round(seconds, 6), **_io_totals(log), **peak, "pid": os.getpid()}
+    return result, metrics
+
+
+class StageRecorder:
+    """
+    Records the wall time, rows and bytes in and out and the peak RSS of each stage a DataProcessor runs,
+    and of each file of the per-file stages, and writes them to a JSON run report. The peak RSS of a stage
+    is its own peak where the platform allows it, see track_peak_rss.
+
+    A disabled recorder only hands out a shared no-op context, so the stages run as they would without it.
+    """
+
+    def __init__(self, enabled=False, profile_stage=None, profile_path=None):
+        """
+        Args:
+            enabled (bool, optional): Record the stages.
+            profile_stage (str, optional): Name of a stage to run under cProfile.
+            profile_path (str, optional): File the cProfile statistics are dumped to.
+                Defaults to '<profile_stage>.prof' in the working directory.
+        """
+        self.enabled = enabled or profile_stage is not None
+        self.profile_stage = profile_stage
+        self.profile_path = profile_path or (f"{profile_stage}.prof" if profile_stage else None)
+        self.stages = []
+        self.hooks = []
+        self._stack = []
+        self._started = time.time()
+
+    def add_hook(self, hook):
+        """
+        Registers a function called with the record of each stage as it finishes.
+
+        Args:
+            hook (callable): Function taking the stage record dict.
+        """
+        self.hooks.append(hook)
+
+    def stage(self, name):
+        """
+        Measures a stage.
+
+        Args:
+            name (str): Name of the stage.
+
+        Returns:
+            context manager: Yields the stage record, or None when the recorder is disabled.
+        """
+        if not self.enabled:
+            return nullcontext()
+        return self._measure_stage(name)
+
+    @contextmanager
+    def _measure_stage(self, name):
+        record = {"stage": name, "parent": self._stack[-1]["stage"] if self._stack else None, "files": []}
+        self._stack.append(record)
+        profiler = cProfile.Profile() if name == self.profile_stage else None
+        try:
+            with track_io() as log, track_peak_rss() as peak:
+                start = time.perf_counter()
+                if profiler is not None:
+                    profiler.enable()
+                try:
+                    yield record
+                finally:
+                    if profiler is not None:
+                        profiler.disable()
+                    record["seconds"] = round(time.perf_counter() - start, 6)
+            record.update(_io_totals(log))
+            record.update(peak)
+            if profiler is not None:
+                profiler.dump_stats(self.profile_path)
+                record["profile"] = os.path.abspath(self.profile_path)
+        finally:
+            self._stack.pop()
+        self.stages.append(record)
+        for hook in self.hooks:
+            hook(record)
+
+    def run_per_file(self, run, func, calls):
+        """
+        Runs a per-file function through a runner, measuring each file in the process that handles it.
+
+        Args:
+            run (callable): Runner taking (func, calls), e.g. a bound _run_per_file.
+            func (callable): Module level per-file function.
+            calls (list): Argument tuples, one per file.
+
+        Returns:
+            list: Result of each call.
+        """
+        if not self.enabled:
+            return run(func, calls)
+        outputs = run(measure_call, [(args[0], func, args) for args in calls])
+        record = self._stack[-1] if self._stack else None
+        results = []
+        for args, (result, metrics) in zip(calls, outputs):
+            if record is not None:
+                record["files"].append({"file": _file_label(args), **metrics})
+                # Files read and written in worker processes aren't in this process' I/O log
+                if metrics["pid"] != os.getpid() and _io_log is not None:
+                    _io_log.extend([("read", None, metrics["rows_in"], metrics["bytes_read"]),
+                                    ("write", None, metrics["rows_out"], metrics["bytes_written"])])
+            results.append(result)
+        return results
+
+    def report(self):
+        """
+        Returns the run report.
+
+        Returns:
+            dict: Start time, total wall time, peak RSS of the whole process and the record of each stage in the
+            order they finished.
+        """
+        return {"started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self._started)),
+                "seconds": round(time.time() - self._started, 3), "peak_rss_mb": peak_rss_mb(), "stages": self.stages}
+
+    def write_report(self, path):
+        """
+        Writes the run report as JSON.
+
+        Args:
+            path (str): Path to the report file.
+        """
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=2)
+
+
+def _file_label(args):
+    """
+    Names the file of a per-file call after its first CSV path argument.
+    """
+    for arg in args:
+        if isinstance(arg, str) and arg.endswith(".csv"):
+            return arg
+    return str(args[0])
+
+
+def instrumented(method):
+    """
+    Decorates a DataProcessor stage method so it is recorded as a stage named after the method.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.recorder.stage(method.__name__):
+            return method(self, *args, **kwargs)
+    return wrapper
@@ -0,0 +1,65 @@
+import os
+
+import pandas as pd
+
+# Country registry, one row per country with its surrogate key and the region it belongs to
+COUNTRIES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "countries.csv")
+
+# Columns of the country level Locations table
+LOCATION_COLUMNS = ['Country_ID', 'Country_Code', 'Country_Name', 'Region_Name', 'Region_ID']
+
+
+def load_country_registry(countries_file=None):
+    """
+    Loads the country registry from a CSV file with 'Country_ID', 'Country_Code', 'Country_Name' and 'Region_Name' columns.
+
+    New countries are added by adding a row to the file with a new 'Country_ID', no code changes are needed.
+
+    Args:
+        countries_file (str, optional): Path to the registry CSV file. Defaults to the registry shipped with the package.
+
+    Returns:
+        pd.DataFrame: Country registry in file order.
+    """
+    # 'NA' is the country code of Namibia, only empty fields are missing values
+    return pd.read_csv(countries_file or COUNTRIES_FILE, keep_default_na=False, na_values=[''],
+                       dtype={'Country_ID': 'int64', 'Country_Code': str, 'Country_Name': str, 'Region_Name': str})
+
+
+def regions_dimension(regions_table):
+    """
+    Builds the region dimension from the transposed Locations extract.
+
+    Every region of the extract is kept, including regions without countries such as 'World',
+    since the fact tables refer to them by id.
+
+    Args:
+        regions_table (pd.DataFrame): Region table with 'id' and 'Region' columns.
+
+    Returns:
+        pd.DataFrame: Region table with integer 'id' and 'Region' columns, sorted by id.
+    """
+    regions = regions_table[['id', 'Region']].dropna(subset=['id']).drop_duplicates(subset=['id'])
+    regions = regions.astype({'id': 'int64'})
+    return regions.sort_values('id').reset_index(drop=True)
+
+
+def expand_locations(regions_table, countries=None):
+    """
+    Expands the region table to one row per country of each region with a single join on the region name.
+
+    Args:
+        regions_table (pd.DataFrame): Region table with 'id' and 'Region' columns.
+        countries (pd.DataFrame, optional): Country registry. Defaults to the registry shipped with the package.
+
+    Returns:
+        pd.DataFrame: Location table with country ids, country codes, country names, region names and region ids,
+        in region order and registry order within a region.
+    """
+    if countries is None:
+        countries = load_country_registry()
+    regions = regions_table[['id', 'Region']].rename(columns={'id': 'Region_ID', 'Region': 'Region_Name'})
+    # An inner join keeps the order of the regions, and the registry order of the countries within a region
+    locations = regions.merge(countries, on='Region_Name', how='inner')
+    return locations[LOCATION_COLUMNS].reset_index(drop=True)
+
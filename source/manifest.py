@@ -0,0 +1,131 @@
+import hashlib
+import json
+import os
+
+# Name of the manifest file kept next to the CSV files
+MANIFEST_FILE = ".pipeline_manifest.json"
+
+
+def file_hash(file_path, block_size=1 << 20):
+    """
+    Computes the SHA-256 content hash of a file, reading it in blocks.
+
+    Args:
+        file_path (str): Path to the file.
+        block_size (int, optional): Number of bytes read at a time.
+
+    Returns:
+        str: Hex digest of the file contents.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class BuildManifest:
+    """
+    Records the content hash, stage versions and date range of every table written by the pipeline,
+    and the tables loaded into the database, so a rerun can skip the work whose inputs are unchanged.
+    """
+
+    def __init__(self, data_dir):
+        """
+        Args:
+            data_dir (str): Path to the directory containing CSV files and the manifest.
+        """
+        self.path = os.path.join(data_dir, MANIFEST_FILE)
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as f:
+                manifest = json.load(f)
+        else:
+            manifest = {}
+        self.tables = manifest.get("tables", {})
+        self.database = manifest.get("database", {})
+
+    def is_current(self, table_name, content_hash, stage, version):
+        """
+        Checks whether a file is the output recorded for a table and was produced by the given stage version.
+
+        Args:
+            table_name (str): Name of the table.
+            content_hash (str): Current content hash of the table's file.
+            stage (str): Name of the stage.
+            version (int): Current version of the stage.
+
+        Returns:
+            bool: True if the stage can be skipped for the table.
+        """
+        record = self.tables.get(table_name)
+        return (record is not None and record["hash"] == content_hash
+                and record["versions"].get(stage) == version)
+
+    def date_range(self, table_name):
+        """
+        Returns the recorded (min, max) of the table's 'Date' column, or None if it isn't known.
+        """
+        record = self.tables.get(table_name)
+        if record is None or record.get("date_range") is None:
+            return None
+        return tuple(record["date_range"])
+
+    def record_table(self, table_name, content_hash, versions, date_range=None):
+        """
+        Records the output of the pipeline for a table.
+
+        Args:
+            table_name (str): Name of the table.
+            content_hash (str): Content hash of the written file.
+            versions (dict): Versions of the stages that produced the file.
+            date_range (tuple, optional): (min, max) of the table's 'Date' column as ISO strings.
+        """
+        self.tables[table_name] = {"hash": content_hash, "versions": dict(versions),
+                                   "date_range": list(date_range) if date_range else None}
+
+    def forget_missing(self, table_names):
+        """
+        Drops the records of tables whose file no longer exists.
+
+        Args:
+            table_names (iterable): Names of the tables currently present.
+        """
+        present = set(table_names)
+        self.tables = {name: record for name, record in self.tables.items() if name in present}
+
+    def database_is_current(self, db_path, version):
+        """
+        Checks whether the database file is the one recorded by the last run.
+
+        Args:
+            db_path (str): Path to the SQLite database file.
+            version (int): Current version of the database stage.
+
+        Returns:
+            bool: True if only changed tables need to be loaded into the database.
+        """
+        return (os.path.exists(db_path)
+                and self.database.get("path") == os.path.abspath(db_path)
+                and self.database.get("version") == version
+                and self.database.get("size") == os.path.getsize(db_path))
+
+    def record_database(self, db_path, version, table_hashes):
+        """
+        Records the database file and the content hash of each table loaded into it.
+
+        Args:
+            db_path (str): Path to the SQLite database file.
+            version (int): Version of the database stage.
+            table_hashes (dict): Content hash of each table loaded in this run.
+        """
+        tables = dict(self.database.get("tables", {}))
+        tables.update(table_hashes)
+        self.database = {"path": os.path.abspath(db_path), "version": version,
+                         "size": os.path.getsize(db_path), "tables": tables}
+
+    def save(self):
+        """
+        Writes the manifest to disk.
+        """
+        with open(self.path, 'w') as f:
+            json.dump({"tables": self.tables, "database": self.database}, f, indent=2, sort_keys=True)
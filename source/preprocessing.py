@@ -1,11 +1,726 @@
+import csv
 import os
 import pandas as pd
 import sqlite3
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from source.catalog import CATALOG
+from source.database import create_indexes, create_table, insert_rows, load_database, tune_connection
+from source.dates import date_dimension, extend_date_dimension, reconcile_year_dates, to_year
+from source.dimensions import ATTACHMENTS, attach_dimensions, dimension_tables
+from source.elt import run_elt
+from source.instrumentation import StageRecorder, instrumented, record_io
+from source.locations import expand_locations, regions_dimension
+from source.manifest import BuildManifest, file_hash
+from source.rollups import refresh_rollups
+from source.schema import compact_table, memory_report
+from source.star import SOURCE_TABLES, export_star
+from source.storage import (drop_columns, export_csv, intermediate_path, list_tables, load_table, rename_columns,
+                            resolve_storage, save_table)
+from source.strings import NORMALIZER, StringNormalizer
+from source.units import load_unit_registry, to_litres
+from source.validation import combine_results, reference_keys, validate_table, write_quarantine
+
+# Fact tables the dimension columns are attached to, and the dimension tables they come from
+FACT_TABLES = list(ATTACHMENTS)
+DIMENSION_TABLES = dimension_tables()
+
+# Fact tables processed in bounded-size chunks by the streaming mode, and the estimated
+# peak memory of a chunk relative to its parsed size
+STREAMED_TABLES = FACT_TABLES
+STREAM_MEMORY_FACTOR = 5
+
+# Version of each pipeline stage, bump a version when the stage's output changes so incremental runs redo it
+STAGE_VERSIONS = {"prepare": 2, "merge": 2, "date_table": 2, "database": 2}
+
+
+def _csv_files(path):
+    """
+    Lists the CSV files for a directory or a single CSV file path.
+
+    Args:
+        path (str): Path to the directory containing CSV files or path to a single CSV file.
+
+    Returns:
+        list: Full paths of the CSV files, sorted by file name.
+    """
+    # Check if the path is a directory or a file
+    if os.path.isdir(path):
+        return [os.path.join(path, file) for file in sorted(os.listdir(path)) if file.endswith(".csv")]
+    return [path] if path.endswith(".csv") else []
+
+
+def _table_name(file_path):
+    """
+    Derives the table name of a CSV file (file name without the '.csv' extension).
+
+    Args:
+        file_path (str): Path to the CSV file.
+
+    Returns:
+        str: Table name.
+    """
+    return os.path.splitext(os.path.basename(file_path))[0]
+
+
+def _read_csv(file_path, columns=None):
+    """
+    Reads a CSV file into a DataFrame with the separator, decimal separator and dtypes of its catalog entry.
+    The repeated text columns are read as categoricals, comma decimals as floats, and only empty fields
+    are missing values, so codes such as Namibia's 'NA' survive a rerun.
+
+    Args:
+        file_path (str): Path to the CSV file.
+        columns (list, optional): Only read these columns.
+
+    Returns:
+        pd.DataFrame: Parsed file contents.
+    """
+    df = CATALOG.read_csv(file_path, columns)
+    record_io("read", file_path, len(df))
+    return df
+
+
+def _drop_blank_rows(df):
+    """
+    Drops fully blank rows from a DataFrame.
+
+    Args:
+        df (pd.DataFrame): Table to clean.
+
+    Returns:
+        pd.DataFrame: Table without fully blank rows.
+    """
+    # Drop by label rather than slicing, so the result is not a view-like copy that warns on assignment
+    blank = df.isna().all(axis=1)
+    return df.drop(index=df.index[blank]) if blank.any() else df
+
+
+def _raw_rows(df):
+    """
+    Turns a table read with a header row back into the rows of the file, as read without a header row.
+
+    Args:
+        df (pd.DataFrame): Table read with a header row.
+
+    Returns:
+        pd.DataFrame: Table whose first row holds the header values.
+    """
+    return pd.DataFrame([df.columns.tolist()] + df.values.tolist())
+
+
+def _transpose_locations(df):
+    """
+    Transposes the raw location table and drops rows with NaN values in the 'Region' column.
+
+    Args:
+        df (pd.DataFrame): Raw location table read without a header row.
+
+    Returns:
+        pd.DataFrame: Region table with 'id' and 'Region' columns.
+    """
+    # Transpose the DataFrame
+    transposed_df = df.transpose()
+
+    # Set the column names to id, Region, and Country
+    transposed_df.columns = transposed_df.iloc[0]
+    transposed_df = transposed_df.drop(0)  # Remove the initial row of column indices
+
+    # Drop the "Country" column
+    transposed_df = transposed_df.drop(columns=["Country"])
+
+    # Drop rows with NaN values in the "Region" column
+    transposed_df = transposed_df.dropna(subset=["Region"])
+
+    # Reset the index
+    transposed_df.reset_index(drop=True, inplace=True)
+    transposed_df.columns.name = None
+    return transposed_df
+
+
+def _parse_dates(df):
+    """
+    Converts the 'Year' or 'Year_text' column to whole numbers, renaming 'Year_text' to 'Year', and the
+    'Year_date' column to datetime.
+
+    Args:
+        df (pd.DataFrame): Table to update.
+
+    Returns:
+        pd.DataFrame: Updated table.
+    """
+    # Locate 'Year_text' column and ensure it's a whole number numerical type
+    if 'Year_text' in df.columns:
+        df['Year_text'] = to_year(df['Year_text'])  # Convert to whole number
+        df = df.rename(columns={'Year_text': 'Year'})  # Rename 'Year_text' to 'Year'
+
+    # Locate 'Year' column and ensure it's a whole number numerical type
+    if 'Year' in df.columns:
+        df['Year'] = to_year(df['Year'])  # Convert to whole number
+
+    # Convert 'Year_date' column to datetime
+    if 'Year_date' in df.columns:
+        df['Year_date'] = pd.to_datetime(df['Year_date'], errors='coerce')
+    return df
+
+
+def _reconcile_dates(df):
+    """
+    Adjusts the year of the parsed 'Year_date' column to match the 'Year' column if they don't match.
+
+    Args:
+        df (pd.DataFrame): Table with parsed years and dates, updated in place.
+
+    Returns:
+        pd.DataFrame: Updated table.
+    """
+    if 'Year_date' in df.columns and 'Year' in df.columns:
+        df['Year_date'] = reconcile_year_dates(df['Year_date'], df['Year'])
+    return df
+
+
+def _format_dates(df):
+    """
+    Converts the 'Year_date' column to datetime, adjusts the year to match the 'Year' or 'Year_text' column
+    if they don't match, and renames 'Year_text' to 'Year'.
+
+    Args:
+        df (pd.DataFrame): Table to update.
+
+    Returns:
+        pd.DataFrame: Updated table.
+    """
+    return _reconcile_dates(_parse_dates(df))
+
+
+def _convert_ints(df):
+    """
+    Converts float type columns to integers with no decimals, except for the 'Volume' column.
+
+    Args:
+        df (pd.DataFrame): Table to update.
+
+    Returns:
+        pd.DataFrame: Updated table.
+    """
+    # Iterate through each column
+    for col in df.columns:
+        # Check if the column is float type and not the 'Volume' column
+        if df[col].dtype == 'float' and col != 'Volume':
+            # Convert the values to integers without decimals after handling non-finite values
+            df[col] = df[col].astype(int).round(0)
+    return df
+
+
+def _standardize_units(df, registry, table_name=None):
+    """
+    Calculates the 'Volume_Litres' column from the 'Volume' and 'Unit' columns.
+
+    Args:
+        df (pd.DataFrame): Table to update.
+        registry (pd.DataFrame): Unit registry indexed by unit name.
+        table_name (str, optional): Table name used when reporting unknown units.
+
+    Returns:
+        pd.Series: Number of rows per unit missing from the registry, empty if the table has no units.
+    """
+    # Check if 'Unit' and 'Volume' columns exist
+    if 'Unit' not in df.columns or 'Volume' not in df.columns:
+        return pd.Series(dtype='int64')
+
+    # Convert 'Volume' column to float, it is kept as a comma decimal string between CSV stages
+    if df['Volume'].dtype == 'object':
+        df['Volume'] = df['Volume'].str.replace(',', '.').astype(float)
+    else:
+        df['Volume'] = df['Volume'].astype(float)
+
+    # Convert litre based units with the unit registry
+    return to_litres(df, registry, table_name)
+
+
+def _merge_dim_tables(tables, names=None, force=False):
+    """
+    Attaches the columns of the Subcategories and Categories dimension tables to the fact tables of a table registry.
+
+    Args:
+        tables (dict): Table registry mapping table names to DataFrames, updated in place.
+        names (iterable, optional): Fact tables to merge. Defaults to every fact table in the registry.
+        force (bool, optional): Re-merge fact tables that already have the dimension columns,
+            e.g. after the dimension tables changed.
+
+    Returns:
+        list: Names of the fact tables that were updated.
+    """
+    updated = []
+    for name in FACT_TABLES:
+        if name not in tables or (names is not None and name not in names):
+            continue
+        # The columns are attached in place, the fact table isn't copied
+        if attach_dimensions(name, tables[name], tables, force=force):
+            compact_table(tables[name])
+            updated.append(name)
+    return updated
+
+
+def _date_range(df):
+    """
+    Finds the range of dates present in the 'Date' column of a table.
+
+    Args:
+        df (pd.DataFrame): Table to scan.
+
+    Returns:
+        tuple: (min, max) date as ISO strings, or None if the table has no dates.
+    """
+    if 'Date' not in df.columns:
+        return None
+    dates = pd.to_datetime(df['Date'])
+    if dates.isna().all():
+        return None
+    return dates.min().strftime('%Y-%m-%d'), dates.max().strftime('%Y-%m-%d')
+
+
+def _build_date_table(date_ranges):
+    """
+    Builds a date dimension table covering the given date ranges, from the earliest to the latest date.
+
+    Args:
+        date_ranges (iterable): (min, max) date pairs, None entries are skipped.
+
+    Returns:
+        pd.DataFrame: Date dimension table.
+    """
+    # One global range instead of a range per table
+    date_ranges = [date_range for date_range in date_ranges if date_range]
+    if not date_ranges:
+        return date_dimension('1970-01-01', '1969-12-31')
+    return date_dimension(min(start for start, _ in date_ranges), max(end for _, end in date_ranges))
+
+
+def _prepare_table(table_name, df, registry, references=None, quarantine=False):
+    """
+    Applies the row-local stages to a table read from its CSV file: blank row drop, the Locations transpose and
+    country expansion, validation, date fix, float to integer conversion, unit conversion and column renames.
+
+    Args:
+        table_name (str): Name of the table.
+        df (pd.DataFrame): Table as read from its CSV file.
+        registry (pd.DataFrame): Unit registry indexed by unit name.
+        references (dict, optional): Keys of the tables referenced by the table's foreign keys, from reference_keys.
+        quarantine (bool, optional): Move the rows failing validation out of the table instead of raising.
+
+    Returns:
+        tuple: The prepared tables by name, the number of rows per unknown unit and the ValidationResult.
+        The raw Locations extract gives both the country level Locations table and the Regions table.
+
+    Raises:
+        ValidationError: If rows can't be processed and quarantine is False.
+    """
+    # Drop blank rows
+    df = _drop_blank_rows(df)
+
+    # Transpose the Location table, read without a header row as the file based stage does
+    if table_name == "Locations" and 'Region' not in df.columns and 'Country_Code' not in df.columns:
+        df = _transpose_locations(_raw_rows(df))
+        df['id'] = pd.to_numeric(df['id'])
+
+    # Check every rule on the parsed columns before a stage trips over them
+    df, validation = validate_table(table_name, _parse_dates(df), registry, references, quarantine)
+
+    # Standardize the dates, convert float columns and calculate volumes in litres
+    df = _convert_ints(_reconcile_dates(df))
+    unknown = _standardize_units(df, registry, table_name)
+
+    # Drop and rename columns
+    if table_name == "Channel_Volume" and 'Subcategory' in df.columns:
+        df = df.drop(columns=["Category"], errors='ignore').rename(columns={"Subcategory": "Category"})
+    df = df.rename(columns={"Year_date": "Date"})
+
+    # Split the regions into the region dimension and the countries of each region
+    if table_name == "Locations" and 'Region' in df.columns:
+        return {"Regions": regions_dimension(df), "Locations": expand_locations(df)}, unknown, validation
+
+    # Store repeated strings as categoricals and ids and years in small integers
+    return {table_name: compact_table(df)}, unknown, validation
+
+
+def _chunk_rows(file_path, memory_budget, sample_rows=1000):
+    """
+    Estimates how many rows of a CSV file can be processed at once within a memory budget.
+
+    The in-memory size of a sample of rows is measured and multiplied by STREAM_MEMORY_FACTOR to leave room
+    for the copies made by the stages.
+
+    Args:
+        file_path (str): Path to the CSV file.
+        memory_budget (int): Memory budget in bytes.
+        sample_rows (int, optional): Number of rows to measure.
+
+    Returns:
+        int: Number of rows per chunk, at least 1.
+    """
+    sample = CATALOG.read_csv(file_path, nrows=sample_rows)
+    if len(sample) == 0:
+        return sample_rows
+    row_bytes = sample.memory_usage(index=True, deep=True).sum() / len(sample)
+    return max(1, int(memory_budget / (row_bytes * STREAM_MEMORY_FACTOR)))
+
+
+def _stream_table(table_name, file_path, dimensions, registry, conn, chunk_rows, references=None, quarantine=False):
+    """
+    Processes a fact table chunk by chunk through the row-local stages and the dimension merge,
+    appending each chunk to the output CSV file and the SQLite table as it goes.
+
+    The output is written to a temporary file that replaces the input file once the whole table is done.
+
+    Args:
+        table_name (str): Name of the table.
+        file_path (str): Path to the CSV file, replaced by the processed table.
+        dimensions (dict): Subcategories and Categories tables.
+        registry (pd.DataFrame): Unit registry indexed by unit name.
+        conn (sqlite3.Connection): Open connection to the database, in a transaction.
+        chunk_rows (int): Number of rows per chunk.
+        references (dict, optional): Keys of the tables referenced by the table's foreign keys, from reference_keys.
+        quarantine (bool, optional): Move the rows failing validation out of the table instead of raising.
+
+    Returns:
+        tuple: (min, max) of the table's 'Date' column, the number of rows per unknown unit and the
+        ValidationResult of the whole table.
+    """
+    temp_path = file_path + ".part"
+    date_range = None
+    unknown = []
+    validation = []
+    columns = None
+    rows = 0
+    # Whether chunks wrote each number column as integers or as floats, see _float_columns
+    number_kinds = {}
+    for chunk in CATALOG.read_csv(file_path, chunksize=chunk_rows):
+        # Row-local stages and dimension merge on the chunk alone
+        prepared, chunk_unknown, chunk_validation = _prepare_table(table_name, chunk, registry, references, quarantine)
+        chunk_tables = dict(dimensions, **prepared)
+        _merge_dim_tables(chunk_tables, [table_name])
+        chunk = chunk_tables[table_name]
+        unknown.append(chunk_unknown)
+        validation.append(chunk_validation)
+
+        # Keep track of the date range
+        chunk_range = _date_range(chunk)
+        if chunk_range is not None:
+            date_range = chunk_range if date_range is None else (min(date_range[0], chunk_range[0]), max(date_range[1], chunk_range[1]))
+
+        # Append the chunk to the output file and the database table
+        rows += len(chunk)
+        first = columns is None
+        chunk.to_csv(temp_path, index=False, decimal=',', mode='w' if first else 'a', header=first)
+        if first:
+            columns = create_table(conn, table_name, chunk)
+        insert_rows(conn, table_name, chunk, columns)
+        for col in chunk.columns:
+            if len(chunk) and chunk[col].dtype.kind in 'if':
+                number_kinds.setdefault(col, set()).add(chunk[col].dtype.kind)
+
+    # A column of the whole table is floats once a chunk has a number with decimals, e.g. the volumes in
+    # litres or a volume the sampled rows didn't show, as in the pipeline mode, so the chunks written as
+    # integers are written as floats too
+    mixed = [col for col, kinds in number_kinds.items() if len(kinds) > 1]
+    if mixed:
+        _float_columns(temp_path, mixed)
+
+    # Index the table once all its rows are in
+    if columns is not None:
+        create_indexes(conn, table_name, columns)
+    record_io("read", file_path, rows)
+    os.replace(temp_path, file_path)
+    record_io("write", file_path, rows)
+    unknown = [counts for counts in unknown if len(counts)]
+    unknown = pd.concat(unknown).groupby(level=0, observed=True).sum() if unknown else pd.Series(dtype='int64')
+    return date_range, unknown, combine_results(validation)
+
+
+def _float_columns(file_path, columns):
+    """
+    Rewrites the integers of columns of a comma separated, comma decimal CSV file as pandas writes floats,
+    e.g. '4199' as '4199,0'. The other columns are copied as they are.
+
+    Args:
+        file_path (str): Path to the CSV file, rewritten in place.
+        columns (list): Names of the columns.
+    """
+    temp_path = file_path + ".float"
+    with open(file_path, 'r', newline='', encoding='utf-8') as source, \
+            open(temp_path, 'w', newline='', encoding='utf-8') as target:
+        reader = csv.reader(source)
+        writer = csv.writer(target, lineterminator='\n')
+        header = next(reader)
+        writer.writerow(header)
+        positions = [header.index(col) for col in columns]
+        for row in reader:
+            for position in positions:
+                value = row[position]
+                if value and ',' not in value:
+                    row[position] = str(float(value)).replace('.', ',')
+            writer.writerow(row)
+    os.replace(temp_path, file_path)
+
+
+class ProcessingError(Exception):
+    """
+    Raised when a stage failed for one or more files. The failures of every file are collected before raising.
+    """
+
+    def __init__(self, errors):
+        """
+        Args:
+            errors (dict): Exception raised for each failed file path.
+        """
+        self.errors = errors
+        details = "; ".join(f"{path}: {type(error).__name__}: {error}" for path, error in errors.items())
+        super().__init__(f"{len(errors)} file(s) failed: {details}")
+
+
+def _comma_delimiter_file(file_path, storage):
+    """
+    Converts a semicolon separated CSV file to comma-separated format, or reads any CSV file into its
+    Feather intermediate file when the storage format is 'feather'.
+
+    Args:
+        file_path (str): Path to the CSV file.
+        storage (str): Intermediate storage format, 'feather' or 'csv'.
+    """
+    if storage == "feather":
+        # Parse the extract once, the later stages read the typed intermediate file
+        save_table(_read_csv(file_path), file_path, storage)
+        return
+
+    # Rewrite the rows with comma separators, the values themselves are left as they are
+    if CATALOG.schema(file_path).sep != ',':
+        rows = CATALOG.rewrite_rows(file_path, sep=',')
+        record_io("read", file_path, rows)
+        record_io("write", file_path, rows)
+
+
+def _drop_rows_file(file_path, storage):
+    """
+    Drops fully blank rows from a CSV file.
+
+    Args:
+        file_path (str): Path to the CSV file.
+        storage (str): Intermediate storage format, 'feather' or 'csv'.
+    """
+    # Read the table into a DataFrame
+    df = load_table(file_path, storage)
+    # Drop fully blank rows
+    df = _drop_blank_rows(df)
+    # Write back to the table file
+    save_table(df, file_path, storage, sep=',')
+
+
+def _format_date_file(file_path, storage):
+    """
+    Fixes the 'Year_date' and year columns of a CSV file.
+
+    Args:
+        file_path (str): Path to the CSV file.
+        storage (str): Intermediate storage format, 'feather' or 'csv'.
+    """
+    # Read the table into a DataFrame
+    df = load_table(file_path, storage)
+    # Fix the dates
+    df = _format_dates(df)
+    # Write back to the table file
+    save_table(df, file_path, storage)
+
+
+def _int_conversion_file(file_path, storage):
+    """
+    Converts the float columns of a CSV file, other than 'Volume', to integers.
+
+    Args:
+        file_path (str): Path to the CSV file.
+        storage (str): Intermediate storage format, 'feather' or 'csv'.
+    """
+    # Read the table into a DataFrame
+    df = load_table(file_path, storage)
+    # Convert the float columns
+    df = _convert_ints(df)
+    # Write back to the table file with comma as the decimal separator
+    save_table(df, file_path, storage, decimal=',')
+
+
+def _standardize_units_file(file_path, registry, storage):
+    """
+    Calculates the volume in litres of a CSV file.
+
+    Args:
+        file_path (str): Path to the CSV file.
+        registry (pd.DataFrame): Unit registry indexed by unit name.
+        storage (str): Intermediate storage format, 'feather' or 'csv'.
+
+    Returns:
+        pd.Series: Number of rows per unknown unit.
+    """
+    # Read the table into a DataFrame
+    df = load_table(file_path, storage)
+    unknown = _standardize_units(df, registry, _table_name(file_path))
+    # Write back to the table file with updated volume in litres
+    if 'Volume_Litres' in df.columns:
+        save_table(df, file_path, storage, decimal=',')
+    return unknown
+
+
+def _fix_string_columns_file(file_path, storage, normalizer=None):
+    """
+    Capitalizes the first letter of each word of the string columns of a CSV file.
+
+    Args:
+        file_path (str): Path to the CSV file.
+        storage (str): Intermediate storage format, 'feather' or 'csv'.
+        normalizer (StringNormalizer, optional): Normalizer with the rule of each column. Defaults to the
+            normalizer of the default rules.
+    """
+    # Read the table into a DataFrame
+    df = load_table(file_path, storage)
+    # Normalize each distinct string once, with the memo of the files normalized before
+    (normalizer or NORMALIZER).normalize(df)
+    # Write the updated DataFrame back to the table file
+    save_table(df, file_path, storage)
+
+
+def _prepare_file(table_name, file_path, registry, references=None, quarantine=False):
+    """
+    Reads a CSV file and applies the row-local stages to it.
+
+    Args:
+        table_name (str): Name of the table.
+        file_path (str): Path to the CSV file.
+        registry (pd.DataFrame): Unit registry indexed by unit name.
+        references (dict, optional): Keys of the tables referenced by the table's foreign keys, from reference_keys.
+        quarantine (bool, optional): Move the rows failing validation out of the table instead of raising.
+
+    Returns:
+        tuple: The prepared tables by name, the number of rows per unknown unit and the ValidationResult.
+    """
+    return _prepare_table(table_name, _read_csv(file_path), registry, references, quarantine)
+
+
+def _run_per_file(func, calls, workers=1):
+    """
+    Runs a per-file function for each set of arguments, across a process pool when more than one worker is given.
+
+    Results are returned in the order of the calls whatever order the workers finish in, and a failure in
+    one file doesn't stop the others: every failure is collected and raised together afterwards.
+
+    Args:
+        func (callable): Module level function taking a file path as its first argument.
+        calls (list): Argument tuples, one per file.
+        workers (int, optional): Number of worker processes.
+
+    Returns:
+        list: Result of each call.
+
+    Raises:
+        ProcessingError: If the function raised for any file.
+    """
+    results = [None] * len(calls)
+    errors = {}
+    if workers > 1 and len(calls) > 1:
+        # Fan the files out across the process pool
+        with ProcessPoolExecutor(max_workers=min(workers, len(calls))) as executor:
+            futures = {executor.submit(func, *args): i for i, args in enumerate(calls)}
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    results[i] = future.result()
+                except Exception as error:
+                    errors[calls[i][0]] = error
+    else:
+        for i, args in enumerate(calls):
+            try:
+                results[i] = func(*args)
+            except Exception as error:
+                errors[args[0]] = error
+
+    if errors:
+        # Report the failures in call order
+        raise ProcessingError({args[0]: errors[args[0]] for args in calls if args[0] in errors})
+    return results
+
 
 class DataProcessor:
-    def __init__(self):
-        pass
+    def __init__(self, units_file=None, workers=1, storage=None, recorder=None, quarantine_file=None,
+                 string_rules=None):
+        """
+        Args:
+            units_file (str, optional): Path to a unit registry CSV file. Defaults to 'source/units.csv'.
+            workers (int, optional): Number of processes the per-file stages fan out to. Defaults to 1 (no pool).
+            storage (str, optional): Format the file based stages pass tables between each other in, 'feather'
+                for typed, memory-mapped Feather files or 'csv'. Defaults to 'feather' when pyarrow is installed.
+            recorder (StageRecorder, optional): Records the time, rows, bytes and memory of each stage and file.
+                Defaults to a disabled recorder.
+            quarantine_file (str, optional): CSV file the rows failing validation are moved to. Defaults to
+                stopping the run on rows a stage can't process.
+            string_rules (dict, optional): Rule of each text column for fix_string_columns, see StringNormalizer.
+                Columns without a rule are title cased.
+
+        Raises:
+            TypeError: If a string rule can't be pickled for the worker processes.
+        """
+        self.workers = workers
+        self.storage = resolve_storage(storage)
+        self.recorder = recorder or StageRecorder()
+
+        # In-memory table registry used by the pipeline mode, keyed by table name
+        self.tables = {}
 
+        # Unit multipliers and the units found missing from them, per table
+        self.units = load_unit_registry(units_file)
+        self.unknown_units = {}
+
+        # Rows breaking each validation rule and the rows moved to the quarantine file, per table
+        self.quarantine_file = quarantine_file
+        self.validation = {}
+
+        # String normalizer built once, so its memo carries over from file to file
+        self.normalizer = NORMALIZER if string_rules is None else StringNormalizer(string_rules)
+
+    def _run_per_file(self, func, calls):
+        """
+        Runs a per-file stage function for each set of arguments with the configured number of workers.
+        """
+        return self.recorder.run_per_file(lambda func, calls: _run_per_file(func, calls, self.workers), func, calls)
+
+    def _prepare_files(self, names, paths):
+        """
+        Reads and prepares tables into the table registry. The tables referenced by foreign keys are prepared
+        first, so the fact tables are validated against the keys already in memory.
+        """
+        quarantine = self.quarantine_file is not None
+        for batch in ([name for name in names if name not in FACT_TABLES], [name for name in names if name in FACT_TABLES]):
+            references = reference_keys(self.tables)
+            results = self._run_per_file(_prepare_file, [(name, paths[name], self.units, references, quarantine)
+                                                         for name in batch])
+            for name, (prepared, unknown, validation) in zip(batch, results):
+                self.tables.update(prepared)
+                self.unknown_units[name] = unknown
+                self.validation[name] = validation
+
+    def validation_report(self):
+        """
+        Reports the rows breaking each validation rule in the tables validated by the last run.
+
+        Returns:
+            pd.DataFrame: One row per table and broken rule with its number of rows and the rows moved to quarantine.
+        """
+        rows = []
+        for name, result in self.validation.items():
+            quarantined = result.rejected['Violations'].str.split(';').explode().value_counts() \
+                if len(result.rejected) else pd.Series(dtype='int64')
+            for rule, count in result.counts.items():
+                rows.append({'Table': name, 'Rule': rule, 'Rows': int(count), 'Quarantined': int(quarantined.get(rule, 0))})
+        return pd.DataFrame(rows, columns=['Table', 'Rule', 'Rows', 'Quarantined'])
+
+    @instrumented
     def comma_delimiter(self, data_dir):
         """
         Converts non-comma separated CSV files in the specified directory to comma-separated format.
@@ -13,22 +728,10 @@ class DataProcessor:
         Args:
             data_dir (str): Path to the directory containing CSV files.
         """
-        # Get a list of all files in the data directory
-        files = os.listdir(data_dir)
-
-        # Iterate through each file
-        for file in files:
-            # Check if the file is a CSV file
-            if file.endswith(".csv"):
-                file_path = os.path.join(data_dir, file)
-                # Read the CSV file into a DataFrame
-                with open(file_path, 'r') as f:
-                    first_line = f.readline()
-                if ";" in first_line:
-                    df = pd.read_csv(file_path, sep=';')
-                    # Write back to CSV file with comma separator
-                    df.to_csv(file_path, sep=',', index=False)
+        # Run the stage for each CSV file, across the worker processes if configured
+        self._run_per_file(_comma_delimiter_file, [(file_path, self.storage) for file_path in _csv_files(data_dir)])
 
+    @instrumented
     def drop_rows(self, path):
         """
         Drops fully blank rows from CSV files in the specified directory or file.
@@ -36,25 +739,10 @@ class DataProcessor:
         Args:
             path (str): Path to the directory containing CSV files or path to a single CSV file.
         """
-        # Check if the path is a directory or a file
-        if os.path.isdir(path):
-            # Get a list of all files in the directory
-            files = os.listdir(path)
-        else:
-            files = [path]
-
-        # Iterate through each file
-        for file in files:
-            # Check if the file is a CSV file
-            if file.endswith(".csv"):
-                file_path = os.path.join(path, file)
-                # Read the CSV file into a DataFrame
-                df = pd.read_csv(file_path)
-                # Drop fully blank rows
-                df.dropna(how='all', inplace=True)
-                # Write back to CSV file
-                df.to_csv(file_path, sep=',', index=False)
+        # Run the stage for each CSV file, across the worker processes if configured
+        self._run_per_file(_drop_rows_file, [(file_path, self.storage) for file_path in list_tables(path)])
 
+    @instrumented
     def transpose(self, csv_file):
         """
         Transposes the CSV file and drops rows with NaN values in the 'Region' column.
@@ -62,35 +750,36 @@ class DataProcessor:
         Args:
             csv_file (str): Path to the CSV file.
         """
-        # Load the CSV into a DataFrame
-        df = pd.read_csv(csv_file, sep=',', header=None)
-
-        # Check if the DataFrame already has a 'Region' column
-        if 'Region' in df.iloc[:, 1].values:
-            # Assuming it's already transposed, return the DataFrame as it is
-            return df.drop(columns=[0]).dropna(subset=[1])
-
-        # Transpose the DataFrame
-        transposed_df = df.transpose()
-
-        # Set the column names to id, Region, and Country
-        transposed_df.columns = transposed_df.iloc[0]
-        transposed_df = transposed_df.drop(0)  # Remove the initial row of column indices
+        if self.storage == "feather":
+            # Load the intermediate table and turn its header back into the first row
+            df = load_table(csv_file, self.storage)
+            if 'Region' in df.columns or 'Country_Code' in df.columns:
+                # Assuming it's already transposed or expanded, return the DataFrame as it is
+                return df
+            df = _raw_rows(df)
+        else:
+            # Load the CSV into a DataFrame
+            df = pd.read_csv(csv_file, sep=',', header=None)
 
-        # Drop the "Country" column
-        transposed_df = transposed_df.drop(columns=["Country"])
+            # Check if the file is already expanded to countries by process_locations
+            if 'Country_Code' in df.iloc[0].values:
+                return load_table(csv_file, self.storage)
 
-        # Drop rows with NaN values in the "Region" column
-        transposed_df = transposed_df.dropna(subset=["Region"])
+            # Check if the DataFrame already has a 'Region' column
+            if 'Region' in df.iloc[:, 1].values:
+                # Assuming it's already transposed, return the DataFrame as it is
+                return df.drop(columns=[0]).dropna(subset=[1])
 
-        # Reset the index
-        transposed_df.reset_index(drop=True, inplace=True)
+        # Transpose the DataFrame
+        transposed_df = _transpose_locations(df)
+        transposed_df['id'] = pd.to_numeric(transposed_df['id'])
 
         # Write the transposed DataFrame back to the same file
-        transposed_df.to_csv(csv_file, sep=',', index=False)
+        save_table(transposed_df, csv_file, self.storage, sep=',')
 
         return transposed_df
-    
+
+    @instrumented
     def format_date(self, data_dir):
         """
         Converts the 'Year_date' column in CSV files in the specified directory to a datetime column with format 'DD/MM/YYYY',
@@ -99,42 +788,10 @@ class DataProcessor:
         Args:
             data_dir (str): Path to the directory containing CSV files.
         """
-        # Get a list of all files in the data directory
-        files = os.listdir(data_dir)
-
-        # Iterate through each file
-        for file in files:
-            # Check if the file is a CSV file
-            if file.endswith(".csv"):
-                file_path = os.path.join(data_dir, file)
-                # Read the CSV file into a DataFrame
-                df = pd.read_csv(file_path)
-                
-                # Locate 'Year_text' column and ensure it's a whole number numerical type
-                if 'Year_text' in df.columns:
-                    df['Year_text'] = pd.to_numeric(df['Year_text'], errors='coerce').astype(pd.Int64Dtype())  # Convert to whole number
-                    df = df.rename(columns={'Year_text': 'Year'})  # Rename 'Year_text' to 'Year'
-                    
-                # Locate 'Year' column and ensure it's a whole number numerical type
-                if 'Year' in df.columns:
-                    df['Year'] = pd.to_numeric(df['Year'], errors='coerce').astype(pd.Int64Dtype())  # Convert to whole number
-                    
-                # Check if 'Year_date' column exists
-                if 'Year_date' in df.columns:
-                    # Convert 'Year_date' column to datetime
-                    df['Year_date'] = pd.to_datetime(df['Year_date'], errors='coerce')
-                    
-                    # Check if 'Year' column exists
-                    if 'Year' in df.columns:
-                        # Adjust 'Year_date' to match 'Year' column if they don't match
-                        df['Year_date'] = df.apply(lambda row: row['Year_date'].replace(year=row['Year'])
-                                                    if not pd.isnull(row['Year']) and
-                                                    not pd.isnull(row['Year_date']) and
-                                                    row['Year_date'].year != row['Year']
-                                                    else row['Year_date'], axis=1)
-                # Write back to CSV file
-                df.to_csv(file_path, index=False)
+        # Run the stage for each CSV file, across the worker processes if configured
+        self._run_per_file(_format_date_file, [(file_path, self.storage) for file_path in list_tables(data_dir)])
 
+    @instrumented
     def int_conversion(self, data_dir):
         """
         Converts float type columns in CSV files in the specified directory to integers with no decimals except for the 'Volume' column,
@@ -143,27 +800,10 @@ class DataProcessor:
         Args:
             data_dir (str): Path to the directory containing CSV files.
         """
-        # Get a list of all files in the data directory
-        files = os.listdir(data_dir)
-
-        # Iterate through each file
-        for file in files:
-            # Check if the file is a CSV file
-            if file.endswith(".csv"):
-                file_path = os.path.join(data_dir, file)
-                # Read the CSV file into a DataFrame
-                df = pd.read_csv(file_path)
-
-                # Iterate through each column
-                for col in df.columns:
-                    # Check if the column is float type and not the 'Volume' column
-                    if df[col].dtype == 'float' and col != 'Volume':
-                        # Convert the values to integers without decimals after handling non-finite values
-                        df[col] = df[col].astype(int).round(0)
-
-                # Write back to CSV file with comma as the decimal separator
-                df.to_csv(file_path, index=False, decimal=',')
+        # Run the stage for each CSV file, across the worker processes if configured
+        self._run_per_file(_int_conversion_file, [(file_path, self.storage) for file_path in list_tables(data_dir)])
 
+    @instrumented
     def standardize_units(self, data_dir):
         """
         Process volume units in CSV files in the specified directory and calculate volume in litres.
@@ -171,63 +811,29 @@ class DataProcessor:
         Args:
             data_dir (str): Path to the directory containing CSV files.
         """
-        # Get a list of all files in the data directory
-        files = os.listdir(data_dir)
-
-        # Iterate through each file
-        for file in files:
-            # Check if the file is a CSV file
-            if file.endswith(".csv"):
-                file_path = os.path.join(data_dir, file)
-                # Read the CSV file into a DataFrame
-                df = pd.read_csv(file_path)
-
-                # Check if 'Unit' and 'Volume' columns exist
-                if 'Unit' in df.columns and 'Volume' in df.columns:
-                    # Convert 'Volume' column to float
-                    df['Volume'] = df['Volume'].str.replace(',', '.').astype(float)
-
-                    # Process volume units only when 'Unit' column is either '000 litres' or 'million litres'
-                    if ('000 litres' in df['Unit'].values) or ('million litres' in df['Unit'].values):
-                        def calculate_volume(row):
-                            if row['Unit'] == 'million litres':
-                                return round(row['Volume'] * 1000000)
-                            elif row['Unit'] == '000 litres':
-                                return round(row['Volume'] * 1000)
-                            else:
-                                return row['Volume']
-
-                        df['Volume_Litres'] = df.apply(calculate_volume, axis=1)
-
-                        # Write back to CSV file with updated volume in litres
-                        df.to_csv(file_path, index=False, decimal=',')
+        # Run the stage for each CSV file, across the worker processes if configured
+        file_paths = list_tables(data_dir)
+        results = self._run_per_file(_standardize_units_file, [(file_path, self.units, self.storage) for file_path in file_paths])
+        for file_path, unknown in zip(file_paths, results):
+            self.unknown_units[_table_name(file_path)] = unknown
 
+    @instrumented
     def fix_string_columns(self, data_dir):
         """
         Fix string columns by capitalizing the first letter of each word and making the rest lowercase.
 
+        Each distinct string is transformed once and missing values are kept. Codes such as 'Country_Code'
+        are left as they are.
+
         Args:
             data_dir (str): Path to the directory containing CSV files.
         """
-        # Get a list of all files in the data directory
-        files = os.listdir(data_dir)
-
-        # Iterate through each file
-        for file in files:
-            # Check if the file is a CSV file
-            if file.endswith(".csv"):
-                file_path = os.path.join(data_dir, file)
-                # Read the CSV file into a DataFrame
-                df = pd.read_csv(file_path)
-                # Iterate through each column
-                for col in df.columns:
-                    # Check if the column data type is object (string)
-                    if df[col].dtype == 'object':
-                        # Capitalize the first letter of each word and make the rest lowercase
-                        df[col] = df[col].apply(lambda x: ' '.join([word.capitalize() for word in x.lower().split()]))
-                # Write the updated DataFrame back to the CSV file
-                df.to_csv(file_path, index=False)
+        # Run the stage for each CSV file, across the worker processes if configured. The rules are the
+        # ones the processor was built with
+        self._run_per_file(_fix_string_columns_file, [(file_path, self.storage, self.normalizer)
+                                                      for file_path in list_tables(data_dir)])
 
+    @instrumented
     def drop_column(self, path, column_name):
         """
         Drops the specified column from CSV files in the specified directory or file.
@@ -236,26 +842,11 @@ class DataProcessor:
             path (str): Path to the directory containing CSV files or path to a single CSV file.
             column_name (str): Name of the column to drop.
         """
-        # Check if the path is a directory or a file
-        if os.path.isdir(path):
-            # Get a list of all files in the directory
-            files = os.listdir(path)
-        else:
-            files = [path]
-
-        # Iterate through each file
-        for file in files:
-            # Check if the file is a CSV file
-            if file.endswith(".csv"):
-                file_path = os.path.join(path, file)
-                # Read the CSV file into a DataFrame
-                df = pd.read_csv(file_path)
-                # Drop the specified column if it exists
-                if column_name in df.columns:
-                    df.drop(columns=[column_name], inplace=True)
-                    # Write back to CSV file
-                    df.to_csv(file_path, sep=',', index=False)
+        # Rewrite the column set of each table, the values aren't parsed
+        for file_path in list_tables(path):
+            drop_columns(file_path, self.storage, [column_name])
 
+    @instrumented
     def rename_column(self, path, old_column_name, new_column_name):
         """
         Renames the specified column in CSV files in the specified directory or file.
@@ -265,250 +856,343 @@ class DataProcessor:
             old_column_name (str): Current name of the column to rename.
             new_column_name (str): New name for the column.
         """
-        # Check if the path is a directory or a file
-        if os.path.isdir(path):
-            # Get a list of all files in the directory
-            files = os.listdir(path)
-        else:
-            files = [path]
-
-        # Iterate through each file
-        for file in files:
-            # Check if the file is a CSV file
-            if file.endswith(".csv"):
-                file_path = os.path.join(path, file)
-                # Read the CSV file into a DataFrame
-                df = pd.read_csv(file_path)
-                # Rename the specified column if it exists
-                if old_column_name in df.columns:
-                    df.rename(columns={old_column_name: new_column_name}, inplace=True)
-                    # Write back to CSV file
-                    df.to_csv(file_path, sep=',', index=False)
-    
+        # Rewrite the header of each table, the values aren't parsed
+        for file_path in list_tables(path):
+            rename_columns(file_path, self.storage, {old_column_name: new_column_name})
+
+    @instrumented
     def merge_dim_tables(self, data_dir):
         """
-        Merge Subcategories.csv with Company_Share_GBO_Unit.csv and Market_Sizes.csv.
+        Merge Subcategories.csv and Categories.csv with Company_Share_GBO_unit.csv, Market_Sizes.csv and Channel_Volume.csv.
 
         Args:
             data_dir (str): Path to the directory containing CSV files.
         """
-        # Define file paths for all CSV files
-        subcategories_file = os.path.join(data_dir, "Subcategories.csv")
-        company_share_file = os.path.join(data_dir, "Company_Share_GBO_Unit.csv")
-        market_sizes_file = os.path.join(data_dir, "Market_Sizes.csv")
-        categories_file = os.path.join(data_dir, "Categories.csv")
-        channel_volume_file = os.path.join(data_dir, "Channel_Volume.csv")
-
-        # Read CSV files into DataFrames
-        subcategories_df = pd.read_csv(subcategories_file)
-        categories_df = pd.read_csv(categories_file)
-        company_share_df = pd.read_csv(company_share_file)
-        market_sizes_df = pd.read_csv(market_sizes_file)
-        channel_volume_df = pd.read_csv(channel_volume_file)
-
-        # Merge with Company_Share_GBO_Unit.csv if necessary
-        if 'Subcategory_Name' not in company_share_df:
-            company_merge = pd.merge(company_share_df, subcategories_df[['id', 'Category', 'Name']], left_on='Subcategory_ID', right_on='id', how='left')
-            company_merge.drop(columns=['id'], inplace=True)
-            company_merge.rename(columns={'Category': 'Category_ID', 'Name': 'Subcategory_Name'}, inplace=True)
-            company_merge = pd.merge(company_merge, categories_df[['id', 'Name']], left_on='Category_ID', right_on='id', how='left')
-            company_merge.drop(columns=['id'], inplace=True)
-            company_merge.rename(columns={'Name': 'Category_Name'}, inplace=True)
-            company_merge.to_csv(company_share_file, index=False)
-
-        # Merge with Market_Sizes.csv if necessary
-        if 'Subcategory_Name' not in market_sizes_df:
-            market_merge = pd.merge(market_sizes_df, subcategories_df[['id', 'Category', 'Name']], left_on='Subcategory', right_on='id', how='left')
-            market_merge.drop(columns=['id'], inplace=True)
-            market_merge.rename(columns={'Category': 'Category_ID', 'Name': 'Subcategory_Name', 'Subcategory': 'Subcategory_ID'}, inplace=True)
-            market_merge = pd.merge(market_merge, categories_df[['id', 'Name']], left_on='Category_ID', right_on='id', how='left')
-            market_merge.drop(columns=['id'], inplace=True)
-            market_merge.rename(columns={'Name': 'Category_Name'}, inplace=True)
-            market_merge.to_csv(market_sizes_file, index=False)
-
-        # Update Channel_Volume.csv if necessary
-        if 'Subcategory_Name' not in channel_volume_df:
-            channel_volume_df['Subcategory_Name'] = channel_volume_df['Category']
-            channel_volume_df.rename(columns={'Category': 'Category_Name'}, inplace=True)
-            channel_volume_df.to_csv(channel_volume_file, index=False)
-
-    def create_date_table(self, data_dir):
-        """
-        Create a date dimension table based on the range of dates present in the 'Year_date' columns of the CSV files.
+        # Read the tables into DataFrames
+        # Only the columns of the dimension tables used by the merge are read
+        columns = {}
+        for attachments in ATTACHMENTS.values():
+            for _, dimension, key, attached in attachments:
+                columns.setdefault(dimension, {key: None}).update((col, None) for col, _ in attached)
+        columns = {dimension: list(cols) for dimension, cols in columns.items()}
+        names = DIMENSION_TABLES + FACT_TABLES
+        tables = {name: load_table(os.path.join(data_dir, name + ".csv"), self.storage, columns=columns.get(name))
+                  for name in names}
+
+        # Merge the dimension tables and write back the updated fact tables
+        for name in _merge_dim_tables(tables):
+            save_table(tables[name], os.path.join(data_dir, name + ".csv"), self.storage)
+
+    @instrumented
+    def create_date_table(self, data_dir, extend=False):
+        """
+        Create a date dimension table based on the range of dates present in the 'Date' columns of the tables.
+
+        Only the 'Date' column of each table is read.
 
         Args:
             data_dir (str): Path to the directory containing CSV files.
+            extend (bool, optional): Keep the rows of an existing date table and only add the days outside its range.
         """
-        # Initialize an empty DataFrame to store the date dimension
-        date_dimension = pd.DataFrame(columns=["Date"])
-
-        # Get a list of all files in the data directory
-        files = os.listdir(data_dir)
-
-        # Iterate through each file
-        for file in files:
-            # Check if the file is a CSV file
-            if file.endswith(".csv"):
-                file_path = os.path.join(data_dir, file)
-                # Read the CSV file into a DataFrame
-                df = pd.read_csv(file_path)
-                # Check if 'Date' column exists
-                if 'Date' in df.columns:
-                    # Get the range of dates present in the 'Date' column
-                    min_date = pd.to_datetime(df['Date']).min()
-                    max_date = pd.to_datetime(df['Date']).max()
-                    # Generate a date range between min and max date
-                    dates = pd.date_range(start=min_date, end=max_date, freq='D')
-                    # Append dates to the date_dimension DataFrame
-                    date_dimension = pd.concat([date_dimension, pd.DataFrame({"Date": dates})], ignore_index=True)
-
-        # Drop duplicate dates
-        date_dimension.drop_duplicates(subset=["Date"], inplace=True)
-
-        # Extract year, quarter, month, day, and day of week from the 'Date' column
-        date_dimension['Year'] = date_dimension['Date'].dt.year
-        date_dimension['Quarter_Num'] = date_dimension['Date'].dt.quarter
-        date_dimension['Quarter_Name'] = "Q" + date_dimension['Date'].dt.quarter.astype(str)
-        date_dimension['Month_Num'] = date_dimension['Date'].dt.month
-        date_dimension['Month_Name'] = date_dimension['Date'].dt.month_name()
-        date_dimension['Month_MMM'] = date_dimension['Date'].dt.strftime("%b").str.upper()
-        date_dimension['WeekOfYear_Num'] = date_dimension['Date'].dt.isocalendar().week
-        date_dimension['DayOfMonth_Num'] = date_dimension['Date'].dt.day
-        date_dimension['DayOfWeek_Num'] = date_dimension['Date'].dt.dayofweek
-        date_dimension['DayOfWeek_Name'] = date_dimension['Date'].dt.strftime("%A")
-        date_dimension['DayOfWeek_MMM'] = date_dimension['Date'].dt.strftime("%a").str.upper()
-        date_dimension['DayOfYear_Num'] = date_dimension['Date'].dt.dayofyear
-
-        # Sort the date_dimension DataFrame
-        date_dimension.sort_values(by="Date", inplace=True)
-
-        # Write the date_dimension DataFrame to the output CSV file
         output_file = os.path.join(data_dir, "Date_Table.csv")
-        date_dimension.to_csv(output_file, index=False)
+        date_ranges = [_date_range(load_table(file_path, self.storage, columns=['Date']))
+                       for file_path in list_tables(data_dir) if file_path != output_file]
+        date_ranges = [date_range for date_range in date_ranges if date_range]
+
+        if extend and date_ranges and (os.path.exists(output_file) or os.path.exists(intermediate_path(output_file))):
+            date_table = extend_date_dimension(load_table(output_file, self.storage),
+                                               min(start for start, _ in date_ranges),
+                                               max(end for _, end in date_ranges))
+        else:
+            date_table = _build_date_table(date_ranges)
+
+        # Write the date dimension to the output table file
+        save_table(date_table, output_file, self.storage)
 
+    @instrumented
     def process_locations(self, data_dir):
-        # Define a dictionary to store countries and their codes for each region
-        country_data = {
-            'Asia Pacific': [
-                ('CN', 'China'), ('HK', 'Hong Kong'), ('MO', 'Macao'), ('KP', 'North Korea'), ('JP', 'Japan'), ('MN', 'Mongolia'),
-                ('KR', 'South Korea'), ('TW', 'Taiwan'), ('BD', 'Bangladesh'), ('BT', 'Bhutan'),
-                ('IN', 'India'), ('MV', 'Maldives'), ('NP', 'Nepal'), ('LK', 'Sri Lanka'),
-                ('BN', 'Brunei Darussalam'), ('KH', 'Cambodia'), ('ID', 'Indonesia'), ('LA', 'Laos'),
-                ('MY', 'Malaysia'), ('MM', 'Myanmar'), ('PH', 'Philippines'), ('SG', 'Singapore'), ('TH', 'Thailand'),
-                ('TL', 'Timor-Leste (East Timor)'), ('VN', 'Vietnam'), ('AS', 'American Samoa'),
-                ('CK', 'Cook Islands'), ('FJ', 'Fiji'), ('PF', 'French Polynesia'), ('GU', 'Guam'), ('KI', 'Kiribati'),
-                ('MH', 'Marshall Islands'), ('FM', 'Micronesia'), ('NR', 'Nauru'), ('NU', 'Niue'), ('MP', 'Northern Mariana Islands'), 
-                ('PW', 'Palau'), ('WS', 'Samoa'), ('TO', 'Tonga'), ('TV', 'Tuvalu')],
-            'Australasia': [
-                ('AU', 'Australia'), ('CX', 'Christmas Island'), ('CC', 'Cocos Islands'), ('NZ', 'New Zealand'), ('NF', 'Norfolk Island'), 
-                ('PG', 'Papua New Guinea'), ('NC', 'New Caledonia'), ('VU', 'Vanuatu'), ('SB', 'Solomon Islands')],
-            'Eastern Europe': [
-                ('BG', 'Bulgaria'), ('CZ', 'Czech Republic'), ('HU', 'Hungary'), ('PL', 'Poland'), ('RO', 'Romania'), ('RU', 'Russia'),
-                ('SK', 'Slovakia'), ('BY', 'Belarus'), ('MD', 'Moldova'), ('UA', 'Ukraine')],
-            'Latin America': [
-                ('AR', 'Argentina'), ('BO', 'Bolivia'), ('BR', 'Brazil'), ('CL', 'Chile'), ('CO', 'Colombia'), ('EC', 'Ecuador'),
-                ('GF', 'French Guiana'), ('GY', 'Guyana'), ('PY', 'Paraguay'), ('PE', 'Peru'), ('SR', 'Suriname'), ('UY', 'Uruguay'),
-                ('VE', 'Venezuela'), ('BZ', 'Belize'), ('CR', 'Costa Rica'), ('SV', 'El Salvador'), ('GT', 'Guatemala'),
-                ('HN', 'Honduras'), ('NI', 'Nicaragua'), ('PA', 'Panama')],
-            'Middle East and Africa': [
-                ('AM', 'Armenia'), ('AZ', 'Azerbaijan'), ('DZ', 'Algeria'), ('AO', 'Angola'), ('BJ', 'Benin'), ('BW', 'Botswana'),
-                ('BF', 'Burkina Faso'), ('BI', 'Burundi'), ('CV', 'Cabo Verde'), ('CM', 'Cameroon'), ('CF', 'Central African Republic'),
-                ('TD', 'Chad'), ('KM', 'Comoros'), ('CD', 'Congo (Democratic Republic of the)'), ('CG', 'Congo'),
-                ('CI', "Côte d'Ivoire"), ('DJ', 'Djibouti'), ('EG', 'Egypt'), ('GQ', 'Equatorial Guinea'), ('ER', 'Eritrea'),
-                ('SZ', 'Eswatini'), ('ET', 'Ethiopia'), ('GA', 'Gabon'), ('GM', 'Gambia'), ('GH', 'Ghana'), ('GN', 'Guinea'),
-                ('GW', 'Guinea-Bissau'), ('KE', 'Kenya'), ('LS', 'Lesotho'), ('LR', 'Liberia'), ('LY', 'Libya'), ('MG', 'Madagascar'),
-                ('MW', 'Malawi'), ('ML', 'Mali'), ('MR', 'Mauritania'), ('MU', 'Mauritius'), ('MA', 'Morocco'), ('MZ', 'Mozambique'),
-                ('NA', 'Namibia'), ('NE', 'Niger'), ('NG', 'Nigeria'), ('RW', 'Rwanda'), ('ST', 'Sao Tome and Principe'), ('SN', 'Senegal'),
-                ('SC', 'Seychelles'), ('SL', 'Sierra Leone'), ('SO', 'Somalia'), ('ZA', 'South Africa'), ('SS', 'South Sudan'),
-                ('SD', 'Sudan'), ('TZ', 'Tanzania'), ('TG', 'Togo'), ('TN', 'Tunisia'), ('UG', 'Uganda'), ('ZM', 'Zambia'),
-                ('ZW', 'Zimbabwe'), ('AG', 'Akrotiri and Dhekelia'), ('BH', 'Bahrain'), ('CY', 'Cyprus'), ('IR', 'Iran'), ('IQ', 'Iraq'),
-                ('IL', 'Israel'), ('JO', 'Jordan'), ('KW', 'Kuwait'), ('LB', 'Lebanon'), ('OM', 'Oman'), ('PS', 'Palestine'), ('QA', 'Qatar'),
-                ('SA', 'Saudi Arabia'), ('SY', 'Syria'), ('TR', 'Turkey'), ('AE', 'United Arab Emirates'), ('YE', 'Yemen'), ('KZ', 'Kazakhstan'), 
-                ('KG', 'Kyrgyzstan'), ('TJ', 'Tajikistan'), ('TM', 'Turkmenistan'), ('UZ', 'Uzbekistan'), ('AF', 'Afghanistan'), ('PK', 'Pakistan')],
-            'North America': [
-                ('US', 'United States'), ('CA', 'Canada'), ('MX', 'Mexico')],
-            'Western Europe': [
-                ('AD', 'Andorra'), ('AT', 'Austria'), ('BE', 'Belgium'), ('DK', 'Denmark'), ('FI', 'Finland'), ('FR', 'France'),
-                ('DE', 'Germany'), ('IS', 'Iceland'), ('IE', 'Ireland'), ('IT', 'Italy'), ('LI', 'Liechtenstein'), ('LU', 'Luxembourg'),
-                ('MT', 'Malta'), ('MC', 'Monaco'), ('NL', 'Netherlands'), ('NO', 'Norway'), ('PT', 'Portugal'), ('SM', 'San Marino'),
-                ('ES', 'Spain'), ('SE', 'Sweden'), ('CH', 'Switzerland'), ('GB', 'United Kingdom'), ('VA', 'Vatican City')]
-        }
-        
-        locations = os.path.join(data_dir, "Locations.csv")
+        """
+        Splits the transposed Locations.csv into the Regions table and the Locations table with one row per country.
 
-        # Read the original regions table
-        regions_table = pd.read_csv(locations)
+        A Locations.csv that is already expanded is left as it is, so the stage can be run again.
 
-        # Iterate through each row in the regions table
-        expanded_data = []
-        for _, row in regions_table.iterrows():
-            region_id = row['id']
-            region = row['Region']
-            countries = country_data.get(region, [])
+        Args:
+            data_dir (str): Path to the directory containing CSV files.
+        """
+        locations = os.path.join(data_dir, "Locations.csv")
 
-            # Append the expanded data for the region
-            for country_code, country_name in countries:
-                expanded_data.append({'Country_Code': country_code, 'Country_Name': country_name, 'Region_Name': region, 'Region_ID': region_id})
+        # Read the original regions table
+        regions_table = load_table(locations, self.storage)
+        if 'Region' not in regions_table.columns:
+            return
 
-        # Create a DataFrame from the expanded data
-        expanded_table = pd.DataFrame(expanded_data)
+        # Keep the regions, then expand them to their countries
+        save_table(regions_dimension(regions_table), os.path.join(data_dir, "Regions.csv"), self.storage)
+        save_table(expand_locations(regions_table), locations, self.storage)
 
-        # Save the expanded table back to the original location
-        expanded_table.to_csv(locations, index=False)
-        
-    def create_database(self, csv_dir, db_path):
+    @instrumented
+    def create_database(self, csv_dir, db_path, upsert=False):
         """
         Create a SQLite database and import data from CSV files into tables.
 
         Args:
             csv_dir (str): Path to the directory containing CSV files.
             db_path (str): Path to the SQLite database file to be created.
+            upsert (bool, optional): Treat the tables as a delta, e.g. a new edition, and upsert them into the
+                existing database on their natural keys instead of recreating the tables.
+        """
+        # Read each table into a DataFrame named after the file
+        tables = {_table_name(file_path): load_table(file_path, self.storage) for file_path in list_tables(csv_dir)}
+
+        # Write the tables to the SQLite database
+        load_database(tables, db_path, upsert=upsert)
+
+    @instrumented
+    def create_rollups(self, db_path, changed=None):
+        """
+        Materializes the pre-aggregated rollup tables of the dashboards in the SQLite database.
+
+        Args:
+            db_path (str): Path to the SQLite database file.
+            changed (iterable, optional): Names of the tables loaded since the last refresh. Defaults to every table.
+
+        Returns:
+            list: Names of the rebuilt rollups.
+        """
+        return refresh_rollups(db_path, changed)
+
+    @instrumented
+    def export_csv(self, data_dir, keep_intermediates=False):
+        """
+        Exports the Feather intermediate files of the file based stages to CSV files for Tableau.
+
+        Args:
+            data_dir (str): Path to the directory containing the tables.
+            keep_intermediates (bool, optional): Keep the Feather files after the export.
+
+        Returns:
+            list: Names of the exported tables.
+        """
+        return [_table_name(file_path) for file_path in list_tables(data_dir) if export_csv(file_path, keep_intermediates)]
+
+    def load_tables(self, data_dir):
+        """
+        Loads every CSV file in the specified directory into the in-memory table registry.
+
+        Args:
+            data_dir (str): Path to the directory containing CSV files.
+
+        Returns:
+            dict: Table registry mapping table names to DataFrames.
+        """
+        self.tables = {_table_name(file_path): _read_csv(file_path) for file_path in _csv_files(data_dir)}
+        return self.tables
+
+    @instrumented
+    def export_star(self, data_dir, db_path, star_dir=None):
+        """
+        Exports the tables as a star schema: integer keyed dimension tables and narrow fact tables, written
+        as CSV files for Tableau and to a separate SQLite database where the denormalized fact tables are views.
+
+        The tables of the last run are used where they are in memory, the others are read from their CSV files.
+
+        Args:
+            data_dir (str): Path to the directory containing the CSV files.
+            db_path (str): Path to the star schema database file to be created.
+            star_dir (str, optional): Directory the star schema CSV files are written to. Defaults to 'star' in data_dir.
+
+        Returns:
+            list: Names of the star schema tables.
+        """
+        tables = {name: self.tables[name] for name in SOURCE_TABLES if name in self.tables}
+        for name in SOURCE_TABLES:
+            file_path = os.path.join(data_dir, name + ".csv")
+            if name not in tables and os.path.exists(file_path):
+                tables[name] = _read_csv(file_path)
+        return list(export_star(tables, star_dir or os.path.join(data_dir, "star"), db_path))
+
+    def memory_report(self):
+        """
+        Reports the memory each table of the in-memory table registry holds with plain and with compact dtypes.
+
+        Returns:
+            pd.DataFrame: One row per table with its number of rows, size in MB before and after, and the reduction factor.
+        """
+        return memory_report(self.tables)
+
+    def write_tables(self, data_dir, table_names=None):
+        """
+        Writes tables of the in-memory table registry to CSV files in the specified directory.
+
+        Args:
+            data_dir (str): Path to the directory to write the CSV files to.
+            table_names (iterable, optional): Tables to write. Defaults to every table in the registry.
+        """
+        for table_name in (self.tables if table_names is None else table_names):
+            # Volumes are written with comma as the decimal separator, as in the file based stages
+            file_path = os.path.join(data_dir, table_name + ".csv")
+            self.tables[table_name].to_csv(file_path, index=False, decimal=',')
+            record_io("write", file_path, len(self.tables[table_name]))
+
+    @instrumented
+    def run_pipeline(self, data_dir, db_path, incremental=False, upsert=False):
+        """
+        Runs every preprocessing stage in memory: each CSV file is read once, all stages are applied to the
+        table registry, and each output CSV file and the SQLite database are written once at the end.
+
+        In incremental mode a manifest of content hashes and stage versions is kept next to the CSV files.
+        Files that are unchanged since the last run are not reprocessed, fact tables are only re-merged when
+        they or the dimension tables changed, the date table is only rebuilt when a date range may have moved,
+        and only the rewritten tables are reloaded into the database.
+
+        In upsert mode the extracts are a delta, e.g. a new edition or forecast year, and the processed tables
+        are upserted into the existing database on their natural keys instead of replacing its tables.
+
+        Args:
+            data_dir (str): Path to the directory containing CSV files.
+            db_path (str): Path to the SQLite database file to be created.
+            incremental (bool, optional): Skip the work whose inputs are unchanged since the last run.
+            upsert (bool, optional): Upsert the tables into the existing database.
+
+        Returns:
+            list: Names of the tables that were rewritten.
+        """
+        paths = {_table_name(file_path): file_path for file_path in _csv_files(data_dir)}
+        manifest = BuildManifest(data_dir) if incremental else None
+        hashes = {name: file_hash(path) for name, path in paths.items()} if incremental else {}
+
+        def is_current(name, stage):
+            return manifest is not None and name in hashes and manifest.is_current(name, hashes[name], stage, STAGE_VERSIONS[stage])
+
+        # Change delimiter to comma while reading the files and run the row-local stages on new inputs
+        with self.recorder.stage("prepare"):
+            self.tables = {}
+            prepare = [name for name in paths if name != "Date_Table" and not is_current(name, "prepare")]
+            self._prepare_files(prepare, paths)
+            if self.quarantine_file is not None:
+                write_quarantine(self.validation, self.quarantine_file)
+        changed = set(self.tables)
+
+        # Merge dimension tables to fact tables for use in Tableau, again for every fact table if the dimensions changed
+        dims_changed = any(name in changed or not is_current(name, "merge") for name in DIMENSION_TABLES if name in paths)
+        fact_tables = [name for name in FACT_TABLES if name in paths]
+        merge_targets = [name for name in fact_tables if dims_changed or name in changed or not is_current(name, "merge")]
+        if merge_targets:
+            with self.recorder.stage("merge"):
+                for name in merge_targets + DIMENSION_TABLES:
+                    if name not in self.tables:
+                        self.tables[name] = _read_csv(paths[name])
+                changed.update(_merge_dim_tables(self.tables, merge_targets, force=dims_changed))
+
+        # Create date dimension table for use in database schema, reusing the recorded range of unchanged tables
+        date_ranges = {name: _date_range(df) for name, df in self.tables.items()}
+        if (manifest is None or any(date_ranges.values()) or "Date_Table" not in paths
+                or not is_current("Date_Table", "date_table")):
+            with self.recorder.stage("date_table"):
+                for name in paths:
+                    if name not in date_ranges and name != "Date_Table":
+                        date_ranges[name] = manifest.date_range(name) if manifest is not None and name in manifest.tables \
+                            else _date_range(_read_csv(paths[name], columns=['Date']))
+                self.tables["Date_Table"] = _build_date_table(date_ranges.values())
+            changed.add("Date_Table")
+
+        # Write each changed output once
+        with self.recorder.stage("write"):
+            self.write_tables(data_dir, sorted(changed))
+
+        # Load the changed tables into the database, or every table if the database isn't the recorded one.
+        # A delta is only upserted where it changed
+        if not upsert and (manifest is None or not manifest.database_is_current(db_path, STAGE_VERSIONS["database"])):
+            for name in paths:
+                if name not in self.tables:
+                    self.tables[name] = _read_csv(paths[name])
+            load = self.tables
+        else:
+            load = {name: self.tables[name] for name in sorted(changed)}
+        if load:
+            with self.recorder.stage("database"):
+                load_database(load, db_path, upsert=upsert)
+
+        # Rebuild the rollups computed from the loaded tables
+        self.create_rollups(db_path, list(load))
+
+        # Record the outputs for the next run
+        if manifest is not None:
+            manifest.forget_missing(list(paths) + ["Date_Table"])
+            for name in changed:
+                old_range = manifest.date_range(name)
+                manifest.record_table(name, file_hash(os.path.join(data_dir, name + ".csv")), STAGE_VERSIONS,
+                                      date_ranges.get(name, old_range))
+            manifest.record_database(db_path, STAGE_VERSIONS["database"],
+                                     {name: manifest.tables[name]["hash"] for name in load if name in manifest.tables})
+            manifest.save()
+        return sorted(changed)
+
+    @instrumented
+    def run_streaming(self, data_dir, db_path, memory_budget_mb=256):
+        """
+        Runs the pipeline with the fact tables streamed in bounded-size chunks, for extracts larger than memory.
+
+        Dimension and lookup tables are small and are processed in memory. Each fact table is read in chunks
+        sized from the memory budget, and every chunk goes through the row-local stages and the dimension merge
+        before it is appended to the output CSV file and the SQLite database.
+
+        Args:
+            data_dir (str): Path to the directory containing CSV files.
+            db_path (str): Path to the SQLite database file to be created.
+            memory_budget_mb (int, optional): Memory budget for a chunk, in megabytes.
+        """
+        paths = {_table_name(file_path): file_path for file_path in _csv_files(data_dir)}
+        streamed = [name for name in STREAMED_TABLES if name in paths]
+
+        # Process the small tables in memory
+        self.tables = {}
+        small = [name for name in paths if name not in streamed and name != "Date_Table"]
+        with self.recorder.stage("prepare"):
+            self._prepare_files(small, paths)
+        dimensions = {name: self.tables[name] for name in DIMENSION_TABLES}
+        references = reference_keys(self.tables)
+
+        # Stream the fact tables to their output files and the database
+        date_ranges = []
+        conn = sqlite3.connect(db_path, isolation_level=None)
+        try:
+            tune_connection(conn)
+            for name in streamed:
+                with self.recorder.stage(f"stream:{name}"):
+                    chunk_rows = _chunk_rows(paths[name], memory_budget_mb * 1024 * 1024)
+                    conn.execute("BEGIN")
+                    date_range, self.unknown_units[name], self.validation[name] = _stream_table(
+                        name, paths[name], dimensions, self.units, conn, chunk_rows, references, self.quarantine_file is not None)
+                    conn.execute("COMMIT")
+                date_ranges.append(date_range)
+        finally:
+            conn.close()
+        if self.quarantine_file is not None:
+            write_quarantine(self.validation, self.quarantine_file)
+
+        # Create date dimension table for use in database schema
+        with self.recorder.stage("date_table"):
+            date_ranges.extend(_date_range(df) for df in self.tables.values())
+            self.tables["Date_Table"] = _build_date_table(date_ranges)
+
+        # Write the small tables
+        with self.recorder.stage("write"):
+            self.write_tables(data_dir)
+        with self.recorder.stage("database"):
+            load_database(self.tables, db_path)
+        self.create_rollups(db_path)
+
+    @instrumented
+    def run_elt(self, data_dir, db_path):
+        """
+        Runs the pipeline inside the SQLite database: the CSV files are staged once, and the dimension merges,
+        unit conversion, date fix and location expansion run as set-based SQL, so the fact tables don't go
+        through pandas. The tables and CSV files are the ones the pandas path produces.
+
+        Args:
+            data_dir (str): Path to the directory containing CSV files.
+            db_path (str): Path to the SQLite database file to be created.
         """
-        # Create a connection to the SQLite database
-        conn = sqlite3.connect(db_path)
-        c = conn.cursor()
-
-        # Get a list of all CSV files in the directory
-        csv_files = [file for file in os.listdir(csv_dir) if file.endswith('.csv')]
-
-        # Iterate through each CSV file and import its data into a table
-        for file in csv_files:
-            # Extract table name from file name (remove '.csv' extension)
-            table_name = os.path.splitext(file)[0]
-            # Read CSV file into a DataFrame
-            df = pd.read_csv(os.path.join(csv_dir, file))
-            # Write DataFrame to SQLite database as a table
-            df.to_sql(table_name, conn, if_exists='replace', index=False)
-
-        # Define foreign key constraints
-        c.execute('''PRAGMA foreign_keys = ON''')
-
-        # Define foreign key constraints between tables
-        c.execute('''CREATE TABLE IF NOT EXISTS Channel_Volume (
-                        Category TEXT,
-                        Date_year INTEGER,
-                        FOREIGN KEY (Date_year) REFERENCES Date_Table(Date),
-                        FOREIGN KEY (Category) REFERENCES Categories(Category)
-                    )''')
-
-        c.execute('''CREATE TABLE IF NOT EXISTS Market_Sizes (
-                        Subcategory TEXT,
-                        Location TEXT,
-                        Date_year INTEGER,
-                        FOREIGN KEY (Date_year) REFERENCES Date_Table(Date),
-                        FOREIGN KEY (Subcategory) REFERENCES Subcategories(Subcategory),
-                        FOREIGN KEY (Location) REFERENCES Locations(Location)
-                    )''')
-
-        c.execute('''CREATE TABLE IF NOT EXISTS Company_Share_GBO_unit (
-                        Subcategory_ID INTEGER,
-                        Location TEXT,
-                        Date_year INTEGER,
-                        FOREIGN KEY (Date_year) REFERENCES Date_Table(Date),
-                        FOREIGN KEY (Subcategory_ID) REFERENCES Subcategories(id),
-                        FOREIGN KEY (Location) REFERENCES Locations(Location)
-                    )''')
-
-        # Commit changes and close connection
-        conn.commit()
-        conn.close()
\ No newline at end of file
+        self.unknown_units.update(run_elt(data_dir, db_path, self.units))
+        self.create_rollups(db_path)
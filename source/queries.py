@@ -0,0 +1,256 @@
+import os
+import queue
+import sqlite3
+import threading
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
+
+# Result rows of the queries
+MarketSize = namedtuple("MarketSize", ["region", "year", "rsp", "unit"])
+BrandOwnerShare = namedtuple("BrandOwnerShare", ["region", "year", "category", "brand_owner", "volume_litres", "share"])
+ChannelVolume = namedtuple("ChannelVolume", ["outlet", "outlet_hierarchy", "volume_litres"])
+
+# SQL of each query. The statements are constant and take named parameters, so every pooled connection
+# prepares each of them once and reuses it from its statement cache. A NULL parameter disables its filter.
+QUERIES = {
+    "market_size": """
+        SELECT r.Region, f.Year, SUM(f.RSP), f.Unit
+        FROM Market_Sizes AS f
+        JOIN Regions AS r ON r.id = f.Location
+        WHERE f.Hierarchy_Level = 1
+          AND (:region IS NULL OR r.Region = :region)
+          AND (:year IS NULL OR f.Year = :year)
+          AND (:category IS NULL OR f.Category_Name = :category)
+        GROUP BY r.Region, f.Year, f.Unit
+        ORDER BY r.Region, f.Year
+    """,
+    "top_brand_owners": """
+        SELECT Region, Year, Category_Name, Global_Brand_Owner, Volume_Litres, Share
+        FROM Rollup_Brand_Share_Region_Year
+        WHERE Region = :region AND Year = :year AND Category_Name = :category
+        ORDER BY Share DESC
+        LIMIT :n
+    """,
+    "channel_volume": """
+        SELECT f.Outlet, f.Outlet_Hierarchy, SUM(f.Volume_Litres)
+        FROM Channel_Volume AS f
+        JOIN Regions AS r ON r.id = f.Location
+        WHERE (:region IS NULL OR r.Region = :region)
+          AND (:year IS NULL OR f.Year = :year)
+          AND (:category IS NULL OR f.Category_Name = :category)
+        GROUP BY f.Outlet, f.Outlet_Hierarchy
+        ORDER BY f.Outlet_Hierarchy, SUM(f.Volume_Litres) DESC
+    """,
+}
+
+
+class BeerDatabase:
+    """
+    Read-only query interface to the beer database built by the pipeline.
+
+    Queries run on a pool of read-only connections, and their results are kept in an LRU cache keyed
+    on the query and its parameters. The cache is cleared when the database file is rebuilt.
+    """
+
+    def __init__(self, db_path, pool_size=4, cache_size=256):
+        """
+        Args:
+            db_path (str): Path to the SQLite database file.
+            pool_size (int, optional): Maximum number of open connections.
+            cache_size (int, optional): Maximum number of cached query results.
+        """
+        if not os.path.exists(db_path):
+            raise FileNotFoundError(f"Database not found: {db_path}")
+        self.db_path = db_path
+        self.pool_size = pool_size
+        self.cache_size = cache_size
+        self._pool = queue.LifoQueue()
+        self._opened = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._signature = self._file_signature()
+        # Version of the database file, bumped on each rebuild, that the pooled connections were opened on
+        self._generation = 0
+
+    def _file_signature(self):
+        """
+        Identifies the current version of the database file by its inode, size and modification time.
+        """
+        stat = os.stat(self.db_path)
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    def _connect(self):
+        """
+        Opens a read-only connection that can be handed between threads.
+        """
+        uri = "file:" + os.path.abspath(self.db_path) + "?mode=ro"
+        return sqlite3.connect(uri, uri=True, check_same_thread=False, cached_statements=len(QUERIES) * 2)
+
+    @contextmanager
+    def _connection(self):
+        """
+        Borrows a connection from the pool, opening one if the pool isn't full yet, and returns it afterwards.
+        A connection opened before the database file was rebuilt still reads the old file, so it is
+        replaced by a new connection instead of going back to the pool.
+        """
+        try:
+            conn, generation = self._pool.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                open_new = self._opened < self.pool_size
+                if open_new:
+                    self._opened += 1
+                generation = self._generation
+            if open_new:
+                conn = self._connect()
+            else:
+                conn, generation = self._pool.get()
+        if generation != self._generation:
+            conn, generation = self._reconnect(conn)
+        try:
+            yield conn
+        finally:
+            if generation != self._generation:
+                conn, generation = self._reconnect(conn)
+            self._pool.put((conn, generation))
+
+    def _reconnect(self, conn):
+        """
+        Closes a connection to an older version of the database file and opens one to the current file.
+
+        Returns:
+            tuple: The new connection and the version of the file it was opened on.
+        """
+        conn.close()
+        generation = self._generation
+        return self._connect(), generation
+
+    def _check_rebuilt(self):
+        """
+        Clears the result cache and reopens the connections if the database file changed since the last query.
+
+        Returns:
+            tuple: Signature of the database file the query runs on.
+        """
+        signature = self._file_signature()
+        with self._lock:
+            if signature == self._signature:
+                return signature
+            self._cache.clear()
+            self._signature = signature
+            self._generation += 1
+        # A rebuild may have replaced the file, the pooled connections would still read the old one
+        self._close_idle()
+        return signature
+
+    def _close_idle(self):
+        """
+        Closes the connections that are currently in the pool.
+        """
+        while True:
+            try:
+                conn, _ = self._pool.get_nowait()
+            except queue.Empty:
+                return
+            conn.close()
+            with self._lock:
+                self._opened -= 1
+
+    def _query(self, name, params, row_type):
+        """
+        Runs a query, or returns its cached result.
+
+        Args:
+            name (str): Name of the query in QUERIES.
+            params (dict): Named parameters of the query.
+            row_type (type): Named tuple each row is returned as.
+
+        Returns:
+            tuple: Result rows.
+        """
+        signature = self._check_rebuilt()
+        key = (name, tuple(sorted(params.items())))
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+        with self._connection() as conn:
+            rows = tuple(row_type(*row) for row in conn.execute(QUERIES[name], params))
+
+        # The file may have been rebuilt while the query ran, its result is returned but not cached
+        if self._file_signature() != signature:
+            return rows
+        with self._lock:
+            if self._signature != signature:
+                return rows
+            self._cache[key] = rows
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return rows
+
+    def market_size(self, region=None, year=None, category=None):
+        """
+        Market size (retail selling price) per region and year, from the category level rows.
+
+        Args:
+            region (str, optional): Region name, e.g. 'Western Europe'. Defaults to every region.
+            year (int, optional): Year. Defaults to every year.
+            category (str, optional): Category name, e.g. 'Beer'. Defaults to every category.
+
+        Returns:
+            tuple: MarketSize rows.
+        """
+        return self._query("market_size", {"region": region, "year": year, "category": category}, MarketSize)
+
+    def top_brand_owners(self, region, year, category="Beer", n=10):
+        """
+        Brand owners with the largest volume share of a category in a region and year.
+
+        Args:
+            region (str): Region name.
+            year (int): Year.
+            category (str, optional): Category name.
+            n (int, optional): Number of brand owners to return.
+
+        Returns:
+            tuple: BrandOwnerShare rows, largest share first.
+        """
+        return self._query("top_brand_owners", {"region": region, "year": year, "category": category, "n": n},
+                           BrandOwnerShare)
+
+    def channel_volume(self, region=None, year=None, category=None):
+        """
+        Off-trade volume in litres per outlet.
+
+        Outlets are hierarchical, e.g. 'Store-Based Retailing' includes 'Grocery Retailers', so the rows of
+        different hierarchy levels overlap.
+
+        Args:
+            region (str, optional): Region name. Defaults to every region.
+            year (int, optional): Year. Defaults to every year.
+            category (str, optional): Category name. Defaults to every category.
+
+        Returns:
+            tuple: ChannelVolume rows, by outlet hierarchy level and largest volume first.
+        """
+        return self._query("channel_volume", {"region": region, "year": year, "category": category}, ChannelVolume)
+
+    def clear_cache(self):
+        """
+        Drops every cached query result.
+        """
+        with self._lock:
+            self._cache.clear()
+
+    def close(self):
+        """
+        Closes the pooled connections.
+        """
+        self._close_idle()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
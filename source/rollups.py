@@ -0,0 +1,88 @@
+import sqlite3
+
+# Aggregate tables materialized in the database for the dashboards, with the tables they are computed from.
+# Volumes and shares use the Hierarchy_Level 1 rows only, the lower levels break those totals down
+# into subcategories and would be counted twice. Every rollup is grouped by Location, as the regions and
+# 'World' are totals of the countries they hold.
+ROLLUPS = {
+    "Rollup_Volume_Region_Year_Category": {
+        "sources": ["Company_Share_GBO_unit", "Regions"],
+        "sql": """
+            SELECT f.Location, r.Region, f.Year, f.Category_ID, f.Category_Name,
+                   SUM(f.Volume_Litres) AS Volume_Litres
+            FROM Company_Share_GBO_unit AS f
+            LEFT JOIN Regions AS r ON r.id = f.Location
+            WHERE f.Hierarchy_Level = 1
+            GROUP BY f.Location, r.Region, f.Year, f.Category_ID, f.Category_Name
+        """,
+    },
+    "Rollup_Brand_Share_Region_Year": {
+        "sources": ["Company_Share_GBO_unit", "Regions"],
+        "sql": """
+            SELECT Location, Region, Year, Category_Name, Global_Brand_Owner, Volume_Litres,
+                   Volume_Litres * 1.0 / SUM(Volume_Litres) OVER (PARTITION BY Location, Year, Category_Name) AS Share
+            FROM (
+                SELECT f.Location, r.Region, f.Year, f.Category_Name, f.Global_Brand_Owner,
+                       SUM(f.Volume_Litres) AS Volume_Litres
+                FROM Company_Share_GBO_unit AS f
+                LEFT JOIN Regions AS r ON r.id = f.Location
+                WHERE f.Hierarchy_Level = 1
+                GROUP BY f.Location, r.Region, f.Year, f.Category_Name, f.Global_Brand_Owner
+            )
+        """,
+    },
+    "Rollup_RSP_Region_Subcategory_Year": {
+        "sources": ["Market_Sizes", "Regions"],
+        "sql": """
+            SELECT f.Location, r.Region, f.Subcategory_ID, f.Subcategory_Name, f.Category_Name, f.Hierarchy_Level,
+                   f.Year, f.Unit, SUM(f.RSP) AS RSP
+            FROM Market_Sizes AS f
+            LEFT JOIN Regions AS r ON r.id = f.Location
+            GROUP BY f.Location, r.Region, f.Subcategory_ID, f.Subcategory_Name, f.Category_Name, f.Hierarchy_Level,
+                     f.Year, f.Unit
+        """,
+    },
+}
+
+
+def _existing_tables(conn):
+    """
+    Returns the names of the tables in the database.
+    """
+    return {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+
+def refresh_rollups(db_path, changed=None):
+    """
+    Materializes the rollup tables in the SQLite database.
+
+    Only the rollups computed from a changed table, and rollups missing from the database, are rebuilt.
+    Each rollup is rebuilt in its own transaction, so readers never see a partially filled rollup.
+
+    Args:
+        db_path (str): Path to the SQLite database file.
+        changed (iterable, optional): Names of the tables loaded since the last refresh. Defaults to every table.
+
+    Returns:
+        list: Names of the rebuilt rollups.
+    """
+    changed = None if changed is None else set(changed)
+    refreshed = []
+    # Autocommit mode, the transactions are managed explicitly
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        existing = _existing_tables(conn)
+        for name, rollup in ROLLUPS.items():
+            # The rollup can only be computed once its source tables are in the database
+            if not all(source in existing for source in rollup["sources"]):
+                continue
+            if changed is not None and name in existing and not changed.intersection(rollup["sources"]):
+                continue
+            conn.execute("BEGIN")
+            conn.execute(f'DROP TABLE IF EXISTS "{name}"')
+            conn.execute(f'CREATE TABLE "{name}" AS {rollup["sql"]}')
+            conn.execute("COMMIT")
+            refreshed.append(name)
+    finally:
+        conn.close()
+    return refreshed
@@ -0,0 +1,98 @@
+import numpy as np
+import pandas as pd
+
+# Text columns that repeat a handful of values across every row, stored as categoricals
+CATEGORICAL_COLUMNS = ['Industry', 'Data_Type', 'Unit', 'Outlet', 'Global_Brand_Owner', 'Current_Constant',
+                       'Currency_Conversion', 'Category_Name', 'Subcategory_Name']
+
+# Integer id, level and year columns, downcast to the smallest integer type that holds their values
+INTEGER_COLUMNS = ['Location', 'Subcategory_ID', 'Category_ID', 'Hierarchy_Level', 'Outlet_Hierarchy', 'Edition',
+                   'Year', 'Year_minus_2016', 'Year_minus_2022']
+
+
+def csv_dtypes():
+    """
+    Returns the dtypes pd.read_csv reads the extracts' categorical columns with, so their strings are
+    stored once per distinct value from the start. Columns a file doesn't have are ignored by pd.read_csv.
+
+    Returns:
+        dict: dtype of each categorical column.
+    """
+    return {col: 'category' for col in CATEGORICAL_COLUMNS}
+
+
+def compact_table(df):
+    """
+    Converts the repeated text columns of a table to categoricals and downcasts its integer columns.
+
+    Args:
+        df (pd.DataFrame): Table to update in place.
+
+    Returns:
+        pd.DataFrame: The updated table.
+    """
+    for col in CATEGORICAL_COLUMNS:
+        if col in df.columns and df[col].dtype == 'object':
+            df[col] = df[col].astype('category')
+    for col in INTEGER_COLUMNS:
+        # Nullable integer columns, e.g. 'Year' with missing years, are downcast to the nullable types,
+        # float columns with missing values stay as they are
+        if col in df.columns and pd.api.types.is_integer_dtype(df[col].dtype):
+            df[col] = pd.to_numeric(df[col], downcast='integer')
+    return df
+
+
+def plain_table(df):
+    """
+    Returns a table with plain pandas dtypes, object columns instead of categoricals and 64-bit integers,
+    nullable ones for the nullable integer columns, as it would be without compact_table.
+
+    Args:
+        df (pd.DataFrame): Compacted table.
+
+    Returns:
+        pd.DataFrame: Copy of the table with plain dtypes.
+    """
+    plain = {}
+    for col in df.columns:
+        values = df[col]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            values = values.astype(object)
+        elif isinstance(values.dtype, pd.api.extensions.ExtensionDtype) and pd.api.types.is_integer_dtype(values.dtype):
+            values = values.astype('Int64')
+        elif pd.api.types.is_integer_dtype(values.dtype):
+            values = values.astype(np.int64)
+        plain[col] = values
+    return pd.DataFrame(plain, index=df.index)
+
+
+def table_memory(df):
+    """
+    Measures the memory a table holds, including the strings of its object columns.
+
+    Args:
+        df (pd.DataFrame): Table to measure.
+
+    Returns:
+        int: Size in bytes.
+    """
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+def memory_report(tables):
+    """
+    Reports the memory each table holds with plain dtypes and with the compact dtypes.
+
+    Args:
+        tables (dict): Table registry mapping table names to DataFrames.
+
+    Returns:
+        pd.DataFrame: One row per table with its number of rows, size in MB before and after, and the reduction factor.
+    """
+    rows = []
+    for name, df in tables.items():
+        before = table_memory(plain_table(df))
+        after = table_memory(df)
+        rows.append({'Table': name, 'Rows': len(df), 'Before_MB': round(before / 2 ** 20, 2),
+                     'After_MB': round(after / 2 ** 20, 2), 'Reduction': round(before / after, 1) if after else None})
+    return pd.DataFrame(rows, columns=['Table', 'Rows', 'Before_MB', 'After_MB', 'Reduction'])
@@ -0,0 +1,278 @@
+import os
+import sqlite3
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from source.database import STAR_KEYS, _quote, load_database
+from source.dimensions import ATTACHMENTS, DimensionLookup
+from source.instrumentation import record_io
+
+# Dimensions built from the distinct values of text columns of the fact tables: the surrogate key and the
+# columns it replaces. A dimension only applies to the fact tables that have all its columns
+STAR_DIMENSIONS = {
+    "Dim_Brand_Owner": ("Brand_Owner_Key", ['Global_Brand_Owner']),
+    "Dim_Outlet": ("Outlet_Key", ['Outlet', 'Outlet_Hierarchy']),
+    "Dim_Data_Type": ("Data_Type_Key", ['Data_Type']),
+    "Dim_Unit": ("Unit_Key", ['Unit']),
+    "Dim_Industry": ("Industry_Key", ['Industry']),
+    "Dim_Price_Basis": ("Price_Basis_Key", ['Current_Constant', 'Currency_Conversion']),
+}
+
+# Columns of the Subcategories and Categories tables attached to the fact tables, by their column in Dim_Subcategory
+SUBCATEGORY_COLUMNS = {("Subcategories", 'id'): 'Subcategory_Key', ("Subcategories", 'Name'): 'Subcategory_Name',
+                       ("Subcategories", 'Category'): 'Category_ID', ("Categories", 'id'): 'Category_ID',
+                       ("Categories", 'Name'): 'Category_Name'}
+
+# Tables the star schema is built from
+SOURCE_TABLES = ["Regions", "Subcategories", "Categories", "Date_Table"] + list(ATTACHMENTS)
+
+
+def _keys(positions, values=None):
+    """
+    Takes the keys of dimension rows by position, 1-based positions when the dimension has no key column,
+    in the smallest integer type and missing where the position is -1.
+    """
+    missing = positions < 0
+    keys = positions + 1 if values is None else values[np.where(missing, 0, positions)]
+    if missing.any():
+        return pd.arrays.IntegerArray(keys.astype(np.int32), missing)
+    return pd.to_numeric(pd.Series(keys), downcast='integer').to_numpy()
+
+
+def date_keys(dates):
+    """
+    Converts dates to YYYYMMDD integer keys.
+
+    Args:
+        dates (pd.Series): Dates as datetime64 or ISO text.
+
+    Returns:
+        pd.Series: Int32 keys, missing for missing dates.
+    """
+    dates = pd.to_datetime(dates, errors='coerce')
+    keys = dates.dt.year * 10000 + dates.dt.month * 100 + dates.dt.day
+    return keys.astype('Int32')
+
+
+def value_dimension(frames, key, columns):
+    """
+    Builds a dimension table from the distinct value combinations of columns across fact tables.
+
+    Args:
+        frames (list): Fact tables with the columns.
+        key (str): Name of the surrogate key column.
+        columns (list): Columns of the dimension.
+
+    Returns:
+        pd.DataFrame: Dimension table with 1-based keys, in value order.
+    """
+    distinct = pd.concat([df[columns].drop_duplicates().astype(object) for df in frames], ignore_index=True)
+    distinct = distinct.dropna(how='all').drop_duplicates().sort_values(columns, ignore_index=True).infer_objects()
+    distinct.insert(0, key, np.arange(1, len(distinct) + 1, dtype=np.int32))
+    return distinct
+
+
+def _dimension_positions(dimension, columns, df):
+    """
+    Finds the row of a value dimension matching each row of a fact table, -1 where none matches.
+    """
+    if len(columns) == 1:
+        return DimensionLookup(dimension, columns[0]).positions(df[columns[0]])
+    index = pd.MultiIndex.from_frame(dimension[columns])
+    return index.get_indexer(pd.MultiIndex.from_frame(df[columns].astype(object)))
+
+
+def subcategory_dimension(subcategories, categories):
+    """
+    Builds the subcategory dimension, flattening the Categories table into it.
+
+    Args:
+        subcategories (pd.DataFrame): Subcategories table.
+        categories (pd.DataFrame): Categories table.
+
+    Returns:
+        pd.DataFrame: Dimension table keyed by the subcategory id.
+    """
+    category = DimensionLookup(categories, 'id')
+    positions = category.positions(subcategories['Category'])
+    return pd.DataFrame({'Subcategory_Key': subcategories['id'].to_numpy(),
+                         'Subcategory_Name': subcategories['Name'].to_numpy(),
+                         'Category_ID': subcategories['Category'].to_numpy(),
+                         'Category_Name': np.asarray(category.take('Name', positions), dtype=object)})
+
+
+def star_fact(table_name, df, dimensions):
+    """
+    Builds the narrow fact table of a denormalized fact table: its text and dimension columns are replaced by
+    integer keys, in the position of the first column each key replaces, and its measures are kept.
+
+    Args:
+        table_name (str): Name of the denormalized fact table.
+        df (pd.DataFrame): Denormalized fact table.
+        dimensions (dict): Dimension tables by name, the value dimensions included.
+
+    Returns:
+        tuple: The fact table and the denormalized columns in order, each as (column, dimension table, column of
+        the dimension table), with no dimension table for the columns kept in the fact table.
+    """
+    replaced = {}
+    keys = {}
+
+    # Regions and dates
+    if 'Location' in df.columns:
+        replaced['Location'] = ('Location_Key', 'Dim_Location', None)
+        keys['Location_Key'] = df['Location'].to_numpy()
+    if 'Date' in df.columns:
+        replaced['Date'] = ('Date_Key', 'Dim_Date', 'Date')
+        keys['Date_Key'] = date_keys(df['Date']).array
+
+    # Subcategories, matched the way their columns were attached
+    attachments = [attachment for attachment in ATTACHMENTS.get(table_name, []) if attachment[0] in df.columns]
+    if attachments:
+        fact_key, dimension, dimension_key, _ = attachments[0]
+        column = SUBCATEGORY_COLUMNS[(dimension, dimension_key)]
+        if column == 'Subcategory_Key':
+            keys['Subcategory_Key'] = df[fact_key].to_numpy()
+            replaced[fact_key] = ('Subcategory_Key', 'Dim_Subcategory', None)
+        else:
+            lookup = DimensionLookup(dimensions['Dim_Subcategory'], column)
+            positions = lookup.positions(df[fact_key])
+            unmatched = int((df[fact_key].notna().to_numpy() & (positions < 0)).sum())
+            if unmatched:
+                warnings.warn(f"{unmatched} rows of {table_name} have a {fact_key} missing from the subcategories, "
+                              f"their names aren't kept in the star schema")
+            keys['Subcategory_Key'] = _keys(positions, dimensions['Dim_Subcategory']['Subcategory_Key'].to_numpy())
+            replaced[fact_key] = ('Subcategory_Key', 'Dim_Subcategory', column)
+        for _, dimension, _, columns in attachments:
+            for source, attached in columns:
+                replaced.setdefault(attached, ('Subcategory_Key', 'Dim_Subcategory', SUBCATEGORY_COLUMNS[(dimension, source)]))
+
+    # Value dimensions
+    for name, (key, columns) in STAR_DIMENSIONS.items():
+        if all(col in df.columns for col in columns):
+            keys[key] = _keys(_dimension_positions(dimensions[name], columns, df))
+            for col in columns:
+                replaced[col] = (key, name, col)
+
+    # Keys in place of the columns they replace, the measures as they are
+    fact = {}
+    denormalized = []
+    for col in df.columns:
+        if col not in replaced:
+            fact[col] = df[col].to_numpy() if not isinstance(df[col].dtype, pd.api.extensions.ExtensionDtype) \
+                else df[col].array
+            denormalized.append((col, None, None))
+            continue
+        key, dimension, dimension_column = replaced[col]
+        if key not in fact:
+            fact[key] = keys[key]
+        denormalized.append((col, dimension, dimension_column) if dimension_column else (col, None, key))
+    return pd.DataFrame(fact), denormalized
+
+
+def view_sql(fact_name, denormalized):
+    """
+    Builds the view giving back the denormalized table from its narrow fact table and the dimension tables.
+
+    Args:
+        fact_name (str): Name of the narrow fact table.
+        denormalized (list): Denormalized columns as returned by star_fact.
+
+    Returns:
+        str: SELECT statement of the view.
+    """
+    select = []
+    joins = {}
+    for col, dimension, column in denormalized:
+        if dimension is None:
+            select.append(f"f.{_quote(column or col)} AS {_quote(col)}")
+            continue
+        if dimension not in joins:
+            key = next(key for key, name in STAR_KEYS.items() if name == dimension)
+            alias = f"d{len(joins)}"
+            joins[dimension] = (alias, f"LEFT JOIN {_quote(dimension)} AS {alias} ON {alias}.{_quote(key)} = f.{_quote(key)}")
+        select.append(f"{joins[dimension][0]}.{_quote(column)} AS {_quote(col)}")
+    return (f"SELECT {', '.join(select)} FROM {_quote(fact_name)} AS f "
+            + " ".join(join for _, join in joins.values()))
+
+
+def build_star(tables):
+    """
+    Builds the star schema of the denormalized tables: integer keyed dimension tables for regions,
+    subcategories, dates and the repeated text columns, and one narrow fact table per fact table.
+
+    Args:
+        tables (dict): Table registry holding the denormalized fact tables and the Regions, Subcategories,
+            Categories and Date_Table tables.
+
+    Returns:
+        tuple: The star tables by name, and the SELECT statement of each denormalized view by fact table name.
+    """
+    facts = {name: tables[name] for name in ATTACHMENTS if name in tables}
+    star = {}
+    if "Regions" in tables:
+        star["Dim_Location"] = tables["Regions"].rename(columns={'id': 'Location_Key'})
+    if "Subcategories" in tables and "Categories" in tables:
+        star["Dim_Subcategory"] = subcategory_dimension(tables["Subcategories"], tables["Categories"])
+    if "Date_Table" in tables:
+        date_table = tables["Date_Table"]
+        star["Dim_Date"] = date_table.assign(Date=pd.to_datetime(date_table['Date']).dt.strftime('%Y-%m-%d'))
+        star["Dim_Date"].insert(0, 'Date_Key', date_keys(date_table['Date']).to_numpy(dtype=np.int32))
+    for name, (key, columns) in STAR_DIMENSIONS.items():
+        frames = [df for df in facts.values() if all(col in df.columns for col in columns)]
+        if frames:
+            star[name] = value_dimension(frames, key, columns)
+
+    views = {}
+    for name, df in facts.items():
+        fact, denormalized = star_fact(name, df, star)
+        star[f"Fact_{name}"] = fact
+        views[name] = view_sql(f"Fact_{name}", denormalized)
+    return star, views
+
+
+def create_views(db_path, views):
+    """
+    Creates the denormalized views in the star schema database.
+
+    Args:
+        db_path (str): Path to the SQLite database file.
+        views (dict): SELECT statement of each view by name.
+    """
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        conn.execute("BEGIN")
+        for name, sql in views.items():
+            conn.execute(f"DROP VIEW IF EXISTS {_quote(name)}")
+            conn.execute(f"CREATE VIEW {_quote(name)} AS {sql}")
+        conn.execute("COMMIT")
+    finally:
+        conn.close()
+
+
+def export_star(tables, star_dir, db_path):
+    """
+    Writes the star schema of the denormalized tables as CSV files for Tableau and as an SQLite database
+    with the denormalized tables as views.
+
+    Args:
+        tables (dict): Table registry holding the denormalized tables.
+        star_dir (str): Directory the CSV files are written to.
+        db_path (str): Path to the star schema database file, recreated.
+
+    Returns:
+        dict: Star tables by name.
+    """
+    star, views = build_star(tables)
+    os.makedirs(star_dir, exist_ok=True)
+    for name, df in star.items():
+        csv_path = os.path.join(star_dir, name + ".csv")
+        df.to_csv(csv_path, index=False, decimal=',')
+        record_io("write", csv_path, len(df))
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    load_database(star, db_path)
+    create_views(db_path, views)
+    return star
@@ -0,0 +1,227 @@
+import os
+import warnings
+
+from source.catalog import CATALOG
+from source.instrumentation import record_io
+
+# Extension of the typed columnar (Arrow IPC / Feather) intermediate files kept next to the CSV files
+FEATHER_EXTENSION = ".feather"
+
+
+def feather_available():
+    """
+    Checks whether pyarrow, needed for the Feather intermediate files, is installed.
+
+    Returns:
+        bool: True if Feather files can be read and written.
+    """
+    try:
+        import pyarrow.feather  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def resolve_storage(storage=None):
+    """
+    Resolves the intermediate storage format of the file based stages.
+
+    Args:
+        storage (str, optional): 'feather' or 'csv'. Defaults to 'feather' when pyarrow is installed.
+
+    Returns:
+        str: The storage format to use.
+    """
+    if storage is None:
+        return "feather" if feather_available() else "csv"
+    if storage not in ("feather", "csv"):
+        raise ValueError(f"Unknown storage format '{storage}', expected 'feather' or 'csv'")
+    if storage == "feather" and not feather_available():
+        warnings.warn("pyarrow is not installed, falling back to CSV intermediate files")
+        return "csv"
+    return storage
+
+
+def intermediate_path(csv_path):
+    """
+    Returns the path of the Feather intermediate file of a table.
+
+    Args:
+        csv_path (str): Path to the table's CSV file.
+
+    Returns:
+        str: Path to the Feather file next to the CSV file.
+    """
+    return os.path.splitext(csv_path)[0] + FEATHER_EXTENSION
+
+
+def has_intermediate(csv_path):
+    """
+    Checks whether a table has a Feather intermediate file that is at least as recent as its CSV file.
+
+    Args:
+        csv_path (str): Path to the table's CSV file.
+
+    Returns:
+        bool: True if the table should be read from its Feather file.
+    """
+    feather_path = intermediate_path(csv_path)
+    if not os.path.exists(feather_path):
+        return False
+    # A CSV file dropped in after the intermediate was written is a new input
+    return not os.path.exists(csv_path) or os.path.getmtime(feather_path) >= os.path.getmtime(csv_path)
+
+
+def list_tables(path):
+    """
+    Lists the tables of a directory, whether they are stored as CSV or Feather files, or a single table.
+
+    Args:
+        path (str): Path to the directory containing the tables or path to a single CSV file.
+
+    Returns:
+        list: CSV paths of the tables, sorted by file name. Tables only stored as Feather files are included
+        under the CSV path they are exported to.
+    """
+    if not os.path.isdir(path):
+        return [path] if path.endswith(".csv") else []
+    names = {os.path.splitext(file)[0] for file in os.listdir(path) if file.endswith((".csv", FEATHER_EXTENSION))}
+    return [os.path.join(path, name + ".csv") for name in sorted(names)]
+
+
+def load_table(csv_path, storage, columns=None, **csv_kwargs):
+    """
+    Reads a table from its Feather intermediate file if it has one, otherwise from its CSV file.
+
+    Feather files are memory-mapped, so reading them doesn't parse or copy the column buffers. CSV files are
+    parsed with the separator, columns and dtypes of their schema catalog entry.
+
+    Args:
+        csv_path (str): Path to the table's CSV file.
+        storage (str): 'feather' or 'csv'.
+        columns (list, optional): Only read these columns, the ones the table doesn't have are skipped.
+        **csv_kwargs: Extra arguments for pd.read_csv.
+
+    Returns:
+        pd.DataFrame: The table.
+    """
+    if storage == "feather" and has_intermediate(csv_path):
+        import pyarrow.feather
+        table = pyarrow.feather.read_table(intermediate_path(csv_path), memory_map=True)
+        if columns is not None:
+            table = table.select([col for col in columns if col in table.column_names])
+        record_io("read", intermediate_path(csv_path), table.num_rows)
+        return table.to_pandas()
+    df = CATALOG.read_csv(csv_path, columns, **csv_kwargs)
+    record_io("read", csv_path, len(df))
+    return df
+
+
+def save_table(df, csv_path, storage, **csv_kwargs):
+    """
+    Writes a table to its Feather intermediate file, or to its CSV file when the storage format is 'csv'.
+
+    Args:
+        df (pd.DataFrame): Table to write.
+        csv_path (str): Path to the table's CSV file.
+        storage (str): 'feather' or 'csv'.
+        **csv_kwargs: Extra arguments for DataFrame.to_csv.
+    """
+    if storage == "feather":
+        # Feather needs a default index and text column names
+        df = df.reset_index(drop=True)
+        df.columns = [str(col) for col in df.columns]
+        df.to_feather(intermediate_path(csv_path))
+        record_io("write", intermediate_path(csv_path), len(df))
+    else:
+        df.to_csv(csv_path, index=False, **csv_kwargs)
+        record_io("write", csv_path, len(df))
+
+
+def _rewrite_feather(csv_path, transform):
+    """
+    Rewrites a table's Feather intermediate file with a transformation of its Arrow table, without
+    converting it to a DataFrame.
+    """
+    import pyarrow.feather
+    feather_path = intermediate_path(csv_path)
+    # The source is memory-mapped, so the new file is written next to it and swapped in
+    table = transform(pyarrow.feather.read_table(feather_path, memory_map=True))
+    pyarrow.feather.write_feather(table.replace_schema_metadata(None), feather_path + ".part")
+    os.replace(feather_path + ".part", feather_path)
+    record_io("write", feather_path, table.num_rows)
+
+
+def rename_columns(csv_path, storage, mapping):
+    """
+    Renames columns of a table by rewriting its header only: the header line of a CSV file, or the
+    schema of a Feather file. The values aren't parsed.
+
+    Args:
+        csv_path (str): Path to the table's CSV file.
+        storage (str): 'feather' or 'csv'.
+        mapping (dict): New name of each column to rename, columns the table doesn't have are skipped.
+
+    Returns:
+        bool: True if the table had any of the columns.
+    """
+    if storage == "feather" and has_intermediate(csv_path):
+        import pyarrow.feather
+        names = pyarrow.feather.read_table(intermediate_path(csv_path), memory_map=True).column_names
+        if not set(mapping) & set(names):
+            return False
+        _rewrite_feather(csv_path, lambda table: table.rename_columns([mapping.get(col, col) for col in names]))
+        return True
+    columns = CATALOG.schema(csv_path).columns
+    if not set(mapping) & set(columns):
+        return False
+    CATALOG.rewrite_header(csv_path, [mapping.get(col, col) for col in columns])
+    return True
+
+
+def drop_columns(csv_path, storage, columns):
+    """
+    Drops columns of a table by rewriting its column set only, without parsing the values.
+
+    Args:
+        csv_path (str): Path to the table's CSV file.
+        storage (str): 'feather' or 'csv'.
+        columns (list): Columns to drop, columns the table doesn't have are skipped.
+
+    Returns:
+        bool: True if the table had any of the columns.
+    """
+    if storage == "feather" and has_intermediate(csv_path):
+        import pyarrow.feather
+        names = pyarrow.feather.read_table(intermediate_path(csv_path), memory_map=True).column_names
+        if not set(columns) & set(names):
+            return False
+        _rewrite_feather(csv_path, lambda table: table.select([col for col in names if col not in columns]))
+        return True
+    names = CATALOG.schema(csv_path).columns
+    if not set(columns) & set(names):
+        return False
+    rows = CATALOG.rewrite_rows(csv_path, columns=[col for col in names if col not in columns])
+    record_io("write", csv_path, rows)
+    return True
+
+
+def export_csv(csv_path, keep_intermediate=False):
+    """
+    Exports a table's Feather intermediate file to its CSV file for Tableau, with comma as the decimal separator.
+
+    Args:
+        csv_path (str): Path to the table's CSV file.
+        keep_intermediate (bool, optional): Keep the Feather file after the export.
+
+    Returns:
+        bool: True if the table had an intermediate file to export.
+    """
+    if not has_intermediate(csv_path):
+        return False
+    df = load_table(csv_path, "feather")
+    df.to_csv(csv_path, index=False, decimal=',')
+    record_io("write", csv_path, len(df))
+    if not keep_intermediate:
+        os.remove(intermediate_path(csv_path))
+    return True
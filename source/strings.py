@@ -0,0 +1,145 @@
+import pickle
+from collections.abc import Mapping
+
+import numpy as np
+import pandas as pd
+
+# Text columns left as they are by default, codes such as Namibia's 'NA' aren't words
+DEFAULT_RULES = {'Country_Code': None}
+
+
+def title_words(value):
+    """
+    Capitalizes the first letter of each word and makes the rest lowercase, collapsing runs of whitespace.
+
+    Args:
+        value (str): Text to normalize.
+
+    Returns:
+        str: Normalized text.
+    """
+    return ' '.join([word.capitalize() for word in value.lower().split()])
+
+
+class MappingRule:
+    """
+    Rule replacing the values found in a mapping table, other values are kept as they are.
+    """
+
+    def __init__(self, mapping):
+        """
+        Args:
+            mapping (Mapping): Replacement of each value.
+        """
+        self.mapping = dict(mapping)
+
+    def __call__(self, value):
+        return self.mapping.get(value, value)
+
+
+def _checked_rule(col, rule):
+    """
+    Checks that a rule can be sent to the worker processes, turning mapping tables into MappingRule.
+
+    Raises:
+        TypeError: If the rule isn't None, a mapping or a picklable function, e.g. a lambda.
+    """
+    if rule is None:
+        return None
+    if isinstance(rule, Mapping):
+        return MappingRule(rule)
+    if not callable(rule):
+        raise TypeError(f"Rule of '{col}' must be a function, a mapping or None, not {type(rule).__name__}")
+    try:
+        pickle.dumps(rule)
+    except (pickle.PicklingError, AttributeError, TypeError) as error:
+        raise TypeError(f"Rule of '{col}' can't be pickled for the worker processes, use a module level "
+                        f"function or a mapping table: {error}") from None
+    return rule
+
+
+class StringNormalizer:
+    """
+    Normalizes the text columns of tables by transforming each distinct value once.
+
+    A column is factorized, only its distinct values go through the column's rule, and the results are mapped
+    back through the codes, so the cost grows with the number of distinct strings rather than rows. Results
+    are memoized per rule, so values repeated across tables and files are only transformed once.
+    """
+
+    def __init__(self, rules=None, default=title_words):
+        """
+        Args:
+            rules (dict, optional): Rule of each column: a module level function of one string, a mapping table
+                of replacements, or None to leave the column as it is. Added to DEFAULT_RULES.
+            default (callable, optional): Rule of the text columns without their own rule. Defaults to title_words.
+
+        Raises:
+            TypeError: If a rule can't be pickled, e.g. a lambda, since the normalizer is sent to the worker processes.
+        """
+        self.rules = {col: _checked_rule(col, rule) for col, rule in dict(DEFAULT_RULES, **(rules or {})).items()}
+        self.default = _checked_rule('default', default)
+        self._memo = {}
+
+    def _transform(self, values, rule):
+        """
+        Transforms distinct values with a rule, through the rule's memo. Values that aren't strings are kept.
+        """
+        memo = self._memo.setdefault(rule, {})
+        results = np.empty(len(values), dtype=object)
+        for i, value in enumerate(values):
+            if not isinstance(value, str):
+                results[i] = value
+                continue
+            result = memo.get(value)
+            if result is None:
+                result = memo[value] = rule(value)
+            results[i] = result
+        return results
+
+    def normalize_column(self, values, rule=None):
+        """
+        Normalizes a text column.
+
+        Args:
+            values (pd.Series): Object or categorical column.
+            rule (callable, optional): Function of one string. Defaults to the normalizer's default rule.
+
+        Returns:
+            pd.Series: Normalized column with the same dtype kind, missing values kept as they are.
+        """
+        rule = rule or self.default
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            # Distinct categories can normalize to the same text, so the categories are factorized again
+            remap, new_categories = pd.factorize(self._transform(values.cat.categories, rule))
+            codes = values.cat.codes.to_numpy()
+            new_codes = np.where(codes >= 0, remap[codes] if len(remap) else codes, -1)
+            return pd.Series(pd.Categorical.from_codes(new_codes, categories=new_categories),
+                             index=values.index, name=values.name)
+        codes, uniques = pd.factorize(values)
+        transformed = self._transform(np.asarray(uniques, dtype=object), rule)
+        # Missing values have code -1 and stay missing
+        normalized = np.where(codes >= 0, transformed[codes] if len(transformed) else None, values.to_numpy())
+        return pd.Series(normalized, index=values.index, name=values.name, dtype=object)
+
+    def normalize(self, df):
+        """
+        Normalizes every object and categorical column of a table with its rule.
+
+        Args:
+            df (pd.DataFrame): Table to update in place.
+
+        Returns:
+            pd.DataFrame: The updated table.
+        """
+        for col in df.columns:
+            if not (df[col].dtype == 'object' or isinstance(df[col].dtype, pd.CategoricalDtype)):
+                continue
+            rule = self.rules.get(col, self.default)
+            if rule is not None:
+                df[col] = self.normalize_column(df[col], rule)
+        return df
+
+
+# Normalizer of the default rules, shared by the files a process handles so its memo carries over
+NORMALIZER = StringNormalizer()
@@ -0,0 +1,130 @@
+import os
+import warnings
+
+import numpy as np
+import pandas as pd
+
+# Default unit registry, one row per Euromonitor unit with its base unit and multiplier
+UNITS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "units.csv")
+
+
+def load_unit_registry(units_file=None):
+    """
+    Loads the unit registry from a CSV file with 'Unit', 'Base_Unit' and 'Multiplier' columns.
+
+    New units are added by adding a row to the file, no code changes are needed.
+
+    Args:
+        units_file (str, optional): Path to the registry CSV file. Defaults to the registry shipped with the package.
+
+    Returns:
+        pd.DataFrame: Unit registry indexed by unit name.
+    """
+    registry = pd.read_csv(units_file or UNITS_FILE, dtype={'Unit': str, 'Base_Unit': str, 'Multiplier': float})
+    return registry.set_index('Unit')
+
+
+def unknown_units(units, registry):
+    """
+    Counts the rows of each unit that is missing from the registry.
+
+    Args:
+        units (pd.Series): Unit of each row.
+        registry (pd.DataFrame): Unit registry indexed by unit name.
+
+    Returns:
+        pd.Series: Number of rows per unknown unit, empty if every unit is known.
+    """
+    counts = units.value_counts()
+    # Categorical units also count the categories no row uses
+    return counts[(counts > 0) & ~counts.index.isin(registry.index)]
+
+
+def unit_multipliers(units, registry, base_unit):
+    """
+    Looks up the multiplier to a base unit for each row, once per distinct unit.
+
+    Args:
+        units (pd.Series): Unit of each row.
+        registry (pd.DataFrame): Unit registry indexed by unit name.
+        base_unit (str): Base unit to convert to, e.g. 'litres'.
+
+    Returns:
+        np.ndarray: Multiplier of each row, NaN for rows whose unit is unknown or has another base unit.
+    """
+    # Factorize the units into categorical codes and look up each distinct unit once
+    codes, categories = pd.factorize(units)
+    known = registry.reindex(categories)
+    multipliers = np.where(known['Base_Unit'].to_numpy() == base_unit, known['Multiplier'].to_numpy(), np.nan)
+
+    # Map the multipliers back to the rows, missing units (code -1) get NaN
+    return np.append(multipliers, np.nan)[codes]
+
+
+def convert_units(values, units, registry, base_unit):
+    """
+    Converts values to a base unit with a single vectorized multiply.
+
+    Args:
+        values (pd.Series): Numeric values expressed in the unit of each row.
+        units (pd.Series): Unit of each row.
+        registry (pd.DataFrame): Unit registry indexed by unit name.
+        base_unit (str): Base unit to convert to, e.g. 'litres'.
+
+    Returns:
+        np.ndarray: Converted values, NaN for rows whose unit is unknown or has another base unit.
+    """
+    return values.to_numpy(dtype='float64') * unit_multipliers(units, registry, base_unit)
+
+
+def to_litres(df, registry, table_name=None):
+    """
+    Calculates the 'Volume_Litres' column from the 'Volume' and 'Unit' columns.
+
+    Converted volumes are rounded to whole litres and volumes already in litres are kept as they are.
+    Rows in units missing from the registry or not based on litres have no volume in litres, and the
+    unknown units are reported in a single warning per table. The column holds integers, missing where
+    there is no volume, unless a volume in litres has decimals.
+
+    Args:
+        df (pd.DataFrame): Table with numeric 'Volume' and 'Unit' columns, updated in place.
+        registry (pd.DataFrame): Unit registry indexed by unit name.
+        table_name (str, optional): Table name used in the warning.
+
+    Returns:
+        pd.Series: Number of rows per unknown unit.
+    """
+    unknown = unknown_units(df['Unit'], registry)
+    if len(unknown) > 0:
+        listing = ", ".join(f"'{unit}' ({count} rows)" for unit, count in unknown.items())
+        warnings.warn(f"Unknown units in {table_name or 'table'}: {listing}")
+
+    # Only tables with litre based volumes get a 'Volume_Litres' column
+    multipliers = unit_multipliers(df['Unit'], registry, 'litres')
+    in_litres = ~np.isnan(multipliers)
+    if not in_litres.any():
+        return unknown
+
+    volume = df['Volume'].to_numpy(dtype='float64')
+    litres = np.where(multipliers == 1, volume, np.round(volume * multipliers))
+    df['Volume_Litres'] = litre_values(litres)
+    return unknown
+
+
+def litre_values(litres):
+    """
+    Stores volumes in litres as integers when they are all whole numbers, as NumPy integers when none is
+    missing and as a nullable integer array otherwise, and as floats when a volume has decimals.
+
+    Args:
+        litres (np.ndarray): Volumes in litres as floats, NaN where there is no volume.
+
+    Returns:
+        np.ndarray or pd.arrays.IntegerArray: The volumes.
+    """
+    finite = np.isfinite(litres)
+    if np.isinf(litres).any() or (litres[finite] != np.floor(litres[finite])).any():
+        return litres
+    if finite.all():
+        return litres.astype('int64')
+    return pd.arrays.IntegerArray(np.where(finite, litres, 0).astype('int64'), ~finite)
@@ -0,0 +1,217 @@
+import os
+import warnings
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from source.database import SCHEMA
+from source.dimensions import KEY_RENAMES
+from source.instrumentation import record_io
+
+# Rules that stop the run, since a later stage can't process the rows breaking them: missing values in the
+# float columns converted to integers make astype(int) raise
+BLOCKING_RULES = ['missing_integer']
+
+# Rules whose rows are moved to the quarantine file when there is one. Dates in another year than their row
+# are fixed by the date stage, so they are only counted
+QUARANTINED_RULES = ['missing_integer', 'unknown_unit', 'orphan']
+
+# Float columns that aren't converted to integers
+FLOAT_COLUMNS = ['Volume']
+
+# Number of rows breaking each rule, and the rows moved out of the table with the rules they break
+ValidationResult = namedtuple('ValidationResult', ['counts', 'rejected'])
+
+
+class ValidationError(Exception):
+    """
+    Raised when rows of a table break a blocking rule and there is no quarantine file to move them to.
+    """
+
+    def __init__(self, table_name, counts):
+        self.table_name = table_name
+        self.counts = counts
+        listing = ", ".join(f"{rule}: {count} rows" for rule, count in counts.items())
+        super().__init__(f"Rows of {table_name} can't be processed ({listing})")
+
+
+def reference_keys(tables):
+    """
+    Collects the keys of the tables referenced by the declared foreign keys, from the tables already loaded.
+
+    Args:
+        tables (dict): Table registry mapping table names to DataFrames.
+
+    Returns:
+        dict: Distinct key values of each referenced (table, column), for the referenced tables in the registry.
+    """
+    references = {}
+    for schema in SCHEMA.values():
+        for ref_table, ref_col in schema.get("foreign_keys", {}).values():
+            if ref_table in tables and ref_col in tables[ref_table].columns:
+                references[(ref_table, ref_col)] = pd.unique(tables[ref_table][ref_col].dropna())
+    return references
+
+
+def _foreign_keys(table_name, columns):
+    """
+    Returns the declared foreign keys of a table by the name its columns have in the loaded table.
+    """
+    renamed = {new: old for old, new in KEY_RENAMES.get(table_name, {}).items()}
+    foreign_keys = {}
+    for col, reference in SCHEMA.get(table_name, {}).get("foreign_keys", {}).items():
+        for name in (col, renamed.get(col)):
+            if name in columns:
+                foreign_keys[name] = reference
+                break
+    return foreign_keys
+
+
+def rule_masks(table_name, df, registry, references=None):
+    """
+    Checks every rule of a table over its loaded columns in one pass.
+
+    The rules are: missing values in the float columns converted to integers ('missing_integer'), units
+    missing from the unit registry ('unknown_unit'), keys missing from the table a foreign key references
+    ('orphan_<column>'), and dates in another year than the row's year ('year_date_mismatch'). Years and
+    dates are expected to be parsed already.
+
+    Args:
+        table_name (str): Name of the table.
+        df (pd.DataFrame): Table to check.
+        registry (pd.DataFrame): Unit registry indexed by unit name.
+        references (dict, optional): Keys of the referenced tables, from reference_keys. Foreign keys to
+            tables without keys aren't checked.
+
+    Returns:
+        pd.DataFrame: One boolean column per rule that applies to the table, True for the rows breaking it.
+    """
+    masks = {}
+
+    # Missing values the integer conversion can't cast
+    float_columns = [col for col in df.columns if df[col].dtype == 'float' and col not in FLOAT_COLUMNS]
+    if float_columns:
+        masks['missing_integer'] = ~np.isfinite(df[float_columns].to_numpy()).all(axis=1)
+
+    # Units missing from the registry, looked up once per distinct unit
+    if 'Unit' in df.columns and 'Volume' in df.columns:
+        units = df['Unit']
+        masks['unknown_unit'] = (units.notna() & ~units.isin(registry.index)).to_numpy()
+
+    # Keys without a row in the referenced table
+    for col, reference in _foreign_keys(table_name, df.columns).items():
+        if reference in (references or {}):
+            values = df[col]
+            masks[f'orphan_{col}'] = (values.notna() & ~values.isin(references[reference])).to_numpy()
+
+    # Dates in another year than the row's year
+    if 'Year' in df.columns and 'Year_date' in df.columns and pd.api.types.is_datetime64_any_dtype(df['Year_date']):
+        years = df['Year'].to_numpy(dtype='float64', na_value=np.nan)
+        date_years = df['Year_date'].dt.year.to_numpy(dtype='float64', na_value=np.nan)
+        with np.errstate(invalid='ignore'):
+            masks['year_date_mismatch'] = ~np.isnan(years) & ~np.isnan(date_years) & (years != date_years)
+
+    return pd.DataFrame(masks, index=df.index)
+
+
+def _is_rule(rule, rules):
+    """
+    Tells whether a rule is one of a list of rules, 'orphan' standing for every 'orphan_<column>' rule.
+    """
+    return rule in rules or (rule.startswith('orphan_') and 'orphan' in rules)
+
+
+def validate_table(table_name, df, registry, references=None, quarantine=False):
+    """
+    Validates a table: checks its rules, warns about the rows breaking them and, with a quarantine, moves the
+    rows breaking a quarantined rule out of the table.
+
+    Args:
+        table_name (str): Name of the table.
+        df (pd.DataFrame): Table to validate, with parsed years and dates.
+        registry (pd.DataFrame): Unit registry indexed by unit name.
+        references (dict, optional): Keys of the referenced tables, from reference_keys.
+        quarantine (bool, optional): Move the rows breaking a quarantined rule out of the table instead of
+            raising for the rows breaking a blocking rule.
+
+    Returns:
+        tuple: The table without the quarantined rows, and its ValidationResult.
+
+    Raises:
+        ValidationError: If rows break a blocking rule and quarantine is False.
+    """
+    masks = rule_masks(table_name, df, registry, references)
+    counts = masks.sum().astype('int64')
+    counts = counts[counts > 0]
+    rejected = df.iloc[:0]
+    if counts.empty:
+        return df, ValidationResult(counts, rejected)
+
+    if not quarantine:
+        blocking = counts[[_is_rule(rule, BLOCKING_RULES) for rule in counts.index]]
+        if not blocking.empty:
+            raise ValidationError(table_name, blocking)
+    # Dates in another year are fixed by the date stage, they are only counted
+    listing = ", ".join(f"{rule} ({count} rows)" for rule, count in counts.items() if rule != 'year_date_mismatch')
+    if listing:
+        warnings.warn(f"Validation of {table_name}: {listing}")
+
+    if quarantine:
+        quarantined = masks[[rule for rule in masks.columns if _is_rule(rule, QUARANTINED_RULES)]]
+        bad = quarantined.any(axis=1).to_numpy()
+        if bad.any():
+            # Name the rules each row breaks
+            violations = pd.Series('', index=df.index[bad])
+            for rule in quarantined.columns:
+                violations += np.where(quarantined[rule].to_numpy()[bad], rule + ';', '')
+            rejected = df[bad].assign(Table=table_name, Violations=violations.str.rstrip(';'))
+            df = df.drop(index=df.index[bad])
+    return df, ValidationResult(counts, rejected)
+
+
+def combine_results(results):
+    """
+    Combines the validation results of the chunks of a table.
+
+    Args:
+        results (list): ValidationResult of each chunk.
+
+    Returns:
+        ValidationResult: Summed counts and concatenated rejected rows.
+    """
+    results = [result for result in results if result is not None]
+    if not results:
+        return ValidationResult(pd.Series(dtype='int64'), pd.DataFrame())
+    counts = pd.concat([result.counts for result in results]).groupby(level=0).sum()
+    rejected = [result.rejected for result in results if len(result.rejected)]
+    return ValidationResult(counts, pd.concat(rejected) if rejected else results[0].rejected)
+
+
+def write_quarantine(results, quarantine_file):
+    """
+    Writes the rejected rows of every table to the quarantine file, with the table they come from and the
+    rules they break first. The file isn't written when no row was rejected.
+
+    Args:
+        results (dict): ValidationResult of each table.
+        quarantine_file (str): Path to the quarantine CSV file.
+
+    Returns:
+        int: Number of rows written.
+    """
+    rejected = [result.rejected for result in results.values() if result is not None and len(result.rejected)]
+    if not rejected:
+        if os.path.exists(quarantine_file):
+            os.remove(quarantine_file)
+        return 0
+    rows = pd.concat(rejected, ignore_index=True)
+    # Integer columns read as floats because of their missing values are written as integers again
+    for col in rows.columns:
+        values = rows[col]
+        if values.dtype == 'float' and (values.dropna() == np.floor(values.dropna())).all():
+            rows[col] = values.astype('Int64')
+    rows = rows[['Table', 'Violations'] + [col for col in rows.columns if col not in ('Table', 'Violations')]]
+    rows.to_csv(quarantine_file, index=False, decimal=',')
+    record_io("write", quarantine_file, len(rows))
+    return len(rows)
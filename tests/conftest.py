@@ -0,0 +1,27 @@
+import shutil
+
+import pytest
+
+from benchmarks.synthetic import generate
+
+
+@pytest.fixture(scope="session")
+def extracts(tmp_path_factory):
+    """
+    Synthetic extracts with the quirks of the Euromonitor files, generated once per session.
+    """
+    path = tmp_path_factory.mktemp("extracts")
+    generate(str(path), 20000, seed=3)
+    return path
+
+
+@pytest.fixture
+def copy_extracts(extracts, tmp_path):
+    """
+    Copies the extracts to a new directory per call, the modes process the files in place.
+    """
+    def copy(name, source=None):
+        target = tmp_path / name
+        shutil.copytree(source or extracts, target)
+        return target
+    return copy
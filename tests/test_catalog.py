@@ -0,0 +1,67 @@
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from source.catalog import CATALOG, SAMPLE_ROWS, SchemaCatalog
+from source.elt import stage_csv
+
+
+@pytest.fixture
+def late_values(tmp_path):
+    """
+    A semicolon separated extract whose sample shows whole volumes and numeric codes only, with comma
+    decimal volumes and a text code after the sampled rows.
+    """
+    rows = SAMPLE_ROWS + 500
+    volumes = [str(i) for i in range(rows)]
+    codes = [str(i % 7) for i in range(rows)]
+    volumes[SAMPLE_ROWS + 10] = '2,5'
+    volumes[SAMPLE_ROWS + 20] = '3.25'
+    codes[SAMPLE_ROWS + 30] = 'n/a'
+    path = tmp_path / "Extract.csv"
+    lines = ['Code;Volume'] + [f'{code};{volume}' for code, volume in zip(codes, volumes)]
+    path.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+    return str(path)
+
+
+def test_read_widens_mistyped_columns(late_values):
+    catalog = SchemaCatalog()
+    assert catalog.schema(late_values).dtypes == {'Code': 'int64', 'Volume': 'int64'}
+    df = catalog.read_csv(late_values)
+    assert df['Volume'].dtype == 'float64'
+    assert df['Volume'][SAMPLE_ROWS + 10] == 2.5
+    assert df['Volume'][SAMPLE_ROWS + 20] == 3.25
+    assert df['Code'].dtype == 'object'
+    assert df['Code'][SAMPLE_ROWS + 30] == 'n/a'
+    assert catalog.schema(late_values).dtypes == {'Code': 'object', 'Volume': 'float64'}
+
+
+def test_chunks_have_the_dtypes_of_the_whole_file(late_values):
+    catalog = SchemaCatalog()
+    whole = catalog.read_csv(late_values)
+    chunks = list(catalog.read_csv(late_values, chunksize=400))
+    # The chunks read after the widening are floats, as the whole file is
+    assert all(chunk['Volume'].dtype == 'float64' for chunk in chunks)
+    pd.testing.assert_series_equal(pd.concat(chunks)['Volume'], whole['Volume'])
+
+
+def test_comma_decimals_with_a_dot_decimal_later(tmp_path):
+    path = tmp_path / "Extract.csv"
+    volumes = ['1,5'] * SAMPLE_ROWS + ['7'] * 10 + ['2.75']
+    path.write_text('Code;Volume\n' + ''.join(f'A;{volume}\n' for volume in volumes), encoding='utf-8')
+    df = SchemaCatalog().read_csv(str(path))
+    assert df['Volume'].dtype == 'float64'
+    assert df['Volume'].tolist()[-12:] == [1.5, 7.0] + [7.0] * 9 + [2.75]
+
+
+def test_staging_widens_mistyped_columns(late_values):
+    CATALOG.forget(late_values)
+    conn = sqlite3.connect(':memory:')
+    conn.execute("ATTACH DATABASE ':memory:' AS staging")
+    try:
+        schema = stage_csv(conn, "Extract", late_values)
+    finally:
+        conn.close()
+        CATALOG.forget(late_values)
+    assert schema.dtypes == {'Code': 'object', 'Volume': 'float64'}
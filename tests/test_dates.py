@@ -0,0 +1,93 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from source.dates import reconcile_year_dates, to_year
+from source.preprocessing import _format_dates
+
+
+def _apply_reconcile(dates, years):
+    """
+    Row-wise reconciliation of the original format_date stage, kept as the reference.
+    """
+    df = pd.DataFrame({'Year_date': dates, 'Year': years})
+    return df.apply(lambda row: row['Year_date'].replace(year=row['Year'])
+                    if not pd.isnull(row['Year']) and
+                    not pd.isnull(row['Year_date']) and
+                    row['Year_date'].year != row['Year']
+                    else row['Year_date'], axis=1)
+
+
+def _apply_format_dates(df):
+    """
+    The original format_date stage on a table, kept as the reference.
+    """
+    if 'Year_text' in df.columns:
+        df['Year_text'] = pd.to_numeric(df['Year_text'], errors='coerce').astype(pd.Int64Dtype())
+        df = df.rename(columns={'Year_text': 'Year'})
+    if 'Year' in df.columns:
+        df['Year'] = pd.to_numeric(df['Year'], errors='coerce').astype(pd.Int64Dtype())
+    if 'Year_date' in df.columns:
+        df['Year_date'] = pd.to_datetime(df['Year_date'], errors='coerce')
+        if 'Year' in df.columns:
+            df['Year_date'] = _apply_reconcile(df['Year_date'], df['Year'])
+    return df
+
+
+def test_matches_apply_on_random_dates():
+    rng = np.random.default_rng(0)
+    rows = 5000
+    days = rng.integers(-20000, 30000, rows).astype('datetime64[D]')
+    seconds = rng.integers(0, 86400, rows).astype('timedelta64[s]')
+    dates = pd.Series((days + seconds).astype('datetime64[ns]'))
+    years = pd.Series(rng.integers(1950, 2050, rows), dtype='Int64')
+    # Missing years and dates, and dates already in their year
+    years[rng.random(rows) < 0.1] = pd.NA
+    dates[rng.random(rows) < 0.1] = pd.NaT
+    same = rng.random(rows) < 0.2
+    years[same] = dates[same].dt.year.astype('Int64')
+
+    # 29 February only has a counterpart in leap years
+    leap_days = dates.dt.strftime('%m-%d') == '02-29'
+    years[leap_days] = 2024
+
+    expected = _apply_reconcile(dates, years)
+    pd.testing.assert_series_equal(reconcile_year_dates(dates, years), expected, check_names=False)
+
+
+def test_leap_days():
+    dates = pd.Series(pd.to_datetime(['2020-02-29', '2020-02-29', '2019-02-28', '2016-02-29 13:45:00'], format='ISO8601'))
+    years = pd.Series([2024, 2021, 2020, 2000], dtype='Int64')
+    result = reconcile_year_dates(dates, years)
+    assert result.tolist() == pd.to_datetime(['2024-02-29', '2021-02-28', '2020-02-28', '2000-02-29 13:45:00'], format='ISO8601').tolist()
+
+    # The row-wise path raised on a 29 February moved to a non-leap year, the other rows match it
+    with pytest.raises(ValueError):
+        _apply_reconcile(dates, years)
+    keep = [0, 2, 3]
+    assert result[keep].tolist() == _apply_reconcile(dates[keep], years[keep]).tolist()
+
+
+def test_years_out_of_range():
+    dates = pd.Series(pd.to_datetime(['2016-12-31', '2016-12-31']))
+    result = reconcile_year_dates(dates, pd.Series([3000, 1500], dtype='Int64'))
+    assert result.isna().all()
+
+
+def test_format_dates_with_missing_year_text():
+    df = pd.DataFrame({
+        'Year_text': ['2016', None, '2017', 'n/a', '2018', '2020'],
+        'Year_date': ['1999-12-31', '2030-12-31', None, '2017-12-31', '2030-12-31', '2016-02-29'],
+        'Volume': [1.5, 2.5, 3.5, 4.5, 5.5, 6.5],
+    })
+    result = _format_dates(df.copy())
+    expected = _apply_format_dates(df.copy())
+    pd.testing.assert_frame_equal(result, expected)
+    assert result['Year_date'].isna().tolist() == [False, False, True, False, False, False]
+
+
+def test_to_year():
+    years = to_year(pd.Series(['2016', '2016.0', '2016.5', 'text', None]))
+    assert years.dtype == 'Int64'
+    assert years.tolist()[:2] == [2016, 2016]
+    assert years[2:].isna().all()
@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+
+from source.instrumentation import StageRecorder
+
+
+def _allocate(mb):
+    block = np.ones(mb * 2 ** 20, dtype=np.uint8)
+    return int(block[-1])
+
+
+def test_stage_peaks_are_their_own():
+    recorder = StageRecorder(enabled=True)
+    with recorder.stage("run"):
+        with recorder.stage("large"):
+            _allocate(200)
+        with recorder.stage("small"):
+            _allocate(1)
+    stages = {record["stage"]: record for record in recorder.stages}
+    if stages["small"]["peak_rss_scope"] == "process":
+        pytest.skip("the high-water mark of the process can't be reset here")
+
+    assert stages["large"]["peak_rss_mb"] - stages["small"]["peak_rss_mb"] > 150
+    # The enclosing stage and the process keep the peak of the stages within them
+    assert stages["run"]["peak_rss_mb"] >= stages["large"]["peak_rss_mb"]
+    assert recorder.report()["peak_rss_mb"] >= stages["large"]["peak_rss_mb"]
@@ -0,0 +1,84 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from source.queries import BeerDatabase
+
+REGIONS = ['Asia Pacific', 'Western Europe', 'World']
+
+
+def _build(db_path, rsp):
+    """
+    Builds a database with one market size per region, all equal to rsp, and swaps it in place of the
+    current file as the pipeline does.
+    """
+    temp_path = str(db_path) + ".tmp"
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+    conn = sqlite3.connect(temp_path)
+    conn.execute("CREATE TABLE Regions (id INTEGER PRIMARY KEY, Region TEXT)")
+    conn.execute("CREATE TABLE Market_Sizes (Location INTEGER, Hierarchy_Level INTEGER, Category_Name TEXT, "
+                 "Year INTEGER, RSP REAL, Unit TEXT)")
+    conn.executemany("INSERT INTO Regions VALUES (?, ?)", list(enumerate(REGIONS, start=1)))
+    conn.executemany("INSERT INTO Market_Sizes VALUES (?, 1, 'Beer', 2020, ?, 'USD million')",
+                     [(id, rsp) for id in range(1, len(REGIONS) + 1)])
+    conn.commit()
+    conn.close()
+    os.replace(temp_path, db_path)
+
+
+def _rsp(db, region):
+    return db.market_size(region=region)[0].rsp
+
+
+def test_rebuild_during_query_is_not_cached(tmp_path):
+    db_path = tmp_path / "beer.db"
+    _build(db_path, 1.0)
+    with BeerDatabase(str(db_path)) as db:
+        connection = db._connection
+
+        @contextmanager
+        def rebuilt_during_query():
+            with connection() as conn:
+                yield conn
+            # The file is rebuilt once the query has read it, and another query notices the rebuild
+            # before this one caches its result
+            _build(db_path, 2.0)
+            db._connection = connection
+            assert _rsp(db, 'World') == 2.0
+
+        db._connection = rebuilt_during_query
+        assert _rsp(db, 'Asia Pacific') == 1.0
+        assert _rsp(db, 'Asia Pacific') == 2.0
+
+
+def test_rebuilds_while_querying(tmp_path):
+    db_path = tmp_path / "beer.db"
+    _build(db_path, 0.0)
+    errors = []
+    done = threading.Event()
+
+    with BeerDatabase(str(db_path), pool_size=3) as db:
+        def query():
+            try:
+                while not done.is_set():
+                    for region in REGIONS:
+                        _rsp(db, region)
+            except Exception as error:
+                errors.append(error)
+
+        threads = [threading.Thread(target=query) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for rsp in range(1, 30):
+            _build(db_path, float(rsp))
+        done.set()
+        for thread in threads:
+            thread.join()
+
+        assert errors == []
+        assert [_rsp(db, region) for region in REGIONS] == [29.0] * len(REGIONS)
+        assert db._opened <= db.pool_size
+        # Every pooled connection reads the last file
+        assert all(generation == db._generation for _, generation in list(db._pool.queue))
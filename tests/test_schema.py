@@ -0,0 +1,36 @@
+import pandas as pd
+
+from source.schema import compact_table, memory_report, plain_table
+
+
+def _table():
+    return pd.DataFrame({
+        'Location': pd.Series([1, 2, 8] * 1000, dtype='int64'),
+        'Year': pd.Series([2016, None, 2020] * 1000, dtype='Int64'),
+        'Edition': pd.Series([2022, 2022, 2022] * 1000, dtype='Int64'),
+        'Unit': ['million litres', '000 litres', 'litres'] * 1000,
+        'Volume': [1.5, 2.5, 3.5] * 1000,
+    })
+
+
+def test_compact_table_downcasts_nullable_integers():
+    df = compact_table(_table())
+    assert df['Location'].dtype == 'int8'
+    assert df['Year'].dtype == 'Int16'
+    assert df['Edition'].dtype == 'Int16'
+    assert df['Unit'].dtype == 'category'
+    assert df['Year'].isna().sum() == 1000
+    pd.testing.assert_series_equal(df['Year'].astype('Int64'), _table()['Year'])
+
+
+def test_memory_report_counts_year():
+    df = compact_table(_table())
+    plain = plain_table(df)
+    assert plain['Year'].dtype == 'Int64'
+    assert plain['Location'].dtype == 'int64'
+    pd.testing.assert_frame_equal(plain, _table())
+
+    # The nullable years take 3 bytes per row instead of 9 once compacted
+    year_only = {'Years': compact_table(_table()[['Year']])}
+    report = memory_report(year_only).iloc[0]
+    assert report['Reduction'] > 2
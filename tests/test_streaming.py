@@ -0,0 +1,62 @@
+import re
+import sqlite3
+
+import pytest
+
+from source.preprocessing import DataProcessor
+
+
+def _output_files(path):
+    return sorted(file.name for file in path.iterdir() if file.suffix == ".csv")
+
+
+def _table_rows(db_path, table_name):
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute(f'SELECT *, typeof("Volume_Litres") FROM "{table_name}"').fetchall()
+
+
+@pytest.fixture
+def late_litres(extracts, copy_extracts, tmp_path):
+    """
+    Extracts whose 'Channel_Volume' volumes in litres, which have decimals, are only in the last rows, so
+    the first chunks have whole volumes in litres only.
+    """
+    source = copy_extracts("late_litres")
+    path = source / "Channel_Volume.csv"
+    lines = path.read_text(encoding="utf-8").splitlines(keepends=True)
+    cutoff = len(lines) * 3 // 4
+    lines[1:cutoff] = [line.replace(";litres;", ";million litres;") for line in lines[1:cutoff]]
+    path.write_text("".join(lines), encoding="utf-8")
+    return source
+
+
+@pytest.fixture
+def late_decimals(extracts, copy_extracts):
+    """
+    Extracts whose 'Channel_Volume' volumes are whole numbers in the sampled rows and the first chunks,
+    and only have decimals in the last rows.
+    """
+    source = copy_extracts("late_decimals")
+    path = source / "Channel_Volume.csv"
+    lines = path.read_text(encoding="utf-8").splitlines(keepends=True)
+    cutoff = len(lines) * 3 // 4
+    lines[1:cutoff] = [re.sub(r",\d+$", "", line) for line in lines[1:cutoff]]
+    path.write_text("".join(lines), encoding="utf-8")
+    return source
+
+
+@pytest.mark.filterwarnings("ignore:Unknown units")
+@pytest.mark.filterwarnings("error::FutureWarning")
+@pytest.mark.parametrize("extract", ["late_litres", "late_decimals"])
+def test_streaming_matches_pipeline(extract, request, copy_extracts):
+    source = request.getfixturevalue(extract)
+    pipeline = copy_extracts("pipeline", source)
+    streaming = copy_extracts("streaming", source)
+    DataProcessor().run_pipeline(str(pipeline), str(pipeline / "beer.db"))
+    DataProcessor().run_streaming(str(streaming), str(streaming / "beer.db"), memory_budget_mb=1)
+
+    files = _output_files(pipeline)
+    assert files == _output_files(streaming)
+    for name in files:
+        assert (streaming / name).read_bytes() == (pipeline / name).read_bytes(), name
+    assert _table_rows(streaming / "beer.db", "Channel_Volume") == _table_rows(pipeline / "beer.db", "Channel_Volume")
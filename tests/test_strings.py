@@ -0,0 +1,49 @@
+import pandas as pd
+import pytest
+
+from source.preprocessing import DataProcessor
+from source.strings import StringNormalizer, title_words
+
+
+def upper(value):
+    return value.upper()
+
+
+def _write_tables(path):
+    pd.DataFrame({'Region': ['western europe', 'WORLD'], 'Unit': ['million litres', 'hl']}).to_csv(
+        path / "A.csv", index=False)
+    pd.DataFrame({'Region': ['WORLD', 'asia  pacific'], 'Unit': ['hl', 'litres']}).to_csv(path / "B.csv", index=False)
+
+
+def test_lambda_rules_are_rejected():
+    with pytest.raises(TypeError, match="Region"):
+        StringNormalizer({'Region': lambda value: value.upper()})
+    with pytest.raises(TypeError, match="Region"):
+        DataProcessor(string_rules={'Region': 'upper'})
+
+
+def test_mapping_rules():
+    normalizer = StringNormalizer({'Unit': {'hl': 'hectolitres'}})
+    df = normalizer.normalize(pd.DataFrame({'Unit': ['hl', 'litres', None], 'Region': ['WORLD', 'world', None]}))
+    assert df['Unit'].tolist() == ['hectolitres', 'litres', None]
+    assert df['Region'].tolist() == ['World', 'World', None]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_fix_string_columns_with_rules(tmp_path, workers):
+    _write_tables(tmp_path)
+    processor = DataProcessor(workers=workers, storage="csv",
+                              string_rules={'Region': upper, 'Unit': {'hl': 'hectolitres'}})
+    processor.fix_string_columns(str(tmp_path))
+    a = pd.read_csv(tmp_path / "A.csv")
+    b = pd.read_csv(tmp_path / "B.csv")
+    assert a.to_dict('list') == {'Region': ['WESTERN EUROPE', 'WORLD'], 'Unit': ['million litres', 'hectolitres']}
+    assert b.to_dict('list') == {'Region': ['WORLD', 'ASIA  PACIFIC'], 'Unit': ['hectolitres', 'litres']}
+    if workers == 1:
+        # One normalizer for every file, so 'WORLD' was transformed once for both files
+        assert processor.normalizer._memo[upper] == {'western europe': 'WESTERN EUROPE', 'WORLD': 'WORLD',
+                                                     'asia  pacific': 'ASIA  PACIFIC'}
+
+
+def test_default_rules():
+    assert DataProcessor().normalizer.default is title_words
@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from source.units import convert_units, load_unit_registry, to_litres, unknown_units
+
+
+@pytest.fixture(scope="module")
+def registry():
+    return load_unit_registry()
+
+
+def _apply_litres(df):
+    """
+    Row-wise conversion of the original standardize_units stage, kept as the reference.
+    """
+    def calculate_volume(row):
+        if row['Unit'] == 'million litres':
+            return round(row['Volume'] * 1000000)
+        elif row['Unit'] == '000 litres':
+            return round(row['Volume'] * 1000)
+        else:
+            return row['Volume']
+    return df.apply(calculate_volume, axis=1)
+
+
+def _volumes(rows, units, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({'Volume': np.round(rng.lognormal(3, 2.5, rows), 6),
+                         'Unit': rng.choice(units, size=rows)})
+
+
+def test_matches_apply_for_litre_units(registry):
+    df = _volumes(20000, ['million litres', '000 litres', 'litres'])
+    expected = _apply_litres(df)
+    unknown = to_litres(df, registry)
+    assert unknown.empty
+    # Volumes already in litres have decimals, so the column holds floats as the row-wise path gave
+    assert df['Volume_Litres'].dtype == 'float64'
+    np.testing.assert_array_equal(df['Volume_Litres'].to_numpy(), expected.to_numpy(dtype='float64'))
+
+
+def test_whole_litres_are_integers(registry):
+    df = _volumes(20000, ['million litres', '000 litres'])
+    expected = _apply_litres(df)
+    to_litres(df, registry)
+    assert df['Volume_Litres'].dtype == 'int64'
+    assert df['Volume_Litres'].tolist() == expected.tolist()
+
+
+def test_litres_are_kept_as_they_are(registry):
+    df = pd.DataFrame({'Volume': [0.5, 2.5, 1234.567891, 3.0], 'Unit': 'litres'})
+    to_litres(df, registry)
+    assert df['Volume_Litres'].tolist() == [0.5, 2.5, 1234.567891, 3.0]
+
+
+def test_unknown_units_have_no_litres(registry):
+    df = pd.DataFrame({'Volume': [1.5, 2.25, 3.0, 4.0], 'Unit': ['million litres', 'gallons', 'USD million', None]})
+    with pytest.warns(UserWarning, match="'gallons' \\(1 rows\\)"):
+        unknown = to_litres(df, registry, "Channel_Volume")
+    assert unknown.to_dict() == {'gallons': 1}
+    assert df['Volume_Litres'].dtype == 'Int64'
+    assert df['Volume_Litres'].tolist() == [1500000, pd.NA, pd.NA, pd.NA]
+
+
+def test_tables_without_litres(registry):
+    df = pd.DataFrame({'Volume': [27.0, 28.0], 'Unit': 'USD million'})
+    to_litres(df, registry)
+    assert 'Volume_Litres' not in df.columns
+
+
+def test_categorical_units(registry):
+    df = _volumes(1000, ['million litres', '000 litres', 'hectolitres'])
+    expected = df.assign(Unit=df['Unit'].astype(object))
+    df['Unit'] = df['Unit'].astype('category').cat.add_categories(['gallons'])
+    assert unknown_units(df['Unit'], registry).empty
+    to_litres(df, registry)
+    to_litres(expected, registry)
+    assert df['Volume_Litres'].tolist() == expected['Volume_Litres'].tolist()
+    hectolitres = (expected['Unit'] == 'hectolitres').to_numpy()
+    np.testing.assert_array_equal(expected['Volume_Litres'].to_numpy()[hectolitres],
+                                  np.round(expected['Volume'].to_numpy()[hectolitres] * 100))
+
+
+def test_convert_units(registry):
+    values = pd.Series([1.0, 2.0, 3.0])
+    converted = convert_units(values, pd.Series(['USD million', 'USD', 'litres']), registry, 'USD')
+    np.testing.assert_array_equal(converted, [1e6, 2.0, np.nan])